@@ -0,0 +1,72 @@
+import numpy as np
+import scipy.sparse as sp
+from aux_network import load_node_categories
+
+
+def category_index(categories, node_ids):
+    """
+    Sparse (CSR) node x category membership matrix built once from a dict
+    category -> list of node labels (see load_node_categories). node_ids
+    are the sorted labels of the nodes 0..n-1; labels not in the graph
+    are ignored. Returns the matrix and the array of category names
+    """
+    names = np.array(list(categories))
+    sizes = np.array([len(nodes) for nodes in categories.values()])
+    labels = np.fromiter((node for nodes in categories.values()
+                          for node in nodes), dtype=np.int64,
+                         count=sizes.sum())
+    columns = np.repeat(np.arange(len(names)), sizes)
+
+    rows = np.searchsorted(node_ids, labels)
+    found = rows < len(node_ids)
+    found[found] = node_ids[rows[found]] == labels[found]
+    membership = sp.csr_matrix(
+        (np.ones(found.sum(), dtype=np.int64), (rows[found], columns[found])),
+        shape=(len(node_ids), len(names)))
+    # Repeated labels within a category count once
+    membership.data[:] = 1
+    return membership, names
+
+
+def load_category_index(file, node_ids):
+    """
+    Membership matrix and category names of a Category:<name>;<nodes> file
+    """
+    return category_index(load_node_categories(file), node_ids)
+
+
+def category_statistics(edges, membership):
+    """
+    Statistics of the subgraph induced by each category, from a single
+    pass over the edge array (self-loops ignored):
+        - size: number of nodes
+        - internal / external: edges within / leaving the category
+        - volume: sum of the degrees of its nodes
+        - density: internal edges over the possible size*(size-1)/2
+        - internal_ratio: internal / (internal + external)
+        - modularity: contribution internal/m - (volume/2m)^2 (they add
+          up to the modularity when categories partition the nodes)
+    Returns a dict statistic -> array over the categories
+    """
+    edges = np.asarray(edges)
+    edges = edges[edges[:, 0] != edges[:, 1]]
+    m = len(edges)
+    degree = np.bincount(edges.ravel(), minlength=membership.shape[0])
+
+    size = np.asarray(membership.sum(axis=0)).ravel()
+    volume = membership.T @ degree
+    internal = np.asarray(membership[edges[:, 0]].multiply(
+        membership[edges[:, 1]]).sum(axis=0)).ravel()
+    external = volume - 2 * internal
+    pairs = size * (size - 1) / 2
+
+    return {'size': size,
+            'internal': internal,
+            'external': external,
+            'volume': volume,
+            'density': np.divide(internal, pairs, out=np.zeros(len(size)),
+                                 where=pairs > 0),
+            'internal_ratio': np.divide(internal, internal + external,
+                                        out=np.zeros(len(size)),
+                                        where=internal + external > 0),
+            'modularity': internal / m - (volume / (2 * m)) ** 2}
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import numpy as np
+import networkx as nx
+from scipy.spatial import cKDTree
+
+
+def canonical_nodes(graph):
+    """
+    Nodes of the graph in an order which only depends on their labels
+    """
+    return sorted(graph.nodes, key=repr)
+
+
+def layout_key(graph, method, params):
+    """
+    Hash identifying a layout: node set, edge set, method and parameters
+    """
+    digest = hashlib.sha1()
+    digest.update(repr(canonical_nodes(graph)).encode())
+    digest.update(repr(sorted(tuple(sorted((u, v), key=repr))
+                              for u, v in graph.edges)).encode())
+    digest.update(method.encode())
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+def _scatter_forces(pairs, force, n):
+    """
+    Net force on each of the n nodes when force[ii] acts on pairs[ii, 0]
+    and -force[ii] on pairs[ii, 1]
+    """
+    return np.stack([
+        np.bincount(pairs[:, 0], weights=force[:, dim], minlength=n) -
+        np.bincount(pairs[:, 1], weights=force[:, dim], minlength=n)
+        for dim in range(2)], axis=1)
+
+
+def approximate_layout(graph, k=None, iterations=50, scale=1, center=None,
+                       seed=None, grid_size=32):
+    """
+    Fruchterman-Reingold layout with Barnes-Hut style approximate
+    repulsion: nodes are binned in a grid_size x grid_size grid, nodes in
+    the same cell repel each other exactly while the repulsion between
+    different cells is computed between their centers of mass. Each
+    iteration costs O(grid_size^4 + E + pairs within cells) instead of
+    O(N^2), which makes it usable on graphs of 10^4-10^5 nodes.
+    Parameters follow nx.spring_layout
+    """
+    nodes = list(graph.nodes)
+    n = len(nodes)
+    index = {node: ii for ii, node in enumerate(nodes)}
+    edges = np.array([(index[u], index[v]) for u, v in graph.edges
+                      if u != v], dtype=np.int64).reshape(-1, 2)
+    rng = np.random.default_rng(seed)
+    pos = rng.random((n, 2))
+    if k is None:
+        k = 1 / np.sqrt(n)
+
+    temperature = 0.1
+    cooling = temperature / (iterations + 1)
+    for _ in range(iterations):
+        # Grid bounds ignore outliers so that dense regions get resolved
+        lower, upper = np.percentile(pos, [1, 99], axis=0)
+        span = max((upper - lower).max(), 1e-12)
+        cells = np.clip(((pos - lower) / span * grid_size).astype(np.int64),
+                        0, grid_size - 1)
+        cell_id = cells[:, 0] * grid_size + cells[:, 1]
+
+        # Far field: repulsion between the centers of mass of the cells,
+        # shared by all the nodes within each cell
+        mass = np.bincount(cell_id, minlength=grid_size ** 2)
+        occupied = np.flatnonzero(mass)
+        centroid = np.stack([
+            np.bincount(cell_id, weights=pos[:, dim],
+                        minlength=grid_size ** 2)[occupied]
+            for dim in range(2)], axis=1) / mass[occupied, None]
+        delta = centroid[:, None, :] - centroid[None, :, :]
+        distance2 = np.sum(delta ** 2, axis=-1)
+        np.fill_diagonal(distance2, np.inf)
+        weight = k ** 2 * mass[occupied][None, :] / distance2
+        cell_force = np.zeros((grid_size ** 2, 2))
+        cell_force[occupied] = np.einsum('ij,ijk->ik', weight, delta)
+        displacement = cell_force[cell_id]
+
+        # Near field: exact repulsion between nodes sharing a cell
+        pairs = cKDTree(pos).query_pairs(np.sqrt(2) * span / grid_size,
+                                         output_type='ndarray')
+        pairs = pairs[cell_id[pairs[:, 0]] == cell_id[pairs[:, 1]]]
+        delta = pos[pairs[:, 0]] - pos[pairs[:, 1]]
+        distance2 = np.maximum(np.sum(delta ** 2, axis=1), 1e-9)
+        force = delta * (k ** 2 / distance2)[:, None]
+        displacement += _scatter_forces(pairs, force, n)
+
+        # Attraction along the edges
+        delta = pos[edges[:, 0]] - pos[edges[:, 1]]
+        force = delta * (np.sqrt(np.sum(delta ** 2, axis=1)) / k)[:, None]
+        displacement -= _scatter_forces(edges, force, n)
+
+        # Limit the movement to the current temperature
+        length = np.maximum(np.sqrt(np.sum(displacement ** 2, axis=1)), 1e-9)
+        pos += displacement * (np.minimum(length, temperature) / length)[:, None]
+        temperature -= cooling
+
+    pos = nx.rescale_layout(pos, scale=scale)
+    if center is not None:
+        pos += np.asarray(center)
+    return dict(zip(nodes, pos))
+
+
+def cached_layout(graph, method='spring', cache_dir='./layouts', **params):
+    """
+    Computes the layout of the graph with the given method ('spring' for
+    nx.spring_layout or 'approximate' for approximate_layout) and keyword
+    parameters, storing the coordinates as arrays in cache_dir so that
+    identical graphs reuse them instead of recomputing the layout
+    """
+    nodes = canonical_nodes(graph)
+    file = os.path.join(cache_dir,
+                        layout_key(graph, method, params) + '.npy')
+    if os.path.exists(file):
+        return dict(zip(nodes, np.load(file)))
+
+    if method == 'spring':
+        layout = nx.spring_layout(graph, **params)
+    elif method == 'approximate':
+        layout = approximate_layout(graph, **params)
+    else:
+        raise ValueError(f'Unknown layout method: {method}')
+
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    np.save(file, np.array([layout[node] for node in nodes]))
+    return layout
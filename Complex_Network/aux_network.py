@@ -1,25 +1,95 @@
-
+import json
+import os
 import numpy as np
 import networkx as nx
-import scipy.sparse.linalg as sp_linalg
+import scipy.sparse as sp
+from scipy import signal
+from scipy.sparse import csgraph
 
 
 def load_graph_edges(file):
-    edges = []
-    with open(file, 'r') as f:
-        for line in f:
-            if '#' in line:
-                continue
-            node1, node2 = line.strip().split()
-            edges.append((int(node1), int(node2)))
+    edges, node_ids = load_edge_array(file)
 
-    # Create a graph and add edges
+    # Create a graph and add edges (with the original node ids)
     graph = nx.Graph()
-    graph.add_edges_from(edges)
+    graph.add_nodes_from(node_ids.tolist())
+    graph.add_edges_from(node_ids[edges].tolist())
 
     return graph
 
 
+def parse_edge_list(file):
+    """
+    Parses a SNAP-style edge list ('#' starts a comment) with vectorized
+    NumPy. Raises ValueError if a line does not hold exactly 2 node ids.
+    Returns:
+        - edges: (E, 2) array with each undirected edge stored once as
+          (u, v) with u <= v, nodes relabeled to a dense 0..N-1 range
+        - node_ids: original id of each node
+    """
+    raw = np.loadtxt(file, comments='#', dtype=np.int64, ndmin=2)
+    if raw.size == 0:
+        raise ValueError(f'{file}: no edges found')
+    if raw.shape[1] != 2:
+        raise ValueError(f'{file}: expected 2 node ids per line, found '
+                         f'{raw.shape[1]}')
+    node_ids, edges = np.unique(raw, return_inverse=True)
+    edges = np.sort(edges.reshape(-1, 2), axis=1)
+
+    # Remove duplicated undirected edges (both directions are listed)
+    keys = np.sort(edges[:, 0] * len(node_ids) + edges[:, 1])
+    keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+    edges = np.stack(np.divmod(keys, len(node_ids)), axis=1)
+
+    return edges.astype(np.int32), node_ids
+
+
+def load_edge_array(file, cache=True):
+    """
+    Same as parse_edge_list, but the result is cached as .npy files next
+    to the source file (if writable) and reloaded as a memory map while the
+    size and modification time of the source file do not change
+    """
+    edges_file = file + '.edges.npy'
+    nodes_file = file + '.nodes.npy'
+    meta_file = file + '.cache.json'
+    stat = os.stat(file)
+    meta = {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+    if cache and os.path.exists(meta_file):
+        with open(meta_file, 'r') as f:
+            if json.load(f) == meta:
+                return (np.load(edges_file, mmap_mode='r'),
+                        np.load(nodes_file, mmap_mode='r'))
+
+    edges, node_ids = parse_edge_list(file)
+    if cache:
+        # The cache is skipped if the folder of the source is read-only
+        try:
+            np.save(edges_file, edges)
+            np.save(nodes_file, node_ids)
+            with open(meta_file, 'w') as f:
+                json.dump(meta, f)
+        except OSError:
+            pass
+
+    return edges, node_ids
+
+
+def edges_to_csr(edges, n, dtype=np.float64):
+    """
+    Symmetric sparse (CSR) adjacency matrix of the undirected edges (u, v)
+    between nodes 0..n-1. Self-loops are stored once in the diagonal, as
+    in nx.adjacency_matrix
+    """
+    edges = np.asarray(edges)
+    loops = edges[:, 0] == edges[:, 1]
+    rows = np.concatenate((edges[:, 0], edges[~loops, 1]))
+    cols = np.concatenate((edges[:, 1], edges[~loops, 0]))
+    return sp.csr_matrix((np.ones(len(rows), dtype=dtype), (rows, cols)),
+                         shape=(n, n))
+
+
 def load_node_categories(file):
     categories = {}
     with open(file, 'r') as f:
@@ -31,70 +101,124 @@ def load_node_categories(file):
     return categories
 
 
-def power_iteration(adj_matrix, num_iterations):
+def power_iteration(adj_matrix, num_iterations=1000, tol=1e-10, v0=None,
+                    shift=0):
+    """
+    Dominant eigenvector (unit norm) of adj_matrix by power iteration over
+    adj_matrix + shift*I (a positive shift avoids oscillations on
+    bipartite graphs). Starts from v0 if given (warm start) and stops once
+    the vector changes less than tol, or after num_iterations
+    """
     n = adj_matrix.shape[0]
-    v = np.random.rand(n)
+    v = np.random.rand(n) if v0 is None else np.array(v0, dtype=float)
+    v = v / np.linalg.norm(v)
     for _ in range(num_iterations):
-        v = adj_matrix @ v
-        v = v / np.linalg.norm(v)
+        v_new = adj_matrix @ v + shift * v
+        v_new = v_new / np.linalg.norm(v_new)
+        converged = np.linalg.norm(v_new - v) < tol
+        v = v_new
+        if converged:
+            break
 
     return v
 
 
-def estimate_spectral_density(graph, num_eigenvalues=100):
-    # Convert the graph to a sparse adjacency matrix
-    adj_matrix = nx.adjacency_matrix(graph)
-
-    # Calculate the spectral density using Lanczos algorithm
-    eigenvalues, _ = sp_linalg.eigsh(adj_matrix, k=num_eigenvalues)
-
-    return eigenvalues
-
-
 def dirac_delta(x, x0, sigma=1e-5):
     return np.exp(-0.5 * ((x - x0) / sigma) ** 2) / (sigma * np.sqrt(2 * np.pi))
 
 
-def compute_rho_array(eigenvalues, lambda_array):
+def compute_rho_array(eigenvalues, lambda_array, method='auto',
+                      max_exact_size=50000000, oversample=8):
+    """
+    Spectral density on the equispaced lambda_array, each eigenvalue
+    being broadened with a gaussian (dirac_delta) whose width is the grid
+    spacing:
+        - 'exact': gaussians evaluated by broadcasting, in chunks of
+          eigenvalues, O(len(eigenvalues) * len(lambda_array))
+        - 'binned': eigenvalues are linearly binned onto a grid
+          oversample times finer and convolved with the gaussian by FFT,
+          O(len(eigenvalues) + len(lambda_array) log(len(lambda_array)))
+        - 'auto': 'exact' up to max_exact_size evaluations, else 'binned'
+    """
+    eigenvalues = np.asarray(eigenvalues, dtype=float)
+    lambda_array = np.asarray(lambda_array, dtype=float)
     N = len(eigenvalues)
-    rho_array = []
     threshold = lambda_array[1]-lambda_array[0]
-    for lambda_val in lambda_array:
-        delta_vals = np.array([dirac_delta(lambda_val, eig_val, threshold)
-                               for eig_val in eigenvalues])
-        rho_val = np.sum(delta_vals) / N
-        rho_array.append(rho_val)
-    return np.array(rho_array)
+    if method == 'auto':
+        method = 'exact' if N * len(lambda_array) <= max_exact_size \
+            else 'binned'
+
+    if method == 'exact':
+        rho_array = np.zeros(len(lambda_array))
+        chunk = max(1, 2**22 // len(lambda_array))
+        for start in range(0, N, chunk):
+            rho_array += np.sum(dirac_delta(
+                lambda_array[:, None], eigenvalues[None, start:start+chunk],
+                threshold), axis=1)
+        return rho_array / N
+
+    if method == 'binned':
+        # Fine grid extended by the support of the kernel (6 sigma)
+        step = threshold / oversample
+        pad = 6 * oversample
+        grid_start = lambda_array[0] - pad * step
+        n_fine = (len(lambda_array) - 1) * oversample + 1 + 2 * pad
+        position = (eigenvalues - grid_start) / step
+        inside = (position >= 0) & (position < n_fine - 1)
+        left = np.floor(position[inside]).astype(np.int64)
+        fraction = position[inside] - left
+        counts = np.bincount(left, weights=1 - fraction, minlength=n_fine) + \
+            np.bincount(left + 1, weights=fraction, minlength=n_fine)
+
+        kernel = dirac_delta(np.arange(-pad, pad + 1) * step, 0, threshold)
+        rho_fine = signal.fftconvolve(counts, kernel, mode='same')
+        return rho_fine[pad:n_fine - pad:oversample] / N
+
+    raise ValueError(f'Unknown method: {method}')
 
 
 def compute_rho_array_random(N, p, lambda_array):
-    rho_array = []
-    for lambda_val in lambda_array:
-        if abs(lambda_val) < 2*np.sqrt(N * p * (1-p)):
-            rho_val = np.sqrt(4 * N * p * (1-p) - lambda_val**2) / \
-                      (2 * np.pi * N * p * (1 - p))
-        else:
-            rho_val = 0
-        rho_array.append(rho_val)
-    return np.array(rho_array)
-
-
-def find_subgraphs_recursive(graph):
-    subgraphs = []  # List to store the identified subgraphs
-    visited = set()  # Set to keep track of visited nodes
-
-    def dfs(node, subgraph):
-        visited.add(node)
-        subgraph.add_node(node)
-
-        for neighbor in graph.neighbors(node):
-            if neighbor not in visited:
-                dfs(neighbor, subgraph)
-
-    for node in graph.nodes:
-        if node not in visited:
-            subgraph = nx.Graph()
-            dfs(node, subgraph)
-            subgraphs.append(subgraph)
-
-    return subgraphs
+    """
+    Wigner semicircle law for the spectral density of a random network
+    """
+    lambda_array = np.asarray(lambda_array, dtype=float)
+    variance = N * p * (1-p)
+    return np.where(np.abs(lambda_array) < 2*np.sqrt(variance),
+                    np.sqrt(np.maximum(4 * variance - lambda_array**2, 0)) /
+                    (2 * np.pi * variance), 0)
+
+
+def connected_component_labels(adjacency):
+    """
+    Connected components of the graph given by its sparse adjacency.
+    Returns the component label of each node (components numbered in
+    order of their first node) and the size of each component
+    """
+    _, labels = csgraph.connected_components(adjacency, directed=False)
+    return labels, np.bincount(labels)
+
+
+def component_size_histogram(sizes):
+    """
+    Returns the different component sizes and the number of components
+    of each size
+    """
+    return np.unique(sizes, return_counts=True)
+
+
+def component_nodes(labels):
+    """
+    List with the array of nodes of each component
+    """
+    order = np.argsort(labels, kind='stable')
+    return np.split(order, np.cumsum(np.bincount(labels))[:-1])
+
+
+def find_subgraphs(graph, labels, node_ids):
+    """
+    Generator of the subgraph (view) of each component, built only when
+    requested. node_ids maps the node indexes used in labels to the
+    nodes of the graph
+    """
+    for nodes in component_nodes(labels):
+        yield graph.subgraph(node_ids[nodes].tolist())
@@ -0,0 +1,117 @@
+import os
+from functools import partial
+from multiprocessing import Pool
+import numpy as np
+from aux_network import edges_to_csr
+from aux_paths import (shortest_path_histogram, sampled_path_histogram,
+                       path_length_stats, effective_diameter)
+from aux_spectral import extreme_eigenvalues
+from aux_clustering import clustering_coefficients, simple_adjacency
+
+
+def configuration_model_edges(degree, rng):
+    """
+    Edges of a configuration model with the given degree sequence: stubs
+    are matched through a random permutation and the resulting self-loops
+    and multi-edges are dropped (so degrees are preserved up to them)
+    """
+    stubs = np.repeat(np.arange(len(degree)), degree)
+    if len(stubs) % 2:
+        stubs = stubs[:-1]
+    pairs = rng.permutation(stubs).reshape(-1, 2)
+    pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+    return np.unique(np.sort(pairs, axis=1), axis=0)
+
+
+def erdos_renyi_edges(n, m, rng):
+    """
+    Edges of an Erdos-Renyi G(n, m) graph: m distinct pairs of different
+    nodes drawn uniformly (in batches, discarding repeated pairs)
+    """
+    edges = np.empty((0, 2), dtype=np.int64)
+    while len(edges) < m:
+        pairs = rng.integers(0, n, size=(2 * (m - len(edges)) + 16, 2))
+        pairs = np.sort(pairs[pairs[:, 0] != pairs[:, 1]], axis=1)
+        edges = np.unique(np.concatenate((edges, pairs)), axis=0)
+    return edges[rng.permutation(len(edges))[:m]]
+
+
+def graph_statistics(adjacency, path_mode='sampled', n_path_samples=500,
+                     seed=None, n_workers=1):
+    """
+    Clustering (average and transitivity), path length (mean and 90%
+    effective diameter, exact or from n_path_samples sources) and spectral
+    (largest eigenvalue) statistics of a graph, self-loops ignored
+    """
+    adjacency = simple_adjacency(adjacency)
+    _, average, transitivity = clustering_coefficients(adjacency, n_workers)
+    if path_mode == 'exact':
+        hist = shortest_path_histogram(adjacency, n_workers=n_workers)
+    elif path_mode == 'sampled':
+        hist, _ = sampled_path_histogram(
+            adjacency, min(n_path_samples, adjacency.shape[0]), seed=seed,
+            n_workers=n_workers)
+    else:
+        raise ValueError(f'Unknown shortest paths mode: {path_mode}')
+    return {'average_clustering': average,
+            'transitivity': transitivity,
+            'mean_path_length': path_length_stats(hist)[0],
+            'effective_diameter': effective_diameter(hist),
+            'lambda_max': extreme_eigenvalues(adjacency)[-1]}
+
+
+def _sample_statistics(model, seed):
+    """
+    Statistics of one sample of the null model described by the model dict
+    (see null_model_ensemble)
+    """
+    rng = np.random.default_rng(seed)
+    n = len(model['degree'])
+    if model['name'] == 'configuration':
+        edges = configuration_model_edges(model['degree'], rng)
+    else:
+        edges = erdos_renyi_edges(n, model['m'], rng)
+    return graph_statistics(edges_to_csr(edges, n), model['path_mode'],
+                            model['n_path_samples'], seed)
+
+
+def null_model_ensemble(adjacency, model='configuration', n_samples=20,
+                        seed=0, n_workers=None, path_mode='sampled',
+                        n_path_samples=500):
+    """
+    Statistics (see graph_statistics) of n_samples random graphs matched to
+    the given one: 'configuration' keeps its degree sequence, 'erdos_renyi'
+    its number of nodes and edges. Samples are spread over n_workers
+    processes. Returns a dict statistic -> array over the samples
+    """
+    adjacency = simple_adjacency(adjacency)
+    degree = np.diff(adjacency.indptr)
+    if model not in ('configuration', 'erdos_renyi'):
+        raise ValueError(f'Unknown null model: {model}')
+    setup = {'name': model, 'degree': degree, 'm': int(degree.sum() // 2),
+             'path_mode': path_mode, 'n_path_samples': n_path_samples}
+    seeds = np.random.SeedSequence(seed).generate_state(n_samples).tolist()
+    if n_workers is None:
+        n_workers = os.cpu_count()
+
+    sample_statistics = partial(_sample_statistics, setup)
+    if n_workers > 1 and n_samples > 1:
+        with Pool(processes=n_workers) as pool:
+            samples = pool.map(sample_statistics, seeds)
+    else:
+        samples = [sample_statistics(sample_seed) for sample_seed in seeds]
+    return {name: np.array([sample[name] for sample in samples])
+            for name in samples[0]}
+
+
+def z_scores(observed, ensemble):
+    """
+    z-score of each observed statistic against the null-model ensemble.
+    Returns a dict statistic -> (z, ensemble mean, ensemble std)
+    """
+    scores = {}
+    for name, values in ensemble.items():
+        mean, std = np.mean(values), np.std(values, ddof=1)
+        z = (observed[name] - mean) / std if std > 0 else np.nan
+        scores[name] = (z, mean, std)
+    return scores
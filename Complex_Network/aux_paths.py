@@ -0,0 +1,260 @@
+import os
+from functools import partial
+from multiprocessing import Pool
+import numpy as np
+from scipy import stats
+from scipy.sparse.csgraph import breadth_first_order
+
+
+def _bfs_levels(adjacency, source):
+    """
+    Number of nodes at each distance from source, from a level-by-level
+    BFS over the (symmetric) CSR adjacency: the BFS order visits the nodes
+    by increasing distance, and each level ends right after the last node
+    whose parent lies in the previous level. Only O(N) memory is used
+    """
+    order, predecessors = breadth_first_order(
+        adjacency, source, directed=True, return_predecessors=True)
+    position = np.empty(adjacency.shape[0], dtype=np.int64)
+    position[order] = np.arange(len(order))
+    # Positions of the parents, nondecreasing along the BFS order
+    parents = position[predecessors[order[1:]]]
+    ends = [0, 1]
+    while ends[-1] < len(order):
+        ends.append(1 + np.searchsorted(parents, ends[-1]))
+    return np.diff(ends)
+
+
+def _bfs_histogram(adjacency, sources):
+    """
+    Histogram of the distances from the given sources to every reachable
+    node
+    """
+    return _merge_histograms([_bfs_levels(adjacency, source)
+                              for source in sources])
+
+
+def _bfs_source_histograms(adjacency, sources):
+    """
+    One distance histogram per source
+    """
+    return [_bfs_levels(adjacency, source) for source in sources]
+
+
+def _merge_histograms(histograms):
+    hist = np.zeros(max(len(h) for h in histograms), dtype=np.int64)
+    for h in histograms:
+        hist[:len(h)] += h
+    return hist
+
+
+def _map_chunks(function, adjacency, sources, n_workers, chunks_per_worker):
+    """
+    Applies function(adjacency, chunk) to chunks of sources (about
+    chunks_per_worker per process, to balance the load) over a pool of
+    n_workers processes. The adjacency is passed with every task rather
+    than kept in a module global, so concurrent callers cannot mix graphs
+    """
+    if n_workers is None:
+        n_workers = os.cpu_count()
+    adjacency = adjacency.tocsr()
+    n_chunks = max(1, min(len(sources), n_workers * chunks_per_worker))
+    chunks = [chunk for chunk in np.array_split(sources, n_chunks)
+              if len(chunk)]
+
+    function = partial(function, adjacency)
+    if n_workers > 1 and len(chunks) > 1:
+        with Pool(processes=n_workers) as pool:
+            return pool.map(function, chunks)
+    return [function(chunk) for chunk in chunks]
+
+
+def shortest_path_histogram(adjacency, sources=None, n_workers=None,
+                            chunks_per_worker=4):
+    """
+    Distribution of shortest path lengths of a graph given by its symmetric
+    sparse adjacency matrix, without storing any distance: a level-by-level
+    BFS is run from every source, keeping only the number of nodes at each
+    distance. The sources are split in chunks (chunks_per_worker per
+    process) spread over n_workers processes.
+    Returns hist, hist[d] being the number of ordered (source, target)
+    pairs at distance d (including the d=0 pair of each source, as
+    nx.all_pairs_shortest_path_length does; unreachable pairs are left out)
+    """
+    if sources is None:
+        sources = np.arange(adjacency.shape[0])
+    return _merge_histograms(_map_chunks(_bfs_histogram, adjacency, sources,
+                                         n_workers, chunks_per_worker))
+
+
+def path_length_stats(hist):
+    """
+    Mean shortest path length and diameter from a path length histogram
+    """
+    lengths = np.arange(len(hist))
+    return np.sum(lengths * hist) / np.sum(hist), lengths[hist > 0].max()
+
+
+def effective_diameter(hist, q=0.9):
+    """
+    Effective diameter: (interpolated) distance within which a fraction q
+    of the pairs of different connected nodes lie
+    """
+    cumulative = np.cumsum(hist[1:]) / np.sum(hist[1:])
+    h = np.searchsorted(cumulative, q)
+    if h == 0:
+        return q / cumulative[0]
+    return h + (q - cumulative[h - 1]) / (cumulative[h] - cumulative[h - 1])
+
+
+def hop_plot(hist):
+    """
+    Hop-plot: number of pairs (including self pairs) within distance h
+    """
+    return np.cumsum(hist)
+
+
+def _padded(arrays):
+    out = np.zeros((len(arrays), max(len(a) for a in arrays)))
+    for ii, a in enumerate(arrays):
+        out[ii, :len(a)] = a
+    return out
+
+
+def _interval(values, confidence):
+    return tuple(np.nanquantile(values, [(1 - confidence) / 2,
+                                         (1 + confidence) / 2]))
+
+
+def sampled_path_histogram(adjacency, n_samples=500, seed=None,
+                           confidence=0.95, n_bootstrap=1000,
+                           n_workers=None, chunks_per_worker=4):
+    """
+    Approximate shortest path length distribution by BFS from n_samples
+    uniformly sampled sources, scaled to all the sources of the graph.
+    Returns the estimated histogram (see shortest_path_histogram) and
+    bootstrap (over sources) confidence intervals of the mean path length
+    and effective diameter, as {'mean': (low, high),
+    'effective_diameter': (low, high)}
+    """
+    n = adjacency.shape[0]
+    rng = np.random.default_rng(seed)
+    sources = np.sort(rng.choice(n, min(n_samples, n), replace=False))
+    per_source = _padded([row for hist in _map_chunks(
+        _bfs_source_histograms, adjacency, sources, n_workers,
+        chunks_per_worker) for row in hist])
+    hist = per_source.sum(axis=0) * n / len(sources)
+
+    # Bootstrap: resample the sources with replacement
+    weights = rng.multinomial(len(sources), np.full(len(sources),
+                                                    1 / len(sources)),
+                              size=n_bootstrap)
+    samples = weights @ per_source
+    means = [path_length_stats(sample)[0] for sample in samples]
+    diameters = [effective_diameter(sample) for sample in samples]
+    return hist, {'mean': _interval(means, confidence),
+                  'effective_diameter': _interval(diameters, confidence)}
+
+
+def _hash64(x, seed):
+    """
+    splitmix64 hash of an array of integers
+    """
+    with np.errstate(over='ignore'):
+        z = x.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15) * \
+            np.uint64(2 * seed + 1)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def _leading_zeros(w):
+    """
+    Number of leading zeros of each 64 bits word of an array
+    """
+    zeros = np.zeros(w.shape, dtype=np.int64)
+    w = w.copy()
+    for shift in (32, 16, 8, 4, 2, 1):
+        empty = (w >> np.uint64(64 - shift)) == 0
+        zeros[empty] += shift
+        w[empty] <<= np.uint64(shift)
+    zeros[w == 0] = 64
+    return zeros
+
+
+def _hyperloglog_estimate(registers):
+    """
+    HyperLogLog estimate of the cardinality of each row of registers
+    """
+    m = registers.shape[1]
+    alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+    estimate = alpha * m ** 2 / np.sum(2.0 ** -registers.astype(float), axis=1)
+    # Small range correction (linear counting)
+    zeros = np.count_nonzero(registers == 0, axis=1)
+    small = (estimate <= 2.5 * m) & (zeros > 0)
+    estimate[small] = m * np.log(m / zeros[small])
+    return estimate
+
+
+def hyperanf_histogram(adjacency, log2m=6, seed=0, max_iter=1000,
+                       block_size=2**16):
+    """
+    Approximate shortest path length distribution with HyperANF: every
+    node keeps a HyperLogLog counter (2**log2m registers) of the ball of
+    radius t around it, and the ball of radius t+1 is the union of the
+    balls of its neighbors, i.e. a register-wise maximum. The sum of the
+    counters gives the neighborhood function N(t), whose differences are
+    the estimated histogram (see shortest_path_histogram).
+    Each iteration costs O(E 2**log2m), and it stops when no counter grows
+    """
+    adjacency = adjacency.tocsr()
+    n = adjacency.shape[0]
+    m = 2 ** log2m
+    indptr, indices = adjacency.indptr, adjacency.indices
+
+    # Each node is added to its own counter
+    h = _hash64(np.arange(n), seed)
+    registers = np.zeros((n, m), dtype=np.uint8)
+    registers[np.arange(n), (h >> np.uint64(64 - log2m)).astype(np.int64)] = \
+        np.minimum(_leading_zeros(h << np.uint64(log2m)) + 1, 64 - log2m + 1)
+
+    neighborhood = [np.sum(_hyperloglog_estimate(registers))]
+    for _ in range(max_iter):
+        new = registers.copy()
+        # Register-wise maximum over the neighbors, in blocks of nodes
+        for start in range(0, n, block_size):
+            stop = min(start + block_size, n)
+            rows = np.arange(start, stop)
+            rows = rows[indptr[rows + 1] > indptr[rows]]
+            if not len(rows):
+                continue
+            gathered = registers[indices[indptr[rows[0]]:indptr[rows[-1] + 1]]]
+            new[rows] = np.maximum(new[rows], np.maximum.reduceat(
+                gathered, indptr[rows] - indptr[rows[0]], axis=0))
+        if np.array_equal(new, registers):
+            break
+        registers = new
+        neighborhood.append(np.sum(_hyperloglog_estimate(registers)))
+
+    return np.diff(np.concatenate(([0], np.maximum.accumulate(neighborhood))))
+
+
+def hyperanf_path_histogram(adjacency, log2m=6, n_runs=8, seed=0,
+                            confidence=0.95):
+    """
+    Averages hyperanf_histogram over n_runs independent hash functions.
+    Returns the estimated histogram and confidence intervals (normal
+    approximation over the runs) of the mean path length and effective
+    diameter, as in sampled_path_histogram
+    """
+    runs = _padded([hyperanf_histogram(adjacency, log2m, seed + ii)
+                    for ii in range(n_runs)])
+    z = stats.norm.ppf((1 + confidence) / 2)
+    intervals = {}
+    for name, values in [
+            ('mean', [path_length_stats(run)[0] for run in runs]),
+            ('effective_diameter', [effective_diameter(run) for run in runs])]:
+        error = z * np.std(values, ddof=1) / np.sqrt(n_runs) \
+            if n_runs > 1 else np.nan
+        intervals[name] = (np.mean(values) - error, np.mean(values) + error)
+    return runs.mean(axis=0), intervals
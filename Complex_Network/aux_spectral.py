@@ -0,0 +1,113 @@
+import numpy as np
+import scipy.sparse.linalg as sp_linalg
+from aux_network import compute_rho_array
+
+
+def adjacency_spectrum(adjacency):
+    """
+    Full spectrum of a symmetric adjacency matrix (symmetric solver,
+    needs O(N^2) memory)
+    """
+    return np.linalg.eigvalsh(adjacency.toarray())
+
+
+def extreme_eigenvalues(adjacency, num_eigenvalues=1, which='LA', tol=1e-8):
+    """
+    Extreme eigenvalues of a sparse symmetric matrix with the Lanczos
+    algorithm: 'LA' largest, 'SA' smallest (algebraic), 'BE' both ends
+    """
+    eigenvalues = sp_linalg.eigsh(adjacency.astype(float), k=num_eigenvalues,
+                                  which=which, tol=tol,
+                                  return_eigenvectors=False)
+    return np.sort(eigenvalues)
+
+
+def spectral_bounds(adjacency, margin=0.01):
+    """
+    Center b and half-width a such that the spectrum of (A - b)/a lies
+    within [-1, 1] (slightly inside, as needed by Chebyshev expansions)
+    """
+    lower = extreme_eigenvalues(adjacency, which='SA')[0]
+    upper = extreme_eigenvalues(adjacency, which='LA')[-1]
+    a = (upper - lower) / (2 - margin)
+    b = (upper + lower) / 2
+    return a, b
+
+
+def kpm_moments(adjacency, n_moments=512, n_vectors=16, bounds=None,
+                seed=None):
+    """
+    Chebyshev moments mu_k = Tr[T_k(H)]/N of the rescaled adjacency
+    H = (A - b)/a, with the trace estimated stochastically over n_vectors
+    random +-1 vectors. Only sparse products are needed, O(E) memory.
+    Returns the moments and the (a, b) rescaling used
+    """
+    if bounds is None:
+        bounds = spectral_bounds(adjacency)
+    a, b = bounds
+    n = adjacency.shape[0]
+    adjacency = adjacency.tocsr().astype(float)
+    rng = np.random.default_rng(seed)
+    v = rng.choice([-1.0, 1.0], size=(n, n_vectors))
+
+    def rescaled(x):
+        return (adjacency @ x - b * x) / a
+
+    # Two moments per product: mu_2k = 2 <T_k, T_k> - mu_0 and
+    # mu_2k+1 = 2 <T_k+1, T_k> - mu_1
+    mu = np.zeros(n_moments)
+    t_prev, t_curr = v, rescaled(v)
+    mu[0] = 1
+    mu[1] = np.sum(v * t_curr) / (n * n_vectors)
+    for k in range(1, (n_moments + 1) // 2):
+        if 2 * k < n_moments:
+            mu[2 * k] = 2 * np.sum(t_curr * t_curr) / (n * n_vectors) - mu[0]
+        t_prev, t_curr = t_curr, 2 * rescaled(t_curr) - t_prev
+        if 2 * k + 1 < n_moments:
+            mu[2 * k + 1] = 2 * np.sum(t_curr * t_prev) / (n * n_vectors) - \
+                mu[1]
+    return mu, (a, b)
+
+
+def kpm_density(moments, bounds, lambda_array):
+    """
+    Spectral density at lambda_array reconstructed from Chebyshev moments
+    (see kpm_moments) with the Jackson kernel. Normalized to 1, as
+    compute_rho_array
+    """
+    a, b = bounds
+    n_moments = len(moments)
+    k = np.arange(n_moments)
+    jackson = ((n_moments - k + 1) * np.cos(np.pi * k / (n_moments + 1)) +
+               np.sin(np.pi * k / (n_moments + 1)) /
+               np.tan(np.pi / (n_moments + 1))) / (n_moments + 1)
+    x = (np.asarray(lambda_array) - b) / a
+    inside = np.abs(x) < 1
+    theta = np.arccos(np.clip(x, -1, 1))
+    weights = jackson * moments
+    weights[1:] *= 2
+    series = np.cos(np.outer(theta, k)) @ weights
+    rho = np.where(inside, series / (np.pi * np.sqrt(np.maximum(1 - x**2,
+                                                                1e-300))), 0)
+    return np.maximum(rho, 0) / a
+
+
+def spectral_density(adjacency, lambda_array, mode='auto',
+                     max_dense_size=10000, n_moments=512, n_vectors=16,
+                     seed=None):
+    """
+    Spectral density of the adjacency matrix on lambda_array:
+        - 'full': full spectrum (symmetric solver) broadened with
+          compute_rho_array
+        - 'kpm': Kernel Polynomial Method over the sparse matrix
+        - 'auto': 'full' up to max_dense_size nodes, 'kpm' beyond
+    """
+    if mode == 'auto':
+        mode = 'full' if adjacency.shape[0] <= max_dense_size else 'kpm'
+    if mode == 'full':
+        return compute_rho_array(adjacency_spectrum(adjacency), lambda_array)
+    if mode == 'kpm':
+        moments, bounds = kpm_moments(adjacency, n_moments, n_vectors,
+                                      seed=seed)
+        return kpm_density(moments, bounds, lambda_array)
+    raise ValueError(f'Unknown spectral density mode: {mode}')
@@ -0,0 +1,312 @@
+import hashlib
+import inspect
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import networkx as nx
+from aux_network import (load_edge_array, edges_to_csr, compute_rho_array,
+                         compute_rho_array_random,
+                         connected_component_labels)
+from aux_paths import (shortest_path_histogram, sampled_path_histogram,
+                       hyperanf_path_histogram)
+from aux_spectral import (adjacency_spectrum, extreme_eigenvalues,
+                          kpm_moments, kpm_density)
+from aux_clustering import clustering_coefficients
+from aux_layout import approximate_layout
+from aux_null_models import graph_statistics, null_model_ensemble
+from aux_centrality import (eigenvector_centrality, pagerank,
+                            katz_centrality, betweenness_centrality)
+from aux_categories import load_category_index, category_statistics
+
+# Registered analysis stages: name -> function, required stages, helper
+# modules, cached
+STAGES = {}
+# Parameters which only spread the work of a stage over processes: they
+# do not change its outputs, so they are left out of the cache keys
+EXECUTION_PARAMS = ('n_workers',)
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def stage(name, requires=(), sources=(), cached=True):
+    """
+    Registers a stage function f(data, **params), data being the merged
+    outputs of the required stages. It must return a dict of arrays
+    (stored as .npz when cached). sources are the helper modules doing
+    the work of the stage (imported ones included): editing any of them
+    invalidates its cached outputs
+    """
+    def register(function):
+        STAGES[name] = {'function': function, 'requires': tuple(requires),
+                        'sources': tuple(sources), 'cached': cached}
+        return function
+    return register
+
+
+@stage('load', sources=('aux_network',), cached=False)
+def load_stage(data, file):
+    edges, node_ids = load_edge_array(file)
+    return {'edges': edges, 'node_ids': node_ids,
+            'adjacency': edges_to_csr(edges, len(node_ids))}
+
+
+@stage('degree', requires=('load',))
+def degree_stage(data):
+    adjacency = data['adjacency']
+    # Self-loops count twice, as in graph.degree()
+    degree = np.asarray(adjacency.sum(axis=1)).ravel().astype(np.int64) + \
+        adjacency.diagonal().astype(np.int64)
+    return {'degree': degree, 'histogram': np.bincount(degree)}
+
+
+@stage('clustering', requires=('load',), sources=('aux_clustering',))
+def clustering_stage(data, n_workers=None):
+    local, average, transitivity = clustering_coefficients(
+        data['adjacency'], n_workers)
+    return {'local': local, 'average': average, 'transitivity': transitivity}
+
+
+@stage('paths', requires=('load',), sources=('aux_paths',))
+def paths_stage(data, mode='exact', seed=42, n_workers=None):
+    intervals = {'mean': (np.nan, np.nan),
+                 'effective_diameter': (np.nan, np.nan)}
+    if mode == 'exact':
+        hist = shortest_path_histogram(data['adjacency'],
+                                       n_workers=n_workers)
+    elif mode == 'sampled':
+        hist, intervals = sampled_path_histogram(data['adjacency'], seed=seed,
+                                                 n_workers=n_workers)
+    elif mode == 'hyperanf':
+        hist, intervals = hyperanf_path_histogram(data['adjacency'],
+                                                  seed=seed)
+    else:
+        raise ValueError(f'Unknown shortest paths mode: {mode}')
+    return {'hist': hist, 'mean_interval': intervals['mean'],
+            'effective_diameter_interval': intervals['effective_diameter']}
+
+
+@stage('spectrum', requires=('load', 'degree'),
+       sources=('aux_spectral', 'aux_network'))
+def spectrum_stage(data, mode='auto', max_dense_size=10000, seed=42):
+    N = data['adjacency'].shape[0]
+    p = np.mean(data['degree']) / N
+    factor = np.sqrt(N * p * (1-p))
+
+    # Full spectrum (symmetric solver) for moderate sizes, otherwise the
+    # density is estimated with the Kernel Polynomial Method
+    if mode == 'auto':
+        mode = 'full' if N <= max_dense_size else 'kpm'
+    if mode == 'full':
+        eigenvalues = adjacency_spectrum(data['adjacency'])
+        lambda_min, lambda_max = np.min(eigenvalues), np.max(eigenvalues)
+        median = np.median(eigenvalues)
+    else:
+        lambda_min, lambda_max = extreme_eigenvalues(data['adjacency'], 2,
+                                                     'BE')
+        median = np.nan
+
+    lambda_array = np.linspace(min(lambda_min, -3*factor), lambda_max, 1000)
+    if mode == 'full':
+        rho = compute_rho_array(eigenvalues, lambda_array)
+    else:
+        moments, bounds = kpm_moments(data['adjacency'], seed=seed)
+        rho = kpm_density(moments, bounds, lambda_array)
+
+    return {'lambda_array': lambda_array, 'rho': rho,
+            'rho_random': compute_rho_array_random(N, p, lambda_array),
+            'lambda_max': lambda_max, 'median': median, 'p': p,
+            'factor': factor}
+
+
+@stage('centrality', requires=('load',),
+       sources=('aux_centrality', 'aux_network', 'aux_spectral',
+                'aux_clustering'))
+def centrality_stage(data, n_samples=None, seed=42, n_workers=None):
+    adjacency = data['adjacency']
+    return {'eigenvector': eigenvector_centrality(adjacency),
+            'pagerank': pagerank(adjacency),
+            'katz': katz_centrality(adjacency),
+            'betweenness': betweenness_centrality(adjacency, n_samples, seed,
+                                                  n_workers=n_workers)}
+
+
+@stage('categories', requires=('load',),
+       sources=('aux_categories', 'aux_network'))
+def categories_stage(data, file):
+    membership, names = load_category_index(file, data['node_ids'])
+    statistics = category_statistics(data['edges'], membership)
+    statistics['names'] = names
+    return statistics
+
+
+@stage('layout', requires=('load',), sources=('aux_layout',))
+def layout_stage(data, method='spring', **params):
+    graph = nx.Graph()
+    graph.add_nodes_from(range(len(data['node_ids'])))
+    graph.add_edges_from(np.asarray(data['edges']).tolist())
+    if method == 'spring':
+        layout = nx.spring_layout(graph, **params)
+    elif method == 'approximate':
+        layout = approximate_layout(graph, **params)
+    else:
+        raise ValueError(f'Unknown layout method: {method}')
+    return {'positions': np.array([layout[node] for node in graph.nodes])}
+
+
+@stage('components', requires=('load',), sources=('aux_network',))
+def components_stage(data):
+    labels, sizes = connected_component_labels(data['adjacency'])
+    return {'labels': labels, 'sizes': sizes}
+
+
+@stage('null_models', requires=('load',),
+       sources=('aux_null_models', 'aux_network', 'aux_paths',
+                'aux_spectral', 'aux_clustering'))
+def null_models_stage(data, models=('configuration', 'erdos_renyi'),
+                      n_samples=20, seed=0, n_workers=None,
+                      path_mode='sampled', n_path_samples=500):
+    observed = graph_statistics(data['adjacency'], path_mode, n_path_samples,
+                                seed, n_workers)
+    outputs = {'names': np.array(list(observed)),
+               'observed': np.array(list(observed.values()))}
+    for model in models:
+        ensemble = null_model_ensemble(data['adjacency'], model, n_samples,
+                                       seed, n_workers, path_mode,
+                                       n_path_samples)
+        outputs[model] = np.stack([ensemble[name] for name in observed],
+                                  axis=1)
+    return outputs
+
+
+def graph_hash(edges, n):
+    """
+    Hash of a graph given as an edge array between nodes 0..n-1
+    """
+    digest = hashlib.sha1(np.ascontiguousarray(edges, dtype=np.int64))
+    digest.update(str(n).encode())
+    return digest.hexdigest()
+
+
+def code_version(modules):
+    """
+    Hash of the source files of the given helper modules
+    """
+    sha = hashlib.sha1()
+    for module in modules:
+        with open(os.path.join(MODULE_DIR, f'{module}.py'), 'rb') as f:
+            sha.update(f.read())
+    return sha.hexdigest()[:16]
+
+
+def stage_key(name, stage_params, keys):
+    """
+    Cache key of a stage: hash of the input graph, the stage parameters
+    (but EXECUTION_PARAMS), the source code of the stage and of its helper
+    modules and the keys of its dependencies
+    """
+    info = STAGES[name]
+    return hashlib.sha1(json.dumps({
+        'stage': name,
+        'graph': keys['graph'],
+        'params': {param: value for param, value in stage_params.items()
+                   if param not in EXECUTION_PARAMS},
+        'code': inspect.getsource(info['function']),
+        'sources': code_version(info['sources']),
+        'requires': [keys[required] for required in info['requires']]},
+        sort_keys=True, default=str).encode()).hexdigest()
+
+
+def stage_order(names):
+    """
+    Required stages of names (dependencies included), grouped in waves of
+    stages whose dependencies belong to previous waves
+    """
+    needed = set()
+    pending = list(names)
+    while pending:
+        name = pending.pop()
+        if name not in needed:
+            needed.add(name)
+            pending += STAGES[name]['requires']
+
+    waves = []
+    done = set()
+    while len(done) < len(needed):
+        wave = sorted(name for name in needed - done
+                      if set(STAGES[name]['requires']) <= done)
+        waves.append(wave)
+        done.update(wave)
+    return waves
+
+
+def compute_stage(name, data, stage_params):
+    """
+    Outputs of a stage as arrays and the time taken to compute them
+    """
+    t0 = time.time()
+    outputs = {output: np.asarray(value) for output, value in
+               STAGES[name]['function'](data, **stage_params).items()}
+    return outputs, time.time() - t0
+
+
+def run_stages(names, params=None, cache_dir='./cache', n_processes=None):
+    """
+    Runs the named stages and their dependencies. params maps stage names
+    to keyword arguments (params['load']['file'] is the edge list).
+    Outputs of cached stages are stored in cache_dir under the key of
+    stage_key, so only invalidated stages are recomputed.
+    The stages of a wave that have to be computed run concurrently, each
+    in its own process (at most n_processes at once), and every stage may
+    spread its work over a pool of processes (see their n_workers
+    parameter).
+    Returns a dict stage name -> dict of outputs
+    """
+    if params is None:
+        params = {}
+    results = {}
+    keys = {}
+    for wave in stage_order(names):
+        pending = []
+        for name in wave:
+            info = STAGES[name]
+            data = {}
+            for required in info['requires']:
+                data.update(results[required])
+            stage_params = params.get(name, {})
+            if not info['cached']:
+                results[name] = info['function'](data, **stage_params)
+                keys[name] = None
+                if name == 'load':
+                    keys['graph'] = graph_hash(
+                        results['load']['edges'],
+                        len(results['load']['node_ids']))
+                continue
+
+            keys[name] = stage_key(name, stage_params, keys)
+            file = os.path.join(cache_dir, f'{name}_{keys[name]}.npz')
+            if os.path.exists(file):
+                with np.load(file) as stored:
+                    results[name] = dict(stored)
+                print(f'Stage {name}: loaded from cache')
+            else:
+                pending.append((name, data, stage_params, file))
+
+        if len(pending) > 1:
+            with ProcessPoolExecutor(
+                    max_workers=n_processes or len(pending)) as executor:
+                futures = [executor.submit(compute_stage, name, data,
+                                           stage_params)
+                           for name, data, stage_params, _ in pending]
+                computed = [future.result() for future in futures]
+        else:
+            computed = [compute_stage(name, data, stage_params)
+                        for name, data, stage_params, _ in pending]
+        for (name, _, _, file), (outputs, elapsed) in zip(pending, computed):
+            results[name] = outputs
+            if not os.path.exists(cache_dir):
+                os.makedirs(cache_dir)
+            np.savez(file, **outputs)
+            print(f'Stage {name}: computed in {elapsed:.2f} s')
+
+    return results
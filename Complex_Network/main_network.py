@@ -1,286 +1,403 @@
+import argparse
 import time
 import datetime
 import os
-import matplotlib.pyplot as plt
-from scipy.stats import poisson
-from aux_network import *
-
-# Identify the test (for saving results)
-current_time = datetime.datetime.now()
-id_test = 'net_' + current_time.strftime("%Y-%m-%d_%H-%M-%S")
-# Create folder for results
-if not os.path.exists('./tests/' + id_test):
-    os.makedirs('./tests/' + id_test)
-
-t0 = time.time()
-
-# Load the edges from the file
-edges_file = './data/CA-GrQc.txt'
-graph = load_graph_edges(edges_file)
-
-
-# Print basic information about the network
-print('Number of nodes:', graph.number_of_nodes())
-print('Number of edges:', graph.number_of_edges())
-p = 0
-# print('Number of categories:', len(categories))
-print('Elapsed time for loading: ', time.time()-t0)
-print()
-t0 = time.time()
-
-
-# Get the cumulative distribution of node degrees
-degree = dict(graph.degree())
-if True:
-    degree_histogram = nx.degree_histogram(graph)
-    # Calculate the cumulative distribution
-    degree_cumulative = np.cumsum(degree_histogram)
-
-    print('Average degree of the network: <k>=', np.mean(list(degree.values())))
-    p = np.mean(list(degree.values())) / graph.number_of_nodes()
-    print('Probability of 2 random nodes connected: p=', p)
-    N = graph.number_of_nodes()
+import numpy as np
+import networkx as nx
+from aux_network import component_nodes, component_size_histogram
+from aux_paths import (path_length_stats, effective_diameter,
+                       shortest_path_histogram, sampled_path_histogram,
+                       hyperanf_path_histogram)
+from aux_null_models import z_scores
+from aux_stages import run_stages
+
+
+# Stages of the analysis to run (their dependencies are run as well).
+# Outputs are cached in ./cache, so only the stages whose input graph,
+# parameters or code changed are recomputed. Add 'categories' when a
+# Category:<name>;<nodes> file is available for the network
+DEFAULT_STAGES = ['degree', 'clustering', 'paths', 'spectrum',
+                  'centrality', 'layout', 'components', 'null_models']
+DEFAULT_PARAMS = {
+    'load': {'file': './data/CA-GrQc.txt'},
+    # Shortest paths: 'exact' (BFS from every node), 'sampled' (BFS
+    # from a sample of sources) or 'hyperanf' (HyperLogLog counters)
+    'paths': {'mode': 'exact', 'seed': 42},
+    # Spectral density: 'full' spectrum, 'kpm' (Kernel Polynomial
+    # Method) or 'auto' (full spectrum up to max_dense_size nodes)
+    'spectrum': {'mode': 'auto', 'max_dense_size': 10000, 'seed': 42},
+    # Betweenness from every node (n_samples=None) or from a sample of
+    # sources for large graphs
+    'centrality': {'n_samples': None, 'seed': 42},
+    # Layout of the network plots: 'spring' (nx.spring_layout) or
+    # 'approximate' (faster Barnes-Hut style layout for large graphs)
+    'layout': {
+        'method': 'spring',
+        'k': 0.3,  # Adjust the optimal distance between nodes
+        'iterations': 100,  # Increase the number of iterations
+        'scale': 2,  # Adjust the scaling factor
+        'center': (0, 0),  # Specify the center coordinates
+        'seed': 42,  # Set a specific random seed
+    },
+    # Node categories (per category induced-subgraph statistics)
+    'categories': {'file': './data/categories.txt'},
+    # Random graphs matched to the network (configuration model keeps
+    # the degrees, Erdos-Renyi the number of edges) used as baselines
+    'null_models': {'models': ('configuration', 'erdos_renyi'),
+                    'n_samples': 20, 'seed': 0, 'path_mode': 'sampled'},
+}
+
+
+def analyze_network(stages=None, params=None, cache_dir='./cache'):
+    """
+    Runs the given stages of the analysis (and their dependencies) with
+    the params of each stage (missing stages take DEFAULT_PARAMS).
+    Returns the outputs of every stage run, by stage name
+    """
+    stages = DEFAULT_STAGES if stages is None else stages
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    return run_stages(stages, params, cache_dir=cache_dir)
+
+
+def print_summary(results, stages, params=None, check_approximate=False):
+    """
+    Prints the statistics of the network computed by the given stages.
+    If check_approximate, both shortest path approximations are compared
+    with the exact one
+    """
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    # Print basic information about the network
+    edges = results['load']['edges']
+    node_ids = results['load']['node_ids']
+    adjacency = results['load']['adjacency']
+    N = len(node_ids)
+    print('Number of nodes:', N)
+    print('Number of edges:', len(edges))
     print()
 
-    # Baseline: random network with theoretical poisson distribution
-    x = np.arange(0, N)  # Range of values to calculate CDF
-    poisson_cdf = poisson.cdf(x, mu=np.mean(list(degree.values())))
-
-    # Plotting the cumulative distribution
-    plt.figure(figsize=(8, 6))
-    plt.plot(range(len(degree_cumulative)),
-             1-degree_cumulative/max(degree_cumulative),
-             'b', label='arXiv network')
-    plt.plot(x, 1-poisson_cdf, 'k--', label='random network')
-    plt.xlim([1, len(degree_cumulative)])
-    plt.ylim([0, 1])
-    plt.xlabel('Degree')
-    plt.ylabel('Cumulative [% of nodes]')
-    plt.grid('minor')
-    plt.legend()
-    plt.title('Degree Cumulative Distribution')
-    plt.savefig(f'./tests/{id_test}/degree_cumulative.png')
-
-    plt.figure(figsize=(8, 6))
-    plt.semilogy(range(len(degree_cumulative)),
-               1-degree_cumulative/max(degree_cumulative),
-               'b', label='arXiv network')
-    plt.semilogy(x, 1-poisson_cdf, 'k--', label='random network')
-    plt.xlim([1, len(degree_cumulative)])
-    plt.ylim([1e-5, 1])
-    plt.xlabel('Degree')
-    plt.ylabel('Cumulative [% of nodes]')
-    plt.grid('minor')
-    plt.legend()
-    plt.title('Degree Cumulative Distribution')
-    plt.savefig(f'./tests/{id_test}/degree_cumulative_semilogy.png')
-
-    plt.figure(figsize=(8, 6))
-    plt.loglog(range(len(degree_cumulative)),
-               1-degree_cumulative/max(degree_cumulative),
-               'b', label='arXiv network')
-    plt.loglog(x, 1-poisson_cdf, 'k--', label='random network')
-    plt.xlim([1, len(degree_cumulative)])
-    plt.ylim([1e-10, 1])
-    plt.xlabel('Degree')
-    plt.ylabel('Cumulative [% of nodes]')
-    plt.grid('minor')
-    plt.legend()
-    plt.title('Degree Cumulative Distribution')
-    plt.savefig(f'./tests/{id_test}/degree_cumulative_log.png')
-
-
-# Calculate clustering coefficient for each node
-if True:
-    clustering_coefficients = nx.clustering(graph)
-    # Get the sorted clustering coefficients
-    sorted_coefficients = np.sort(list(clustering_coefficients.values()))
-    # Calculate cumulative distribution
-    num_nodes = len(sorted_coefficients)
-    clustering_vals = np.linspace(0, 1, 1001)
-    cumulative_distribution = np.searchsorted(sorted_coefficients,
-                                              clustering_vals, side='right')
-
-    # Plotting the cumulative distribution
-    plt.figure(figsize=(8, 6))
-    plt.plot(clustering_vals, 1-cumulative_distribution/num_nodes, 'b')
-    plt.xlim([0, 1])
-    plt.ylim([0, 1])
-    plt.xlabel('Clustering Coefficient')
-    plt.ylabel('Cumulative [% of nodes]')
-    plt.grid()
-    plt.title('Clustering Coefficient Cumulative Distribution')
-    plt.savefig(f'./tests/{id_test}/clustering_cumulative.png')
-
-    print('Average clustering coefficient of the network: ',
-          np.mean(sorted_coefficients))
-    print()
-
-
-# Compute the shortest paths for all pairs
-if True:
-    shortest_paths = dict(nx.all_pairs_shortest_path_length(graph))
-    path_lengths = [length for paths in shortest_paths.values()
-                    for length in paths.values()]
-    hist, bins = np.histogram(path_lengths, bins=range(max(path_lengths)+2))
-
-    # Plotting the histogram
-    plt.figure(figsize=(8, 6))
-    plt.bar(bins[:-1], hist, width=1)
-    plt.xlim([0, max(path_lengths) + 1])
-    plt.xlabel('Shortest Path Length')
-    plt.ylabel('Frequency')
-    plt.grid()
-    plt.title('Distribution of Shortest Path Lengths')
-    plt.savefig(f'./tests/{id_test}/shortest_path_hist.png')
-
-    print('Average shortest path between 2 points of the network: ',
-          np.mean(path_lengths))
-    print('Diameter of the network: ', np.max(path_lengths))
-    print()
-
-# Compute the Spectral density
-if True:
-    if not p:
-        degree = dict(graph.degree())
-        p = np.mean(list(degree.values())) / graph.number_of_nodes()
-        N = graph.number_of_nodes()
-    factor = np.sqrt(N * p * (1-p))
-
-    # Get the adjacency matrix of the graph
-    adj_matrix = nx.adjacency_matrix(graph).toarray()
-
-    # Compute the eigenvalues
-    eigenvalues = np.real(np.linalg.eigvals(adj_matrix))
-
-    print('Max eigenvalue of adjacent matrix of the network: ',
-          np.max(eigenvalues))
-    print('Median eigenvalue: ', np.median(eigenvalues))
-    print()
-
-    lambda_array = np.linspace(min(min(eigenvalues), -3*factor),
-                               max(eigenvalues), 1000)
-    rho = compute_rho_array(eigenvalues, lambda_array)
-
-    rho_random = compute_rho_array_random(N, p, lambda_array)
-
-    # Plot the spectral density
-    plt.figure(figsize=(8, 6))
-    plt.plot(lambda_array / factor, rho * factor,
-             'b', label='arXiv network')
-    plt.plot(lambda_array / factor, rho_random * factor,
-             'k--', label='random network')
-    plt.xlabel('$ \\lambda/\\sqrt{Np(1-p)}$')
-    plt.ylabel('$ \\rho \\sqrt{Np(1-p)}$')
-    plt.xlim([min(lambda_array)/factor, max(lambda_array)/factor])
-    plt.ylim([0, 1.1*max(rho)*factor])
-    plt.legend()
-    plt.grid()
-    plt.title('Spectral Density')
-    plt.savefig(f'./tests/{id_test}/spectral_density.png')
-
-
-print('Elapsed time for computing: ', time.time()-t0)
-print()
-print()
-
-if True:
-    # Plot the network
-    plt.figure(figsize=(8, 8))
-    # Create a layout for the nodes
-    layout = nx.spring_layout(
-        graph,
-        k=0.3,  # Adjust the optimal distance between nodes
-        iterations=100,  # Increase the number of iterations
-        scale=2,  # Adjust the scaling factor
-        center=(0, 0),  # Specify the center coordinates
-        seed=42,  # Set a specific random seed
-    )
-    # Draw nodes
-    nx.draw_networkx_nodes(
-        graph,
-        layout,
-        node_color=list(degree.values()),  # Adjust the node color to colormap
-        cmap='coolwarm',
-        vmin=1,
-        vmax=max(list(degree.values())),
-        node_size=4,  # Adjust the node size as desired
-    )
-    # Draw edges
-    nx.draw_networkx_edges(
-        graph,
-        layout,
-        edge_color='k',  # Adjust the edge color as desired
-        width=0.15,  # Adjust the edge width as desired
-        alpha=0.5,  # Adjust the edge transparency as desired
-    )
-    sm = plt.cm.ScalarMappable(cmap='coolwarm',
-                               norm=plt.Normalize(
-                                   vmin=1, vmax=max(list(degree.values()))))
-    sm.set_array([])
-    cbar = plt.colorbar(sm, label='Degree')
-    plt.title('General Relativity arXiv (1993-2003)')
-    plt.axis('off')
-    plt.savefig(f'./tests/{id_test}/network_schema.png')
-
-if True:
-    # Plot a large copy of the network
-    plt.figure(figsize=(20, 20))
-    # Draw nodes
-    nx.draw_networkx_nodes(
-        graph,
-        layout,
-        node_color=list(degree.values()),  # Adjust the node color to colormap
-        cmap='coolwarm',
-        vmin=1,
-        vmax=max(list(degree.values())),
-        node_size=10,  # Adjust the node size as desired
-    )
-    # Draw edges
-    nx.draw_networkx_edges(
-        graph,
-        layout,
-        edge_color='k',  # Adjust the edge color as desired
-        width=0.15,  # Adjust the edge width as desired
-        alpha=0.5,  # Adjust the edge transparency as desired
-    )
-    sm = plt.cm.ScalarMappable(cmap='coolwarm',
-                               norm=plt.Normalize(
-                                   vmin=1, vmax=max(list(degree.values()))))
-    sm.set_array([])
-    cbar = plt.colorbar(sm, label='Degree')
-    plt.title('General Relativity arXiv (1993-2003)')
-    plt.axis('off')
-    plt.savefig(f'./tests/{id_test}/network_schema.pdf')
-
-# Find subgraphs and plot them
-if True:
-    subgraphs = find_subgraphs_recursive(graph)
-    for ii, subgraph in enumerate(subgraphs):
-        print(f'Subgraph {ii + 1} --> size: '
-              f'{subgraph.number_of_nodes()} nodes')
-        if subgraph.number_of_nodes() < 10:
-            print(f'Nodes: {subgraph.nodes()}')
+    if 'degree' in stages:
+        degree = results['degree']['degree']
+        print('Average degree of the network: <k>=', np.mean(degree))
+        p = np.mean(degree) / N
+        print('Probability of 2 random nodes connected: p=', p)
         print()
 
-    sizes = [subgraph.number_of_nodes() for subgraph in subgraphs]
+    if 'clustering' in stages:
+        print('Average clustering coefficient of the network: ',
+              float(results['clustering']['average']))
+        print('Transitivity of the network: ',
+              float(results['clustering']['transitivity']))
+        print()
 
-    size_counts = {}
-    for size in sizes:
-        if size in size_counts:
-            size_counts[size] += 1
-        else:
-            size_counts[size] = 1
+    if 'paths' in stages:
+        hist = results['paths']['hist']
+        mean_path_length, diameter = path_length_stats(hist)
+        print('Average shortest path between 2 points of the network: ',
+              mean_path_length)
+        print('Diameter of the network: ', diameter)
+        print('Effective diameter (90%) of the network: ',
+              effective_diameter(hist))
+        if params['paths']['mode'] != 'exact':
+            print('Confidence intervals (95%): ',
+                  {'mean': tuple(results['paths']['mean_interval']),
+                   'effective_diameter':
+                       tuple(results['paths']['effective_diameter_interval'])})
+
+        if check_approximate:
+            exact = shortest_path_histogram(adjacency)
+            print()
+            print("{:<10} {:>10} {:>22} {:>10} {:>22}".format(
+                'Method', 'Mean', 'CI', 'Eff. diam', 'CI'))
+            print("{:<10} {:>10.4f} {:>22} {:>10.4f} {:>22}".format(
+                'exact', path_length_stats(exact)[0], '',
+                effective_diameter(exact), ''))
+            for name, (approx, ci) in [
+                    ('sampled', sampled_path_histogram(adjacency, seed=42)),
+                    ('hyperanf', hyperanf_path_histogram(adjacency))]:
+                print("{:<10} {:>10.4f} {:>22} {:>10.4f} {:>22}".format(
+                    name, path_length_stats(approx)[0],
+                    '({:.4f}, {:.4f})'.format(*ci['mean']),
+                    effective_diameter(approx),
+                    '({:.4f}, {:.4f})'.format(*ci['effective_diameter'])))
+        print()
 
-    table = []
-    table.append(("Subgraph Size", "Number of Subgraphs"))
-    for size, count in size_counts.items():
-        table.append((size, count))
+    if 'spectrum' in stages:
+        spectrum = results['spectrum']
+        print('Max eigenvalue of adjacent matrix of the network: ',
+              float(spectrum['lambda_max']))
+        if not np.isnan(spectrum['median']):
+            print('Median eigenvalue: ', float(spectrum['median']))
+        print()
 
-    # Print the table
-    for row in table:
-        print("{:<15} {:<20}".format(*row))
+    # Find subgraphs
+    if 'components' in stages:
+        labels = results['components']['labels']
+        sizes = results['components']['sizes']
+        for ii, nodes in enumerate(component_nodes(labels)):
+            print(f'Subgraph {ii + 1} --> size: {len(nodes)} nodes')
+            if len(nodes) < 10:
+                print(f'Nodes: {node_ids[nodes].tolist()}')
+            print()
+
+        table = []
+        table.append(("Subgraph Size", "Number of Subgraphs"))
+        for size, count in zip(*component_size_histogram(sizes)):
+            table.append((size, count))
+
+        # Print the table
+        for row in table:
+            print("{:<15} {:<20}".format(*row))
+
+    # Most central nodes
+    if 'centrality' in stages:
+        for name in ['eigenvector', 'pagerank', 'katz', 'betweenness']:
+            top = np.argsort(results['centrality'][name])[::-1][:5]
+            print(f'Top {name} centrality nodes: {node_ids[top].tolist()}')
+        print()
 
+    # Categories with the largest modularity contributions
+    if 'categories' in stages:
+        statistics = results['categories']
+        print('Number of categories:', len(statistics['names']))
+        print("{:<30} {:>8} {:>10} {:>10} {:>10} {:>12}".format(
+            'Category', 'Size', 'Internal', 'Density', 'Int. ratio',
+            'Modularity'))
+        for ii in np.argsort(statistics['modularity'])[::-1][:20]:
+            print("{:<30} {:>8} {:>10} {:>10.4f} {:>10.4f} {:>12.6f}".format(
+                statistics['names'][ii][:30], statistics['size'][ii],
+                statistics['internal'][ii], statistics['density'][ii],
+                statistics['internal_ratio'][ii],
+                statistics['modularity'][ii]))
+        print()
 
-# Show plots
-plt.show()
+    # Compare the network with the null-model ensembles
+    if 'null_models' in stages:
+        names = results['null_models']['names']
+        observed = dict(zip(names, results['null_models']['observed']))
+        for model in params['null_models']['models']:
+            ensemble = dict(zip(names, results['null_models'][model].T))
+            print()
+            print(f'Null model: {model} '
+                  f'({params["null_models"]["n_samples"]} samples)')
+            print("{:<20} {:>10} {:>10} {:>10} {:>10}".format(
+                'Statistic', 'Network', 'Mean', 'Std', 'z-score'))
+            for name, (z, mean, std) in z_scores(observed, ensemble).items():
+                print("{:<20} {:>10.4f} {:>10.4f} {:>10.4f} {:>10.2f}".format(
+                    name, observed[name], mean, std, z))
+
+
+def plot_network(results, stages, folder):
+    """
+    Saves the figures of the statistics computed by the given stages
+    in folder
+    """
+    import matplotlib.pyplot as plt
+    from scipy.stats import poisson
+    edges = results['load']['edges']
+    N = len(results['load']['node_ids'])
+
+    # Get the cumulative distribution of node degrees
+    if 'degree' in stages:
+        degree = results['degree']['degree']
+        degree_histogram = results['degree']['histogram']
+        # Calculate the cumulative distribution
+        degree_cumulative = np.cumsum(degree_histogram)
+
+        # Baseline: random network with theoretical poisson distribution
+        x = np.arange(0, N)  # Range of values to calculate CDF
+        poisson_cdf = poisson.cdf(x, mu=np.mean(degree))
+
+        # Plotting the cumulative distribution
+        plt.figure(figsize=(8, 6))
+        plt.plot(range(len(degree_cumulative)),
+                 1-degree_cumulative/max(degree_cumulative),
+                 'b', label='arXiv network')
+        plt.plot(x, 1-poisson_cdf, 'k--', label='random network')
+        plt.xlim([1, len(degree_cumulative)])
+        plt.ylim([0, 1])
+        plt.xlabel('Degree')
+        plt.ylabel('Cumulative [% of nodes]')
+        plt.grid('minor')
+        plt.legend()
+        plt.title('Degree Cumulative Distribution')
+        plt.savefig(f'{folder}/degree_cumulative.png')
+
+        plt.figure(figsize=(8, 6))
+        plt.semilogy(range(len(degree_cumulative)),
+                     1-degree_cumulative/max(degree_cumulative),
+                     'b', label='arXiv network')
+        plt.semilogy(x, 1-poisson_cdf, 'k--', label='random network')
+        plt.xlim([1, len(degree_cumulative)])
+        plt.ylim([1e-5, 1])
+        plt.xlabel('Degree')
+        plt.ylabel('Cumulative [% of nodes]')
+        plt.grid('minor')
+        plt.legend()
+        plt.title('Degree Cumulative Distribution')
+        plt.savefig(f'{folder}/degree_cumulative_semilogy.png')
+
+        plt.figure(figsize=(8, 6))
+        plt.loglog(range(len(degree_cumulative)),
+                   1-degree_cumulative/max(degree_cumulative),
+                   'b', label='arXiv network')
+        plt.loglog(x, 1-poisson_cdf, 'k--', label='random network')
+        plt.xlim([1, len(degree_cumulative)])
+        plt.ylim([1e-10, 1])
+        plt.xlabel('Degree')
+        plt.ylabel('Cumulative [% of nodes]')
+        plt.grid('minor')
+        plt.legend()
+        plt.title('Degree Cumulative Distribution')
+        plt.savefig(f'{folder}/degree_cumulative_log.png')
+
+    # Distribution of the clustering coefficient of each node
+    if 'clustering' in stages:
+        # Get the sorted clustering coefficients
+        sorted_coefficients = np.sort(results['clustering']['local'])
+        # Calculate cumulative distribution
+        num_nodes = len(sorted_coefficients)
+        clustering_vals = np.linspace(0, 1, 1001)
+        cumulative_distribution = np.searchsorted(sorted_coefficients,
+                                                  clustering_vals,
+                                                  side='right')
+
+        # Plotting the cumulative distribution
+        plt.figure(figsize=(8, 6))
+        plt.plot(clustering_vals, 1-cumulative_distribution/num_nodes, 'b')
+        plt.xlim([0, 1])
+        plt.ylim([0, 1])
+        plt.xlabel('Clustering Coefficient')
+        plt.ylabel('Cumulative [% of nodes]')
+        plt.grid()
+        plt.title('Clustering Coefficient Cumulative Distribution')
+        plt.savefig(f'{folder}/clustering_cumulative.png')
+
+    # Distribution of the shortest paths for all pairs
+    if 'paths' in stages:
+        hist = results['paths']['hist']
+        mean_path_length, diameter = path_length_stats(hist)
+
+        # Plotting the histogram
+        plt.figure(figsize=(8, 6))
+        plt.bar(range(len(hist)), hist, width=1)
+        plt.xlim([0, diameter + 1])
+        plt.xlabel('Shortest Path Length')
+        plt.ylabel('Frequency')
+        plt.grid()
+        plt.title('Distribution of Shortest Path Lengths')
+        plt.savefig(f'{folder}/shortest_path_hist.png')
+
+    # Spectral density
+    if 'spectrum' in stages:
+        spectrum = results['spectrum']
+        lambda_array = spectrum['lambda_array']
+        rho = spectrum['rho']
+        factor = float(spectrum['factor'])
+
+        # Plot the spectral density
+        plt.figure(figsize=(8, 6))
+        plt.plot(lambda_array / factor, rho * factor,
+                 'b', label='arXiv network')
+        plt.plot(lambda_array / factor, spectrum['rho_random'] * factor,
+                 'k--', label='random network')
+        plt.xlabel('$ \\lambda/\\sqrt{Np(1-p)}$')
+        plt.ylabel('$ \\rho \\sqrt{Np(1-p)}$')
+        plt.xlim([min(lambda_array)/factor, max(lambda_array)/factor])
+        plt.ylim([0, 1.1*max(rho)*factor])
+        plt.legend()
+        plt.grid()
+        plt.title('Spectral Density')
+        plt.savefig(f'{folder}/spectral_density.png')
+
+    if 'layout' in stages:
+        # Graph over the node indices of the arrays, with the stored layout
+        graph = nx.Graph()
+        graph.add_nodes_from(range(N))
+        graph.add_edges_from(np.asarray(edges).tolist())
+        layout = dict(enumerate(results['layout']['positions']))
+        degree = results['degree']['degree'] if 'degree' in results else \
+            np.array([graph.degree(node) for node in graph.nodes])
+        # Node colors: degree and, if computed, the centralities
+        colors = [('Degree', '', degree, plt.Normalize(vmin=1,
+                                                        vmax=max(degree)))]
+        if 'centrality' in stages:
+            for name in ['eigenvector', 'pagerank', 'katz', 'betweenness']:
+                values = results['centrality'][name]
+                colors.append((f'{name.capitalize()} centrality',
+                               f'_{name}', values,
+                               plt.Normalize(vmin=min(values),
+                                             vmax=max(values))))
+
+        # Plot the network, and a large copy of it
+        for label, suffix, node_color, norm in colors:
+            for figsize, node_size, extension in [(8, 4, 'png'),
+                                                  (20, 10, 'pdf')]:
+                plt.figure(figsize=(figsize, figsize))
+                # Draw nodes
+                nx.draw_networkx_nodes(
+                    graph,
+                    layout,
+                    node_color=node_color,  # Node color from the colormap
+                    cmap='coolwarm',
+                    vmin=norm.vmin,
+                    vmax=norm.vmax,
+                    node_size=node_size,  # Adjust the node size as desired
+                )
+                # Draw edges
+                nx.draw_networkx_edges(
+                    graph,
+                    layout,
+                    edge_color='k',  # Adjust the edge color as desired
+                    width=0.15,  # Adjust the edge width as desired
+                    alpha=0.5,  # Adjust the edge transparency as desired
+                )
+                sm = plt.cm.ScalarMappable(cmap='coolwarm', norm=norm)
+                sm.set_array([])
+                cbar = plt.colorbar(sm, ax=plt.gca(), label=label)
+                plt.title('General Relativity arXiv (1993-2003)')
+                plt.axis('off')
+                plt.savefig(f'{folder}/network_schema{suffix}.'
+                            f'{extension}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Complex network analysis')
+    parser.add_argument('--file', default=DEFAULT_PARAMS['load']['file'],
+                        help='edge list of the network')
+    parser.add_argument('--stages', nargs='+', default=DEFAULT_STAGES,
+                        help='stages of the analysis to run')
+    parser.add_argument('--cache-dir', default='./cache')
+    parser.add_argument('--check-approximate', action='store_true',
+                        help='compare the shortest path approximations '
+                             'with the exact histogram')
+    parser.add_argument('--no-plots', action='store_true',
+                        help='do not produce any figure')
+    parser.add_argument('--show', action='store_true',
+                        help='show the figures once saved')
+    args = parser.parse_args(argv)
+    params = {**DEFAULT_PARAMS, 'load': {'file': args.file}}
+
+    t0 = time.time()
+    results = analyze_network(args.stages, params, args.cache_dir)
+    print('Elapsed time for computing: ', time.time()-t0)
+    print()
+    print_summary(results, args.stages, params, args.check_approximate)
+
+    if not args.no_plots:
+        # Identify the test (for saving results)
+        current_time = datetime.datetime.now()
+        id_test = 'net_' + current_time.strftime("%Y-%m-%d_%H-%M-%S")
+        # Create folder for results
+        folder = './tests/' + id_test
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        plot_network(results, args.stages, folder)
+        import matplotlib.pyplot as plt
+        if args.show:
+            plt.show()
+        plt.close('all')
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+import numpy as np
+import scipy.sparse as sp
+
+# Coarsening observables of N x M cyclical lattices of 1/-1 opinions, from
+# 2D FFTs. Every function takes a batch of snapshots with shape
+# (..., N, M), e.g. (replicas, times, N, M), and keeps the leading axes in
+# its outputs, so a whole set of runs costs O(N M log(N M)) per snapshot
+
+
+def _shells(values, counts, width):
+    """
+    Sparse matrix averaging the entries of a flattened grid over shells
+    [n - 1/2, n + 1/2) * width of the given values (|k| or r), each entry
+    weighted by counts. Returns the matrix and the mean value of each shell
+    """
+    values, counts = values.ravel(), counts.ravel()
+    shell = np.rint(values / width).astype(np.int64)
+    weight = np.bincount(shell, weights=counts)
+    used = weight > 0
+    index = np.cumsum(used) - 1
+    matrix = sp.csr_matrix((counts / weight[shell], (np.arange(len(shell)),
+                                                     index[shell])),
+                           shape=(len(shell), used.sum()))
+    centers = np.bincount(shell, weights=counts * values)[used] / weight[used]
+    return matrix, centers
+
+
+def _batched(data, matrix):
+    """
+    Applies the (entries x shells) matrix to the last axis of data
+    """
+    flat = data.reshape(-1, matrix.shape[0])
+    return np.asarray((matrix.T @ flat.T).T).reshape(
+        data.shape[:-1] + (matrix.shape[1],))
+
+
+def wavenumbers(N, M):
+    """
+    |k| of every mode of the real FFT of an N x M lattice (shape
+    (N, M//2 + 1)) and the number of modes of the full FFT it represents
+    (the columns of the real FFT besides k_y = 0 and, for even M, the
+    Nyquist one stand for themselves and their mirror mode)
+    """
+    kx = 2 * np.pi * np.fft.fftfreq(N)
+    ky = 2 * np.pi * np.fft.rfftfreq(M)
+    k = np.hypot(*np.meshgrid(kx, ky, indexing='ij'))
+    counts = np.full(len(ky), 2.)
+    counts[0] = 1
+    if M % 2 == 0:
+        counts[-1] = 1
+    return k, np.broadcast_to(counts, k.shape)
+
+
+def power_spectrum(snapshots):
+    """
+    |FFT|^2 / (N M) of a batch of snapshots over the real FFT modes
+    """
+    snapshots = np.asarray(snapshots, dtype=float)
+    N, M = snapshots.shape[-2:]
+    return np.abs(np.fft.rfft2(snapshots))**2 / (N * M)
+
+
+def structure_factor(snapshots, power=None):
+    """
+    Radially averaged structure factor S(k, t) of a batch of snapshots,
+    over shells of width 2 pi / max(N, M).
+    Returns the mean |k| of each shell and S with shape (..., shells)
+    """
+    N, M = np.shape(snapshots)[-2:]
+    if power is None:
+        power = power_spectrum(snapshots)
+    matrix, k = _shells(*wavenumbers(N, M), 2 * np.pi / max(N, M))
+    return k, _batched(power.reshape(power.shape[:-2] + (-1,)), matrix)
+
+
+def correlation_function(snapshots, power=None):
+    """
+    Connected two-point correlation C(r, t) = <s(x) s(x+r)> - <s>^2 of a
+    batch of snapshots (from the inverse FFT of the power spectrum),
+    radially averaged over unit shells of the minimum image distance.
+    Returns the mean r of each shell and C with shape (..., shells)
+    """
+    snapshots = np.asarray(snapshots, dtype=float)
+    N, M = snapshots.shape[-2:]
+    if power is None:
+        power = power_spectrum(snapshots)
+    correlation = np.fft.irfft2(power, s=(N, M)) - \
+        snapshots.mean(axis=(-2, -1))[..., None, None]**2
+    dx = np.minimum(np.arange(N), N - np.arange(N))
+    dy = np.minimum(np.arange(M), M - np.arange(M))
+    r = np.hypot(*np.meshgrid(dx, dy, indexing='ij'))
+    matrix, distances = _shells(r, np.ones_like(r), 1)
+    return distances, _batched(
+        correlation.reshape(correlation.shape[:-2] + (-1,)), matrix)
+
+
+def length_from_structure_factor(snapshots, power=None):
+    """
+    Characteristic domain length L = 2 pi sum_k S(k) / sum_k |k| S(k), the
+    sums running over all the modes k != 0 of a batch of snapshots (NaN
+    at consensus)
+    """
+    N, M = np.shape(snapshots)[-2:]
+    if power is None:
+        power = power_spectrum(snapshots)
+    k, counts = wavenumbers(N, M)
+    counts = counts * (k > 0)
+    power = power.reshape(power.shape[:-2] + (-1,))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return 2 * np.pi * (power @ counts.ravel()) / \
+            (power @ (counts * k).ravel())
+
+
+def length_from_correlation(distances, correlation, level=0.5):
+    """
+    Distance at which C(r) / C(0) first drops below level (linearly
+    interpolated between shells), for each correlation of the batch.
+    NaN where it never does (or C(0) = 0, at consensus)
+    """
+    correlation = np.asarray(correlation, dtype=float)
+    flat = correlation.reshape(-1, correlation.shape[-1])
+    lengths = np.full(len(flat), np.nan)
+    for ii, curve in enumerate(flat):
+        if curve[0] <= 0:
+            continue
+        below = np.flatnonzero(curve / curve[0] < level)
+        if len(below):
+            jj = below[0]
+            c0, c1 = curve[jj-1] / curve[0], curve[jj] / curve[0]
+            lengths[ii] = distances[jj-1] + (c0 - level) / (c0 - c1) * \
+                (distances[jj] - distances[jj-1])
+    return lengths.reshape(correlation.shape[:-1])
+
+
+def coarsening_observables(snapshots):
+    """
+    S(k, t), C(r, t) and both domain lengths of a batch of snapshots,
+    sharing one FFT per snapshot.
+    Returns a dict with wavenumbers, structure_factor, distances,
+    correlation, length_k (from S) and length_r (from C)
+    """
+    power = power_spectrum(snapshots)
+    k, s = structure_factor(snapshots, power)
+    r, c = correlation_function(snapshots, power)
+    return {'wavenumbers': k, 'structure_factor': s, 'distances': r,
+            'correlation': c,
+            'length_k': length_from_structure_factor(snapshots, power),
+            'length_r': length_from_correlation(r, c)}
+
+
+def growth_exponent(times, lengths, t_min=None, t_max=None):
+    """
+    Fits L(t) ~ A t^z by least squares in log-log scale over
+    t_min <= t <= t_max. lengths has one row per replica (or is a single
+    curve), the fit uses their mean at each time, ignoring NaNs.
+    Returns z, its standard error and A
+    """
+    times = np.asarray(times, dtype=float)
+    lengths = np.asarray(lengths, dtype=float)
+    if lengths.ndim > 1:
+        lengths = lengths.reshape(-1, len(times))
+        finite = np.isfinite(lengths)
+        lengths = np.where(finite, lengths, 0).sum(axis=0) / \
+            np.where(finite.any(axis=0), finite.sum(axis=0), np.nan)
+    used = (times > 0) & np.isfinite(lengths) & (lengths > 0)
+    if t_min is not None:
+        used &= times >= t_min
+    if t_max is not None:
+        used &= times <= t_max
+    if used.sum() < 3:
+        raise ValueError('At least 3 times are needed to fit the exponent')
+    (z, log_a), cov = np.polyfit(np.log(times[used]), np.log(lengths[used]),
+                                 1, cov=True)
+    return z, np.sqrt(cov[0, 0]), np.exp(log_a)
@@ -1,8 +1,70 @@
+import argparse
+import ast
+import datetime
+import os
 import random
 import networkx as nx
 import numpy as np
 
-random.seed(11859)
+
+def seed_generators(seed):
+    """
+    Seeds the random and numpy.random generators used by the models
+    (nothing is done if seed is None)
+    """
+    if seed is not None:
+        random.seed(seed)
+        np.random.seed(seed)
+
+
+def create_test_folder(prefix, base='./tests'):
+    """
+    Creates the folder where the results of a test are saved, identified
+    by the prefix and the current time, and returns its path
+    """
+    current_time = datetime.datetime.now()
+    folder = f'{base}/{prefix}_' + current_time.strftime("%Y-%m-%d_%H-%M-%S")
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    return folder
+
+
+def _literal(value):
+    try:
+        return ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return value
+
+
+def parse_config(defaults, description, argv=None):
+    """
+    Thin command line interface over a model config: every key of the
+    defaults can be overridden with --key value (python literals, e.g.
+    --max-iter 1000 or --circle False). Besides, --no-plots skips the
+    figures, --store sets the folder of the results store (see aux_store),
+    --no-store disables it and --rerun ignores the stored results.
+    Returns the config and the options: plots, store_dir (None if
+    disabled) and rerun
+    """
+    parser = argparse.ArgumentParser(description=description)
+    for key, value in defaults.items():
+        parser.add_argument('--' + key.replace('_', '-'), dest=key,
+                            type=_literal, default=value,
+                            help=f'(default: {value})')
+    parser.add_argument('--no-plots', action='store_true',
+                        help='do not save any figure')
+    parser.add_argument('--store', default='./results',
+                        help='folder of the results store')
+    parser.add_argument('--no-store', action='store_true',
+                        help='neither reuse nor store the results')
+    parser.add_argument('--rerun', action='store_true',
+                        help='run again even if the results are stored')
+    args = vars(parser.parse_args(argv))
+    store_dir = args.pop('store')
+    options = {'plots': not args.pop('no_plots'),
+               'store_dir': None if args.pop('no_store') else store_dir,
+               'rerun': args.pop('rerun')}
+    return args, options
 
 
 def initialize_random_scalar_network(N, M, bias=0.5):
@@ -76,6 +138,78 @@ def sznajd_neighbors(elem, N, M):
     return partner_neighbor, neighbors_to_update
 
 
+def sznajd_tables(N, M):
+    """
+    Precomputes, for every element of an N x M cyclical array (flattened
+    as i*M + j), the flat index of its partner and of the neighbors
+    to be updated, in the same order as given by sznajd_neighbors
+    """
+    i, j = np.divmod(np.arange(N * M), M)
+    partner = i * M + (j + 1) % M
+    neighbors = np.stack((((i - 1) % N) * M + j,
+                          i * M + (j - 1) % M,
+                          ((i + 1) % N) * M + j,
+                          ((i - 1) % N) * M + (j + 1) % M,
+                          i * M + (j + 2) % M,
+                          ((i + 1) % N) * M + (j + 1) % M), axis=1)
+    return partner, neighbors
+
+
+def run_lattice_sznajd(population, max_iter=1000000, num_max_stuck=None,
+                       record_every=1, batch=65536):
+    """
+    Runs the Sznajd model over a cyclical N x M array of 1/-1 opinions
+    until consensus, max_iter steps or num_max_stuck consecutive steps
+    without changes, using the precomputed tables of sznajd_tables.
+    Returns:
+        - population: final opinions (the input is not modified)
+        - num_1s: number of agents supporting [1], stored every
+          record_every steps
+        - iteration: last iteration performed
+    """
+    N, M = population.shape
+    if num_max_stuck is None:
+        num_max_stuck = max_iter
+    partner, neighbors = sznajd_tables(N, M)
+    partner = partner.tolist()
+    neighbors = neighbors.tolist()
+    sigma = population.ravel().tolist()
+    ones = sigma.count(1)
+    num_1s = [ones]
+
+    no_changes_since = 0
+    iteration = -1
+    size = 1024
+    finished = ones in (0, N * M)
+    while not finished and iteration < max_iter - 1:
+        size = min(2 * size, batch, max_iter - 1 - iteration)
+        for elem in np.random.randint(0, N * M, size).tolist():
+            iteration += 1
+            changed = False
+            # Neighbors [0:3] take the value of the partner while
+            # neighbors [3:6] take the value of the element
+            for ii, neigh in enumerate(neighbors[elem]):
+                new = sigma[partner[elem]] if ii < 3 else sigma[elem]
+                if sigma[neigh] != new:
+                    ones += 1 if new == 1 else -1
+                    sigma[neigh] = new
+                    changed = True
+
+            no_changes_since = 0 if changed else no_changes_since + 1
+
+            if (iteration + 1) % record_every == 0:
+                num_1s.append(ones)
+
+            if no_changes_since == num_max_stuck or ones in (0, N * M):
+                finished = True
+                break
+
+    if (iteration + 1) % record_every != 0:
+        num_1s.append(ones)
+
+    return np.array(sigma).reshape(N, M), np.array(num_1s), iteration
+
+
 def create_small_world_network(N, k, p, bias=0.5):
     """
     Initializes Small World Network of N agents with k nerarest
@@ -102,6 +236,175 @@ def create_small_world_network(N, k, p, bias=0.5):
     return network
 
 
+def graph_to_arrays(network):
+    """
+    Converts a networkx graph into a compact array-backed adjacency.
+    Nodes are relabeled to 0..n-1 following the order of network.nodes.
+    Returns:
+        - indptr, indices: CSR adjacency, the neighbors of node i are
+          indices[indptr[i]:indptr[i+1]]
+        - edges: (2E, 2) table with every undirected edge stored in both
+          orientations, so that drawing a uniform row gives a uniform
+          random edge with a random orientation
+    """
+    index = {node: ii for ii, node in enumerate(network.nodes)}
+    edges = np.array([(index[u], index[v]) for u, v in network.edges],
+                     dtype=np.int64).reshape(-1, 2)
+    return edges_to_arrays(edges, len(index))
+
+
+def edges_to_arrays(edges, n):
+    """
+    Builds the CSR adjacency and the oriented edge table (see
+    graph_to_arrays) from an (E, 2) array of undirected edges between
+    nodes 0..n-1
+    """
+    edges = np.concatenate((edges, edges[:, ::-1]))
+    edges = edges[np.lexsort((edges[:, 1], edges[:, 0]))]
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(edges[:, 0], minlength=n), out=indptr[1:])
+    indices = edges[:, 1].copy()
+    return indptr, indices, edges
+
+
+def lattice_to_arrays(N, M):
+    """
+    Array-backed adjacency (see graph_to_arrays) of a cyclical N x M
+    lattice with 4 neighbors per element. Element (i,j) is node i*M + j
+    """
+    nodes = np.arange(N * M).reshape(N, M)
+    edges = np.concatenate((
+        np.stack((nodes, np.roll(nodes, -1, axis=1)), axis=-1).reshape(-1, 2),
+        np.stack((nodes, np.roll(nodes, -1, axis=0)), axis=-1).reshape(-1, 2)))
+    return edges_to_arrays(edges, N * M)
+
+
+def run_network_voter(sigma, indptr, indices, edges, mode='node',
+                      max_iter=1000000, num_max_stuck=None, record_every=1,
+                      record_times=None, batch=65536):
+    """
+    Runs the voter model over an array-backed network (see
+    graph_to_arrays) until consensus, max_iter steps or num_max_stuck
+    consecutive steps without changes. Available update modes:
+        - 'node': a random node copies the opinion of a random neighbor
+        - 'link': a uniform random edge is chosen with random orientation
+          and the first node copies the opinion of the second one
+        - 'invasion': a random node imposes its opinion on a random neighbor
+    Random numbers are drawn in batches (growing up to batch steps) to
+    keep the python loop light.
+    Returns:
+        - sigma: final opinions (numpy array, the input is not modified)
+        - rho: proportion of connections between different opinions,
+          stored initially, every record_every steps (or after the
+          number of steps given by the sorted array record_times) and
+          at the end of the process
+        - num_1s: number of agents supporting [1], same sampling as rho
+        - iteration: last iteration performed
+    """
+    if mode not in ('node', 'link', 'invasion'):
+        raise ValueError(f'Unknown voter update mode: {mode}')
+    if num_max_stuck is None:
+        num_max_stuck = max_iter
+    num_edges = len(edges) // 2
+    sigma = np.asarray(sigma).ravel().tolist()
+    ptr = indptr.tolist()
+    nbr = indices.tolist()
+    degree = np.diff(indptr)
+    connected_nodes = np.flatnonzero(degree)
+
+    # Number of discordant edges, updated incrementally at each change
+    different = int(np.count_nonzero(
+        np.take(sigma, edges[:, 0]) != np.take(sigma, edges[:, 1]))) // 2
+    ones = sigma.count(1)
+    rho = [different / num_edges]
+    num_1s = [ones]
+    if record_times is None:
+        record_times = range(record_every, max_iter + 1, record_every)
+    record_times = iter(np.asarray(record_times).tolist())
+    next_record = next(record_times, None)
+    recorded = 0
+
+    no_changes_since = 0
+    iteration = -1
+    size = 1024
+    finished = different == 0
+    while not finished and iteration < max_iter - 1:
+        # Draw the (target, source) pairs of the next batch of steps
+        size = min(2 * size, batch, max_iter - 1 - iteration)
+        if mode == 'link':
+            pairs = edges[np.random.randint(0, len(edges), size)]
+        else:
+            nodes = np.random.choice(connected_nodes, size)
+            offsets = np.random.random(size) * degree[nodes]
+            neighbors = indices[indptr[nodes] + offsets.astype(np.int64)]
+            if mode == 'node':
+                pairs = np.stack((nodes, neighbors), axis=1)
+            else:
+                pairs = np.stack((neighbors, nodes), axis=1)
+
+        for target, source in pairs.tolist():
+            iteration += 1
+            new = sigma[source]
+            if sigma[target] == new:
+                no_changes_since += 1
+            else:
+                # Edges to neighbors sharing the new opinion stop being
+                # discordant, the rest become discordant
+                same = 0
+                other = 0
+                for jj in nbr[ptr[target]:ptr[target + 1]]:
+                    if jj == target:
+                        continue
+                    if sigma[jj] == new:
+                        same += 1
+                    else:
+                        other += 1
+                different += other - same
+                ones += 1 if new == 1 else -1
+                sigma[target] = new
+                no_changes_since = 0
+
+            if iteration + 1 == next_record:
+                rho.append(different / num_edges)
+                num_1s.append(ones)
+                recorded = next_record
+                next_record = next(record_times, None)
+
+            if no_changes_since == num_max_stuck or different == 0:
+                finished = True
+                break
+
+    if recorded != iteration + 1:
+        rho.append(different / num_edges)
+        num_1s.append(ones)
+
+    return np.array(sigma), np.array(rho), np.array(num_1s), iteration
+
+
+def log_spaced_times(max_iter, num_points):
+    """
+    Sorted array of unique integer times between 1 and max_iter,
+    approximately log-spaced, for storing long trajectories
+    """
+    return np.unique(np.geomspace(1, max_iter, num_points).astype(np.int64))
+
+
+def snapshot_times(max_iter, num_snapshots, spacing='linear'):
+    """
+    Set of iterations (counted from 1) at which the lattice models store a
+    snapshot: every max_iter//num_snapshots steps ('linear') or
+    log-spaced ('log', see log_spaced_times), for coarsening studies
+    """
+    if not num_snapshots:
+        return set()
+    if spacing == 'linear':
+        every = max(1, max_iter//num_snapshots)
+        return set(range(every, max_iter + 1, every))
+    if spacing == 'log':
+        return set(log_spaced_times(max_iter, num_snapshots).tolist())
+    raise ValueError(f'Unknown snapshot spacing: {spacing}')
+
+
 def proportion_different_sigma_connections(network):
     """
     Gets the proportion of connections between agents
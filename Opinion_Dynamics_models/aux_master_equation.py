@@ -0,0 +1,255 @@
+import inspect
+import numpy as np
+import scipy.sparse as sp
+from scipy.linalg import solve_banded
+from scipy.sparse.linalg import splu, lgmres
+from aux_functions import sznajd_tables
+
+# Exact solution of the master equation of the models on small systems.
+# A configuration of n agents is stored as the integer state
+# sum_i (sigma_i == 1) << i, so there are 2**n states and the consensus
+# states are 0 (all -1) and 2**n - 1 (all 1). One step of the chains is one
+# elementary update of the Monte Carlo engines (one iteration)
+MAX_NODES = 20
+# Keyword of the relative tolerance of lgmres: tol up to SciPy 1.11 (as in
+# the version pinned in poetry.lock), rtol from SciPy 1.12
+LGMRES_RTOL = 'rtol' if 'rtol' in inspect.signature(lgmres).parameters \
+    else 'tol'
+
+
+def state_index(sigma):
+    """
+    State of a configuration of 1/-1 opinions (flattened in C order)
+    """
+    bits = np.asarray(sigma).ravel() == 1
+    return int(np.sum(bits.astype(np.int64) << np.arange(len(bits))))
+
+
+def _check_size(n, max_nodes):
+    if n > max_nodes:
+        raise ValueError(f'{n} agents give 2**{n} states, the exact solver '
+                         f'is limited to {max_nodes} agents')
+
+
+def voter_transitions(indptr, indices, mode='node', max_nodes=MAX_NODES):
+    """
+    Sparse (CSR) transition matrix over the 2**n states of the voter model
+    on an array-backed network (see graph_to_arrays), for the update modes
+    of run_network_voter:
+        - 'node': a random connected node copies a random neighbor
+        - 'link': the target of a random oriented edge copies its source
+        - 'invasion': a random neighbor of a random connected node copies it
+    Repeated entries of indices (multi-edges, self-loops) are weighted as in
+    the engine
+    """
+    if mode not in ('node', 'link', 'invasion'):
+        raise ValueError(f'Unknown voter update mode: {mode}')
+    n = len(indptr) - 1
+    _check_size(n, max_nodes)
+    degree = np.diff(indptr)
+    num_connected = np.count_nonzero(degree)
+    states = np.arange(2**n, dtype=np.int64)
+    bits = [(states >> i) & 1 for i in range(n)]
+
+    rows, cols, probs = [], [], []
+    for target in range(n):
+        # Probability of choosing each neighbor as source of target
+        weight = np.zeros(n)
+        for source in indices[indptr[target]:indptr[target+1]]:
+            if mode == 'node':
+                weight[source] += 1 / (num_connected * degree[target])
+            elif mode == 'link':
+                weight[source] += 1 / indptr[-1]
+            else:
+                weight[source] += 1 / (num_connected * degree[source])
+        flip = np.zeros(2**n)
+        for source in np.flatnonzero(weight):
+            if source != target:
+                flip += weight[source] * (bits[source] != bits[target])
+        moving = np.flatnonzero(flip)
+        rows.append(moving)
+        cols.append(moving ^ (1 << target))
+        probs.append(flip[moving])
+
+    return _transition_matrix(n, rows, cols, probs)
+
+
+def sznajd_transitions(N, M, max_nodes=MAX_NODES):
+    """
+    Sparse (CSR) transition matrix over the 2**(N*M) states of the Sznajd
+    model on a cyclical N x M lattice, with the sequential update of
+    run_lattice_sznajd (tables of sznajd_tables)
+    """
+    n = N * M
+    _check_size(n, max_nodes)
+    partner, neighbors = sznajd_tables(N, M)
+    states = np.arange(2**n, dtype=np.int64)
+
+    rows, cols, probs = [], [], []
+    for elem in range(n):
+        new = states.copy()
+        # Neighbors [0:3] take the value of the partner and neighbors [3:6]
+        # the value of the element, read after the previous assignments
+        for ii, neigh in enumerate(neighbors[elem]):
+            source = partner[elem] if ii < 3 else elem
+            bit = (new >> source) & 1
+            new = (new & ~(1 << neigh)) | (bit << neigh)
+        moving = np.flatnonzero(new != states)
+        rows.append(moving)
+        cols.append(new[moving])
+        probs.append(np.full(len(moving), 1 / n))
+
+    return _transition_matrix(n, rows, cols, probs)
+
+
+def _transition_matrix(n, rows, cols, probs):
+    """
+    Transition matrix with the given off-diagonal probabilities, the
+    remaining probability of each state staying in the diagonal
+    """
+    rows, cols, probs = (np.concatenate(rows), np.concatenate(cols),
+                         np.concatenate(probs))
+    moves = sp.csr_matrix((probs, (rows, cols)), shape=(2**n, 2**n))
+    stay = 1 - np.asarray(moves.sum(axis=1)).ravel()
+    return (moves + sp.diags(stay)).tocsr()
+
+
+def absorption(transitions, targets=None, tol=1e-12, rtol=1e-10,
+               direct_max=2048):
+    """
+    Absorption of a Markov chain with the given (sparse) transition matrix,
+    absorbing states being those which stay with probability 1 (besides the
+    consensus, e.g. frozen Sznajd patterns). Solves (I - Q) h = R[:, target]
+    for each target and (I - Q) tau = 1, Q being the transient block: with
+    one sparse LU factorization up to direct_max transient states and with
+    LGMRES above (the LU fill-in over the hypercube of configurations grows
+    too fast, e.g. minutes for a 4 x 4 lattice, while LGMRES takes a
+    fraction of a second).
+    Returns, for every initial state:
+        - probability of being absorbed at each of the target states, one
+          column per target (default: the consensus in [-1] and in [1])
+        - mean number of steps to absorption
+    """
+    transitions = sp.csr_matrix(transitions)
+    num_states = transitions.shape[0]
+    if targets is None:
+        targets = [0, num_states - 1]
+    targets = np.asarray(targets)
+    absorbing = np.abs(transitions.diagonal() - 1) <= tol
+    if not np.all(absorbing[targets]):
+        raise ValueError('Every target must be an absorbing state')
+    transient = np.flatnonzero(~absorbing)
+
+    probability = np.zeros((num_states, len(targets)))
+    probability[targets, np.arange(len(targets))] = 1
+    mean_time = np.zeros(num_states)
+    if not len(transient):
+        return probability, mean_time
+    system = sp.identity(len(transient), format='csr') - \
+        transitions[transient][:, transient]
+    rhs = np.column_stack((transitions[transient][:, targets].toarray(),
+                           np.ones(len(transient))))
+    if len(transient) <= direct_max:
+        solution = splu(sp.csc_matrix(system)).solve(rhs)
+    else:
+        solution = np.empty_like(rhs)
+        for ii in range(rhs.shape[1]):
+            solution[:, ii], info = lgmres(system, rhs[:, ii], atol=0,
+                                           maxiter=10000,
+                                           **{LGMRES_RTOL: rtol})
+            if info != 0:
+                raise RuntimeError(f'LGMRES did not converge ({info}), the '
+                                   f'chain may have recurrent non-absorbing '
+                                   f'states')
+    probability[transient] = solution[:, :-1]
+    mean_time[transient] = solution[:, -1]
+    return probability, mean_time
+
+
+def num_ones(n):
+    """
+    Number of agents supporting [1] in each of the 2**n states
+    """
+    states = np.arange(2**n, dtype=np.int64)
+    ones = np.zeros(2**n, dtype=np.int64)
+    for i in range(n):
+        ones += (states >> i) & 1
+    return ones
+
+
+def product_average(values, n, bias=0.5):
+    """
+    Average of a function of the state when every agent independently
+    supports [1] with probability bias (as initialize_random_scalar_network).
+    values can have one row per state and several columns
+    """
+    ones = num_ones(n)
+    weights = bias**ones * (1 - bias)**(n - ones)
+    return weights @ np.asarray(values)
+
+
+def average_by_ones(values, n):
+    """
+    Average of a function of the state over the configurations with
+    m = 0..n agents supporting [1] (one row per m), comparable with the
+    birth-death chains of the mean-field models
+    """
+    ones = num_ones(n)
+    values = np.asarray(values, dtype=float)
+    total = np.zeros((n + 1,) + values.shape[1:])
+    np.add.at(total, ones, values)
+    return total / np.bincount(ones, minlength=n + 1).reshape(
+        (-1,) + (1,) * (values.ndim - 1))
+
+
+def birth_death_absorption(up, down):
+    """
+    Absorption of a birth-death chain over m = 0..n (e.g. the number of
+    supporters of [1]), up[m] and down[m] being the probabilities of
+    m -> m+1 and m -> m-1 in one step. m = 0 and m = n must be absorbing.
+    Returns, for every initial m, the probability of ending at m = n and
+    the mean number of steps to absorption (tridiagonal solves)
+    """
+    up = np.asarray(up, dtype=float)
+    down = np.asarray(down, dtype=float)
+    n = len(up) - 1
+    probability = np.zeros(n + 1)
+    probability[n] = 1
+    mean_time = np.zeros(n + 1)
+    if n < 2:
+        return probability, mean_time
+
+    # (I - Q) over the transient states m = 1..n-1, in banded form
+    banded = np.zeros((3, n - 1))
+    banded[0, 1:] = -up[1:n-1]
+    banded[1] = up[1:n] + down[1:n]
+    banded[2, :-1] = -down[2:n]
+    rhs = np.zeros((n - 1, 2))
+    rhs[-1, 0] = up[n-1]
+    rhs[:, 1] = 1
+    solution = solve_banded((1, 1), banded, rhs)
+    probability[1:n] = solution[:, 0]
+    mean_time[1:n] = solution[:, 1]
+    return probability, mean_time
+
+
+def mean_field_voter_rates(n):
+    """
+    Birth-death probabilities of the voter model on the complete graph of n
+    agents: a random agent copies another random agent
+    """
+    m = np.arange(n + 1)
+    up = (n - m) / n * m / (n - 1)
+    return up, up.copy()
+
+
+def mean_field_sznajd_rates(n):
+    """
+    Birth-death probabilities of the mean-field Sznajd model of n agents: if
+    a random pair of agents agrees, a third random agent adopts its opinion
+    """
+    m = np.arange(n + 1)
+    pairs = n * (n - 1) * (n - 2)
+    up = m * (m - 1) * (n - m) / pairs
+    down = (n - m) * (n - m - 1) * m / pairs
+    return up, down
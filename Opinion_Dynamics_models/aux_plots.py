@@ -0,0 +1,112 @@
+import numpy as np
+
+# matplotlib is only imported by the functions below, so that models can be
+# run (and imported) without loading any figure backend
+
+
+def plot_lattice_opinion(population, title, file):
+    """
+    Saves the image of a lattice of -1/1 opinions
+    """
+    import matplotlib.pyplot as plt
+    plt.figure(figsize=(8, 6))
+    plt.imshow(population, cmap='gray')
+    plt.title(title)
+    plt.colorbar(ticks=[-1, 1])
+    plt.xticks([])
+    plt.yticks([])
+    plt.tight_layout()
+    plt.savefig(file)
+    plt.close()
+
+
+def plot_support_evolution(num_1s, pop_size, folder, grid=False):
+    """
+    Saves the evolution of the % of the population supporting opinion [1]
+    (with automatic and [0, 100] vertical limits)
+    """
+    import matplotlib.pyplot as plt
+    plt.figure(figsize=(8, 6))
+    plt.plot([supporters*100/pop_size for supporters in num_1s])
+    plt.title(f'Population sharing opinion [1]')
+    plt.xlabel(f'iterations')
+    plt.ylabel(f'% supporters')
+    plt.xlim([0, len(num_1s)])
+    plt.tight_layout()
+    if grid:
+        plt.grid()
+    plt.savefig(f'{folder}/support_evolution_1.png')
+    plt.ylim([0, 100])
+    plt.savefig(f'{folder}/support_evolution.png')
+    plt.close()
+
+
+def plot_order_evolution(rho, folder, labels=None):
+    """
+    Saves the evolution of the order parameter in linear and log scales.
+    rho is a list of values or, if labels are given, of one value per label
+    """
+    import matplotlib.pyplot as plt
+    rho = np.asarray(rho)
+    curves = [rho] if labels is None else [rho[:, ii]
+                                           for ii in range(len(labels))]
+    for plot, name in [(plt.plot, 'order_evolution'),
+                       (plt.loglog, 'order_evolution_log')]:
+        plt.figure(figsize=(8, 6))
+        for ii, curve in enumerate(curves):
+            if labels is None:
+                plot(curve)
+            else:
+                plot(curve, label=labels[ii])
+        plt.xlabel('iterations (t)')
+        plt.ylabel('$\\rho$')
+        plt.title(f'Order parameter')
+        if labels is not None:
+            plt.legend()
+        plt.xlim([0, len(rho)])
+        plt.ylim([np.min(rho), 1])
+        plt.tight_layout()
+        plt.grid()
+        plt.savefig(f'{folder}/{name}.png')
+        plt.close()
+
+
+def plot_coarsening(coarsening, folder, unit='iterations'):
+    """
+    Saves the radially averaged structure factor at each stored time and
+    the evolution of the domain length (both estimates) in log scales,
+    from the output of aux_coarsening.coarsening_observables plus times
+    """
+    import matplotlib.pyplot as plt
+    times = np.asarray(coarsening['times'])
+    k = coarsening['wavenumbers']
+    from matplotlib.colors import LogNorm
+    plt.figure(figsize=(8, 6))
+    norm = LogNorm(times[times > 0].min(), times.max())
+    for ii, time in enumerate(times):
+        if time > 0:
+            plt.loglog(k[1:], coarsening['structure_factor'][ii, 1:],
+                       color=plt.cm.viridis(norm(time)))
+    plt.title('Structure factor S(k, t)')
+    plt.xlabel('k')
+    plt.ylabel('S(k, t)')
+    plt.colorbar(plt.cm.ScalarMappable(cmap='viridis', norm=norm),
+                 ax=plt.gca(), label=unit)
+    plt.grid()
+    plt.tight_layout()
+    plt.savefig(f'{folder}/structure_factor.png')
+    plt.close()
+
+    plt.figure(figsize=(8, 6))
+    plt.loglog(times[1:], coarsening['length_k'][1:], 'o-',
+               label='from S(k, t)')
+    plt.loglog(times[1:], coarsening['length_r'][1:], 's-',
+               label='from C(r, t) = C(0, t)/2')
+    plt.title('Characteristic domain length')
+    plt.xlabel(f'{unit} (t)')
+    plt.ylabel('L(t)')
+    plt.legend()
+    plt.grid()
+    plt.tight_layout()
+    plt.savefig(f'{folder}/domain_length.png')
+    plt.close()
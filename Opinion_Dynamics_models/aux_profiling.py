@@ -0,0 +1,146 @@
+import json
+import os
+import sys
+import threading
+from collections import Counter
+from time import perf_counter
+
+# Phases timed in the model runs: the first four inside the simulation loop,
+# the coarsening observables of the snapshots, rendering of the figures and
+# I/O of the results afterwards
+LOOP_PHASES = ('rng', 'update', 'observables', 'snapshot')
+PHASES = LOOP_PHASES + ('coarsening', 'render', 'io')
+
+
+def new_profile(mode='phases', interval=0.005):
+    """
+    Creates the record of the cumulative timers and counters of a run.
+    mode: 'phases' (timers and counters), 'sampling' (also samples the stack
+    of the running thread every interval seconds) or None (no profiling).
+    Returns the profile dict, or None if disabled
+    """
+    if mode is None:
+        return None
+    if mode not in ('phases', 'sampling'):
+        raise ValueError(f'Unknown profile mode: {mode}')
+    return {'mode': mode, 'interval': interval,
+            'times': dict.fromkeys(PHASES, 0.),
+            'calls': dict.fromkeys(PHASES, 0),
+            'counters': {}, 'self_samples': Counter(),
+            'total_samples': Counter(), 'n_samples': 0,
+            'thread': None, 'stop': None}
+
+
+def lap(profile, phase, t0):
+    """
+    Adds the time since t0 to the given phase and returns the current time,
+    so consecutive phases can be chained: t = lap(profile, 'rng', t)
+    """
+    t = perf_counter()
+    if profile is not None:
+        profile['times'][phase] += t - t0
+        profile['calls'][phase] += 1
+    return t
+
+
+def count(profile, name, n=1):
+    """
+    Increases the counter name by n
+    """
+    if profile is not None:
+        profile['counters'][name] = profile['counters'].get(name, 0) + n
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return (f'{os.path.basename(code.co_filename)}:{code.co_firstlineno}'
+            f'({code.co_name})')
+
+
+def _sample(profile, thread_id):
+    """
+    Sampling loop: records the innermost function (self) and every function
+    in the stack (total) of the profiled thread
+    """
+    while not profile['stop'].wait(profile['interval']):
+        frame = sys._current_frames().get(thread_id)
+        if frame is None:
+            continue
+        profile['n_samples'] += 1
+        profile['self_samples'][_frame_name(frame)] += 1
+        names = set()
+        while frame is not None:
+            names.add(_frame_name(frame))
+            frame = frame.f_back
+        profile['total_samples'].update(names)
+
+
+def start_sampling(profile):
+    """
+    Starts sampling the calling thread if the profile is in sampling mode
+    """
+    if profile is None or profile['mode'] != 'sampling' \
+            or profile['thread'] is not None:
+        return
+    profile['stop'] = threading.Event()
+    profile['thread'] = threading.Thread(
+        target=_sample, args=(profile, threading.get_ident()), daemon=True)
+    profile['thread'].start()
+
+
+def stop_sampling(profile):
+    """
+    Stops the sampling thread (if any)
+    """
+    if profile is None or profile['thread'] is None:
+        return
+    profile['stop'].set()
+    profile['thread'].join()
+    profile['thread'] = None
+
+
+def profile_report(profile, run_time, top=25):
+    """
+    Summary of the profile of a run whose simulation loop took run_time
+    seconds (the phases after the loop are added to get the total time):
+    time, calls and fraction of the total time of each phase, loop
+    time not assigned to any phase, counters, steps per second and accepted
+    move rate (from the 'steps' and 'accepted' counters) and, in sampling
+    mode, the functions with most samples
+    """
+    times, calls = profile['times'], profile['calls']
+    total = run_time + sum(times[phase] for phase in PHASES
+                           if phase not in LOOP_PHASES)
+    report = {'mode': profile['mode'], 'run_time': run_time,
+              'total_time': total,
+              'phases': {phase: {'time': times[phase],
+                                 'calls': calls[phase],
+                                 'fraction': times[phase] / total
+                                 if total > 0 else 0.}
+                         for phase in PHASES},
+              'unaccounted_loop_time':
+                  run_time - sum(times[phase] for phase in LOOP_PHASES),
+              'counters': dict(profile['counters'])}
+    steps = profile['counters'].get('steps', 0)
+    report['steps_per_s'] = steps / run_time if run_time > 0 else None
+    report['accepted_rate'] = \
+        profile['counters'].get('accepted', 0) / steps if steps else None
+    if profile['mode'] == 'sampling':
+        n = profile['n_samples']
+        report['sampling'] = {
+            'interval': profile['interval'], 'n_samples': n,
+            'self': [[name, hits, hits / n] for name, hits
+                     in profile['self_samples'].most_common(top)],
+            'total': [[name, hits, hits / n] for name, hits
+                      in profile['total_samples'].most_common(top)]}
+    return report
+
+
+def save_profile(profile, file, run_time):
+    """
+    Writes the report of the profile as JSON (nothing if disabled)
+    """
+    if profile is None:
+        return
+    with open(file, 'w') as f:
+        json.dump(profile_report(profile, run_time), f, indent=2)
@@ -0,0 +1,213 @@
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+import subprocess
+import numpy as np
+
+# Local store of model runs: an SQLite index (parameters, seed, code
+# version, summary observables) plus one .npz file with the arrays of
+# each run, both under STORE_DIR
+STORE_DIR = './results'
+# Config entries which do not change the results of a run
+IGNORED_KEYS = ('profile', 'verbose', 'n_workers')
+AUX_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'aux_functions.py')
+
+
+def code_version(files):
+    """
+    Hash of the source files of a model (plus aux_functions.py, shared by
+    all of them), so that runs of an edited model are not reused
+    """
+    sha = hashlib.sha1()
+    for file in sorted(set(files) | {AUX_FILE}):
+        with open(file, 'rb') as f:
+            sha.update(f.read())
+    return sha.hexdigest()[:16]
+
+
+def git_commit():
+    """
+    Current git commit of the repository (None if not available)
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'],
+                              cwd=os.path.dirname(AUX_FILE),
+                              capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_key(model, config, version):
+    """
+    Identifier of a run: hash of the model, its config and code version
+    """
+    text = json.dumps({'model': model, 'config': config,
+                       'version': version}, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def open_store(store_dir=STORE_DIR):
+    """
+    Connection to the index of the store (created if needed)
+    """
+    os.makedirs(os.path.join(store_dir, 'arrays'), exist_ok=True)
+    connection = sqlite3.connect(os.path.join(store_dir, 'store.sqlite'))
+    connection.execute('CREATE TABLE IF NOT EXISTS runs ('
+                       'key TEXT PRIMARY KEY, model TEXT, config TEXT, '
+                       'seed INTEGER, code_version TEXT, git_commit TEXT, '
+                       'created TEXT, summary TEXT, data_file TEXT)')
+    return connection
+
+
+def _to_python(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def split_results(results):
+    """
+    Splits the results of a run into the summary (scalars, plus the final
+    value of every 1-D array as <name>_final) and the arrays to store.
+    Dicts of arrays (e.g. the snapshots) are stored as <name>/<key>
+    """
+    summary = {'dicts': []}
+    arrays = {}
+    for name, value in results.items():
+        if name in ('profile', 'cached', 'key'):
+            continue
+        if isinstance(value, dict):
+            summary['dicts'].append(name)
+            for key, item in value.items():
+                arrays[f'{name}/{key}'] = np.asarray(item)
+        elif isinstance(value, (np.ndarray, list, tuple)):
+            arrays[name] = np.asarray(value)
+            if arrays[name].ndim == 1 and len(arrays[name]) and \
+                    np.issubdtype(arrays[name].dtype, np.number):
+                summary[f'{name}_final'] = _to_python(arrays[name][-1])
+        else:
+            summary[name] = _to_python(value)
+    return summary, arrays
+
+
+def join_results(summary, arrays):
+    """
+    Inverse of split_results (lists are returned as arrays)
+    """
+    results = {name: value for name, value in summary.items()
+               if name != 'dicts' and not name.endswith('_final')}
+    for name in summary['dicts']:
+        results[name] = {}
+    for name, value in arrays.items():
+        value = value.item() if value.ndim == 0 else value
+        if '/' in name:
+            name, key = name.split('/', 1)
+            key = int(key) if key.lstrip('-').isdigit() else key
+            results[name][key] = value
+        else:
+            results[name] = value
+    return results
+
+
+def save_run(model, config, results, version, store_dir=STORE_DIR):
+    """
+    Stores a run (replacing any previous one with the same key).
+    Returns its key
+    """
+    key = run_key(model, config, version)
+    summary, arrays = split_results(results)
+    data_file = os.path.join('arrays', f'{key}.npz')
+    connection = open_store(store_dir)
+    np.savez_compressed(os.path.join(store_dir, data_file), **arrays)
+    with connection:
+        connection.execute(
+            'INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (key, model, json.dumps(config, sort_keys=True, default=str),
+             config.get('seed'), version, git_commit(),
+             datetime.datetime.now().isoformat(timespec='seconds'),
+             json.dumps(summary), data_file))
+    connection.close()
+    return key
+
+
+def _row(row):
+    key, model, config, seed, version, commit, created, summary, data = row
+    return {'key': key, 'model': model, 'config': json.loads(config),
+            'seed': seed, 'code_version': version, 'git_commit': commit,
+            'created': created, 'summary': json.loads(summary),
+            'data_file': data}
+
+
+def load_run(key, store_dir=STORE_DIR):
+    """
+    Results of the stored run with the given key (None if not stored)
+    """
+    if not os.path.exists(os.path.join(store_dir, 'store.sqlite')):
+        return None
+    connection = open_store(store_dir)
+    row = connection.execute('SELECT * FROM runs WHERE key = ?',
+                             (key,)).fetchone()
+    connection.close()
+    if row is None:
+        return None
+    row = _row(row)
+    file = os.path.join(store_dir, row['data_file'])
+    if not os.path.exists(file):
+        return None
+    with np.load(file) as data:
+        arrays = {name: data[name] for name in data.files}
+    return join_results(row['summary'], arrays)
+
+
+def find_runs(model=None, store_dir=STORE_DIR, **params):
+    """
+    Stored runs (index rows, see _row) of the model whose config matches
+    all the given params, e.g. find_runs('voter', n=40, bias=0.5)
+    """
+    if not os.path.exists(os.path.join(store_dir, 'store.sqlite')):
+        return []
+    connection = open_store(store_dir)
+    if model is None:
+        rows = connection.execute('SELECT * FROM runs').fetchall()
+    else:
+        rows = connection.execute('SELECT * FROM runs WHERE model = ?',
+                                  (model,)).fetchall()
+    connection.close()
+    rows = [_row(row) for row in rows]
+    return [row for row in rows
+            if all(row['config'].get(name) == value
+                   for name, value in params.items())]
+
+
+def store_config(config, ignore=IGNORED_KEYS):
+    """
+    Entries of the config which identify a run
+    """
+    return {name: value for name, value in config.items()
+            if name not in ignore}
+
+
+def cached_run(model, run, config, files, store_dir=STORE_DIR,
+               rerun=False):
+    """
+    Returns the results of run(config), reusing the stored ones if the
+    same model was already run with the same config and source files
+    (unless rerun). store_dir=None disables the store, as does a config
+    without seed: such runs are not reproducible, so they are neither
+    reused nor stored.
+    results['cached'] tells whether they come from the store
+    """
+    if store_dir is None or config.get('seed') is None:
+        return {**run(config), 'cached': False}
+    identity = store_config(config)
+    version = code_version(files)
+    key = run_key(model, identity, version)
+    if not rerun:
+        results = load_run(key, store_dir)
+        if results is not None:
+            return {**results, 'cached': True, 'key': key}
+    results = run(config)
+    save_run(model, identity, results, version, store_dir)
+    return {**results, 'cached': False, 'key': key}
@@ -1,167 +1,215 @@
-import datetime
-import os
+import random
 import time
-import matplotlib.pyplot as plt
-from matplotlib.colors import ListedColormap
-from aux_functions import *
-
-
-# Identify the test (for saving results)
-current_time = datetime.datetime.now()
-id_test = 'axelrod_' + current_time.strftime("%Y-%m-%d_%H-%M-%S")
-# Create folder for results
-if not os.path.exists('./tests/' + id_test):
-    os.makedirs('./tests/' + id_test)
-
-
-# PARAMS of the test
-max_iter = 2000000
-num_max_stuck = max(200, max_iter//100)
-# Shape of the network
-n = 20
-m = 25
-# Number of attributes
-f = 8
-# Number of possible values for each attribute
-q = 4
-
-
-# Initialize population profiles
-population_culture = initialize_random_vector_network(n, m, f, q)
-
-# Get the colormap
-if q <= 10:
-    catcmap = ListedColormap(plt.get_cmap(f"tab10").colors[:q])
-else:
-    catcmap = ListedColormap(plt.get_cmap(f"tab20").colors[:q])
-
-# Plot the initial state
-for ii in range(f):
-    plt.figure(figsize=(8, 6))
-    im = plt.imshow(population_culture[:, :, ii], cmap=catcmap)
-    im.set_clim(0, q-1)
-    plt.title(f'Initial state of Population cultural profile '
-              f'(feature {ii+1})')
-    plt.colorbar(ticks=[jj for jj in range(q)])
-    plt.xticks([])
-    plt.yticks([])
-    plt.tight_layout()
-    plt.savefig(f'./tests/{id_test}/population_dim{ii+1}_init.png')
-    plt.close()
-
-
-no_changes_since = 0
-rho = [[proportion_different_sigma_lattice(
-        population_culture[:, :, ii]) for ii in range(f)]]
-t0 = time.time()
-
-# Axelrod model
-for iteration in range(max_iter):
-    # Select a random element of the matrix: ii
-    elem = random_element(population_culture)
-
-    # Select a random neighbor of this element: jj
-    neighbor = random_neighbor(elem, n, m)
-
-    # Update the profile of agent ii according to Axelrod model
-    p = np.sum(population_culture[elem] ==
-               population_culture[neighbor])
-    not_equal_indices = np.where(population_culture[elem] !=
-                                 population_culture[neighbor])[0]
-    if (p < f) & (random.uniform(0, 1) < p/f):
-        kk = random.choice(not_equal_indices)
-        population_culture[elem][kk] = population_culture[neighbor][kk]
-        no_changes_since = 0
+import numpy as np
+from aux_functions import (seed_generators, create_test_folder, parse_config,
+                           initialize_random_vector_network, random_element,
+                           random_neighbor, proportion_different_sigma_lattice)
+from aux_profiling import (new_profile, lap, count, start_sampling,
+                           stop_sampling, save_profile)
+from aux_store import cached_run
+
+# PARAMS of the test (defaults)
+DEFAULT_CONFIG = {
+    'max_iter': 2000000,
+    'num_max_stuck': None,  # max(200, max_iter//100) if None
+    # Shape of the network
+    'n': 20,
+    'm': 25,
+    # Number of attributes
+    'f': 8,
+    # Number of possible values for each attribute
+    'q': 4,
+    # Number of intermediate states stored through the process
+    'num_snapshots': 20,
+    'seed': 11859,
+    # Profiling of the run: 'phases', 'sampling' or None
+    'profile': 'phases',
+}
+
+
+def run_axelrod(config=None, profile=None):
+    """
+    Runs the Axelrod model over a lattice for the given config (missing
+    keys take the values of DEFAULT_CONFIG), timing its phases in profile
+    (a new one of mode config['profile'] if not given).
+    Returns a dict with the initial, intermediate ({iteration: state}) and
+    final cultural profiles, the order parameter of each feature at each
+    iteration, the last iteration, the running time and the profile
+    """
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    own_profile = profile is None
+    if own_profile:
+        profile = new_profile(config['profile'])
+        start_sampling(profile)
+    n, m, f, q = config['n'], config['m'], config['f'], config['q']
+    max_iter = config['max_iter']
+    num_max_stuck = config['num_max_stuck']
+    if num_max_stuck is None:
+        num_max_stuck = max(200, max_iter//100)
+    snapshot_every = max(1, max_iter//config['num_snapshots']) \
+        if config['num_snapshots'] else None
+    seed_generators(config['seed'])
+
+    # Initialize population profiles
+    population_culture = initialize_random_vector_network(n, m, f, q)
+    initial = population_culture.copy()
+
+    no_changes_since = 0
+    rho = [[proportion_different_sigma_lattice(
+            population_culture[:, :, ii]) for ii in range(f)]]
+    snapshots = {}
+    t0 = time.time()
+    t = time.perf_counter()
+
+    # Axelrod model
+    for iteration in range(max_iter):
+        # Select a random element of the matrix: ii
+        elem = random_element(population_culture)
+
+        # Select a random neighbor of this element: jj
+        neighbor = random_neighbor(elem, n, m)
+        t = lap(profile, 'rng', t)
+
+        # Update the profile of agent ii according to Axelrod model
+        p = np.sum(population_culture[elem] ==
+                   population_culture[neighbor])
+        not_equal_indices = np.where(population_culture[elem] !=
+                                     population_culture[neighbor])[0]
+        if (p < f) & (random.uniform(0, 1) < p/f):
+            kk = random.choice(not_equal_indices)
+            population_culture[elem][kk] = population_culture[neighbor][kk]
+            no_changes_since = 0
+            count(profile, 'accepted')
+        else:
+            no_changes_since += 1
+        t = lap(profile, 'update', t)
+
+        # Store order parameter
+        rho.append([proportion_different_sigma_lattice(
+                    population_culture[:, :, ii]) for ii in range(f)])
+        t = lap(profile, 'observables', t)
+
+        # Exit the loop if there are no updates
+        if no_changes_since == num_max_stuck:
+            print(f'There have been {num_max_stuck} steps without changes.'
+                  f'Process terminated.')
+            break
+
+        # Store intermediate steps through the process
+        if snapshot_every and (iteration+1) % snapshot_every == 0:
+            snapshots[iteration+1] = population_culture.copy()
+            t = lap(profile, 'snapshot', t)
+
+    dt = time.time() - t0
+    count(profile, 'steps', iteration+1)
+    if own_profile:
+        stop_sampling(profile)
+    return {'initial': initial, 'snapshots': snapshots,
+            'final': population_culture, 'rho': rho,
+            'iteration': iteration, 'num_max_stuck': num_max_stuck,
+            'time': dt, 'profile': profile}
+
+
+def plot_culture(population_culture, q, title, file_name):
+    """
+    Saves one image per feature of the cultural profiles, the title and
+    file name given as functions of the feature number
+    """
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import ListedColormap
+    # Get the colormap
+    if q <= 10:
+        catcmap = ListedColormap(plt.get_cmap(f"tab10").colors[:q])
     else:
-        no_changes_since += 1
-
-    # Store order parameter
-    rho.append([proportion_different_sigma_lattice(
-                population_culture[:, :, ii]) for ii in range(f)])
-
-    # Exit the loop if there are no updates
-    if no_changes_since == num_max_stuck:
-        print(f'There have been {num_max_stuck} steps without changes.'
-              f'Process terminated.')
-        break
-
-    # Plot intermediate steps through the process
-    if (iteration+1) % (max_iter//20) == 0:
-        for ii in range(f):
-            plt.figure(figsize=(8, 6))
-            im = plt.imshow(population_culture[:, :, ii], cmap=catcmap)
-            im.set_clim(0, q-1)
-            plt.title(f'Population cultural profile (feature {ii+1})'
-                      f' after {iteration+1} iterations')
-            plt.colorbar(ticks=[jj for jj in range(q)])
-            plt.xticks([])
-            plt.yticks([])
-            plt.tight_layout()
-            plt.savefig(f'./tests/{id_test}/population_'
-                        f'dim{ii+1}_iter{iteration+1}.png')
-            plt.close()
-
-dt = time.time() - t0
-
-# Plot the population at the end of the process
-for ii in range(f):
-    plt.figure(figsize=(8, 6))
-    im = plt.imshow(population_culture[:, :, ii], cmap=catcmap)
-    im.set_clim(0, q-1)
-    if iteration < max_iter-1:
-        plt.title(f'Population cultural profile (feature {ii+1})'
-                  f' after {iteration+1} iterations')
-    else:
-        plt.title(f'Population cultural profile (feature {ii+1})'
-                  f' after {max_iter} iterations')
-    plt.colorbar(ticks=[jj for jj in range(q)])
-    plt.xticks([])
-    plt.yticks([])
-    plt.tight_layout()
-    plt.savefig(f'./tests/{id_test}/population_dim{ii+1}_end.png')
-    plt.close()
-
-
-# Plot order parameter during simulation
-plt.figure(figsize=(8, 6))
-for ii in range(f):
-    plt.plot([rr[ii] for rr in rho], label=f'feature {ii+1}')
-plt.xlabel('iterations (t)')
-plt.ylabel('$\\rho$')
-plt.title(f'Order parameter')
-plt.legend()
-plt.xlim([0, max([len([rr[ii] for rr in rho]) for ii in range(f)])] )
-plt.ylim([min([min([rr[ii] for rr in rho]) for ii in range(f)]), 1])
-plt.tight_layout()
-plt.grid()
-plt.savefig(f'./tests/{id_test}/order_evolution.png')
-plt.close()
-
-plt.figure(figsize=(8, 6))
-for ii in range(f):
-    plt.loglog([rr[ii] for rr in rho], label=f'feature {ii+1}')
-plt.xlabel('iterations (t)')
-plt.ylabel('$\\rho$')
-plt.title(f'Order parameter')
-plt.legend()
-plt.xlim([0, max([len([rr[ii] for rr in rho]) for ii in range(f)])] )
-plt.ylim([min([min([rr[ii] for rr in rho]) for ii in range(f)]), 1])
-plt.tight_layout()
-plt.grid()
-plt.savefig(f'./tests/{id_test}/order_evolution_log.png')
-plt.close()
-
-
-# Document the test
-with open(f'./tests/{id_test}/doc_test.txt', 'w') as fw:
-    fw.write(f'Axelrod test with population shape [{n}, {m}]\n\n')
-    fw.write(f'Initial random distribution of cultural profiles with'
-            f' {f} attributes which can take {q} different categories each\n\n')
-    fw.write(f'Max # of iterations allowed: {max_iter}\n')
-    fw.write(f'Stop criteria: no evolution since {num_max_stuck} steps ago\n\n')
-    if iteration < max_iter-1:
-        fw.write(f'Process finished at iter {iteration}\n\n')
-    else:
-        fw.write(f'Process stopped due to max iter criteria\n\n')
-    fw.write(f'Time employed for running and plotting intermediate '
-             f'steps: {dt} s')
+        catcmap = ListedColormap(plt.get_cmap(f"tab20").colors[:q])
+
+    for ii in range(population_culture.shape[2]):
+        plt.figure(figsize=(8, 6))
+        im = plt.imshow(population_culture[:, :, ii], cmap=catcmap)
+        im.set_clim(0, q-1)
+        plt.title(title(ii+1))
+        plt.colorbar(ticks=[jj for jj in range(q)])
+        plt.xticks([])
+        plt.yticks([])
+        plt.tight_layout()
+        plt.savefig(file_name(ii+1))
+        plt.close()
+
+
+def plot_axelrod(results, config, folder):
+    """
+    Saves the figures of a run of the Axelrod model in folder
+    """
+    config = {**DEFAULT_CONFIG, **config}
+    from aux_plots import plot_order_evolution
+    q = config['q']
+    plot_culture(results['initial'], q,
+                 lambda dim: f'Initial state of Population cultural profile '
+                             f'(feature {dim})',
+                 lambda dim: f'{folder}/population_dim{dim}_init.png')
+    for iteration, population in results['snapshots'].items():
+        plot_culture(population, q,
+                     lambda dim: f'Population cultural profile (feature '
+                                 f'{dim}) after {iteration} iterations',
+                     lambda dim: f'{folder}/population_'
+                                 f'dim{dim}_iter{iteration}.png')
+    last = min(results['iteration']+1, config['max_iter'])
+    plot_culture(results['final'], q,
+                 lambda dim: f'Population cultural profile (feature {dim})'
+                             f' after {last} iterations',
+                 lambda dim: f'{folder}/population_dim{dim}_end.png')
+    plot_order_evolution(results['rho'], folder,
+                         labels=[f'feature {ii+1}'
+                                 for ii in range(config['f'])])
+
+
+def write_doc(results, config, folder):
+    """
+    Documents the test
+    """
+    config = {**DEFAULT_CONFIG, **config}
+    max_iter = config['max_iter']
+    with open(f'{folder}/doc_test.txt', 'w') as fw:
+        fw.write(f'Axelrod test with population shape '
+                 f'[{config["n"]}, {config["m"]}]\n\n')
+        fw.write(f'Initial random distribution of cultural profiles with'
+                 f' {config["f"]} attributes which can take {config["q"]} '
+                 f'different categories each\n\n')
+        fw.write(f'Random seed: {config["seed"]}\n')
+        fw.write(f'Max # of iterations allowed: {max_iter}\n')
+        fw.write(f'Stop criteria: no evolution since '
+                 f'{results["num_max_stuck"]} steps ago\n\n')
+        if results['iteration'] < max_iter-1:
+            fw.write(f'Process finished at iter {results["iteration"]}\n\n')
+        else:
+            fw.write(f'Process stopped due to max iter criteria\n\n')
+        fw.write(f'Time employed for running: {results["time"]} s')
+        if results.get('cached'):
+            fw.write(f' (results taken from the store, run '
+                     f'{results["key"]})')
+
+
+def main(argv=None):
+    config, options = parse_config(DEFAULT_CONFIG,
+                                   'Axelrod model of cultural dynamics', argv)
+    folder = create_test_folder('axelrod')
+    profile = new_profile(config['profile'])
+    start_sampling(profile)
+    results = cached_run('axelrod',
+                         lambda config: run_axelrod(config, profile),
+                         config, [__file__], options['store_dir'],
+                         options['rerun'])
+    t = time.perf_counter()
+    if options['plots']:
+        plot_axelrod(results, config, folder)
+        t = lap(profile, 'render', t)
+    write_doc(results, config, folder)
+    lap(profile, 'io', t)
+    stop_sampling(profile)
+    if not results['cached']:
+        save_profile(profile, f'{folder}/profile.json', results['time'])
+    return results
+
+
+if __name__ == '__main__':
+    main()
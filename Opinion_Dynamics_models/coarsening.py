@@ -0,0 +1,141 @@
+import os
+import time
+import numpy as np
+from aux_functions import (seed_generators, create_test_folder, parse_config,
+                           initialize_random_scalar_network,
+                           lattice_to_arrays, run_network_voter,
+                           run_lattice_sznajd, log_spaced_times)
+from aux_coarsening import coarsening_observables, growth_exponent
+from aux_store import cached_run
+
+COARSENING_FILE = os.path.join(os.path.dirname(__file__),
+                               'aux_coarsening.py')
+
+# PARAMS of the test (defaults)
+DEFAULT_CONFIG = {
+    # 'voter' or 'sznajd'
+    'model': 'voter',
+    'mode': 'node',
+    'bias': 0.5,
+    # Shape of the population (N, M)
+    'n': 64,
+    'm': 64,
+    'num_replicas': 8,
+    # Length of the runs in sweeps (N*M steps) and number of log-spaced
+    # times at which the lattices are sampled
+    'max_sweeps': 100,
+    'num_times': 30,
+    # Sweeps before which the growth exponent is not fitted (transient)
+    'fit_min_sweeps': 1,
+    'seed': 11859,
+}
+
+
+def run_coarsening(config=None):
+    """
+    Runs replicas of the voter or Sznajd model on a lattice from random
+    initial states for the given config (missing keys take the values of
+    DEFAULT_CONFIG), sampling them at log-spaced times, and computes the
+    coarsening observables of the whole batch (see aux_coarsening).
+    Returns a dict with the times (in sweeps), the structure factor,
+    correlation and domain lengths of every replica and time, the fitted
+    growth exponents and the running times
+    """
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    n, m = config['n'], config['m']
+    if config['model'] not in ('voter', 'sznajd'):
+        raise ValueError(f'Unknown model: {config["model"]}')
+    times = np.concatenate(([0], log_spaced_times(
+        config['max_sweeps'] * n * m, config['num_times'])))
+    seed_generators(config['seed'])
+    indptr, indices, edges = lattice_to_arrays(n, m)
+
+    snapshots = np.zeros((config['num_replicas'], len(times), n, m),
+                         dtype=np.int8)
+    t0 = time.time()
+    for replica in range(config['num_replicas']):
+        population = initialize_random_scalar_network(n, m, config['bias'])
+        snapshots[replica, 0] = population
+        # The runs are resumed between consecutive sampling times
+        for ii, gap in enumerate(np.diff(times)):
+            if config['model'] == 'voter':
+                population = run_network_voter(
+                    population, indptr, indices, edges, config['mode'],
+                    max_iter=gap, record_every=gap)[0].reshape(n, m)
+            else:
+                population = run_lattice_sznajd(population, gap,
+                                                record_every=gap)[0]
+            snapshots[replica, ii + 1] = population
+    run_time = time.time() - t0
+
+    t0 = time.time()
+    results = coarsening_observables(snapshots)
+    sweeps = times / (n * m)
+    fit_from = config['fit_min_sweeps']
+    for name in ['length_k', 'length_r']:
+        try:
+            results[f'exponent_{name[-1]}'] = growth_exponent(
+                sweeps, results[name], t_min=fit_from)
+        except ValueError:
+            results[f'exponent_{name[-1]}'] = (np.nan, np.nan, np.nan)
+    observables_time = time.time() - t0
+
+    return {**results, 'times': sweeps, 'run_time': run_time,
+            'observables_time': observables_time}
+
+
+def plot_coarsening_runs(results, config, folder):
+    """
+    Saves the replica averaged structure factor and domain lengths
+    """
+    from aux_plots import plot_coarsening
+    mean = {'times': results['times'], 'wavenumbers': results['wavenumbers']}
+    for name in ['structure_factor', 'length_k', 'length_r']:
+        mean[name] = np.nanmean(results[name], axis=0)
+    plot_coarsening(mean, folder, unit='sweeps')
+
+
+def write_doc(results, config, folder):
+    """
+    Documents the test
+    """
+    config = {**DEFAULT_CONFIG, **config}
+    with open(f'{folder}/doc_test.txt', 'w') as f:
+        f.write(f'Coarsening of the {config["model"]} model on a '
+                f'[{config["n"]}, {config["m"]}] lattice, '
+                f'{config["num_replicas"]} replicas\n\n')
+        f.write(f'Initial random distribution of 2 opinions biased with '
+                f'{100*config["bias"]}% supporting [1]\n')
+        f.write(f'Random seed: {config["seed"]}\n')
+        f.write(f'{len(results["times"])} log-spaced samples up to '
+                f'{config["max_sweeps"]} sweeps\n\n')
+        for name, title in [('k', 'structure factor, L = 2 pi / <k>_S'),
+                            ('r', 'correlation, C(L) = C(0)/2')]:
+            z, error, a = results[f'exponent_{name}']
+            f.write(f'Domain growth L(t) ~ t^z from the {title}: '
+                    f'z = {z:.3f} +- {error:.3f} (A = {a:.3f}, fitted '
+                    f'from {config["fit_min_sweeps"]} sweeps)\n')
+        f.write(f'\nTime employed for running: {results["run_time"]} s\n')
+        f.write(f'Time employed for the observables: '
+                f'{results["observables_time"]} s')
+        if results.get('cached'):
+            f.write(f' (results taken from the store, run '
+                    f'{results["key"]})')
+
+
+def main(argv=None):
+    config, options = parse_config(
+        DEFAULT_CONFIG, 'Coarsening observables of replicas of the voter and '
+                        'Sznajd models', argv)
+    folder = create_test_folder(f'coarsening_{config["model"]}')
+    results = cached_run('coarsening', run_coarsening, config,
+                         [__file__, COARSENING_FILE], options['store_dir'],
+                         options['rerun'])
+    if options['plots']:
+        plot_coarsening_runs(results, config, folder)
+    write_doc(results, config, folder)
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,285 @@
+import os
+import time
+import numpy as np
+import networkx as nx
+from scipy.stats import binom
+from aux_functions import (seed_generators, create_test_folder, parse_config,
+                           initialize_random_scalar_network,
+                           create_small_world_network, graph_to_arrays,
+                           lattice_to_arrays, run_network_voter,
+                           run_lattice_sznajd)
+from aux_master_equation import (voter_transitions, sznajd_transitions,
+                                 absorption, product_average,
+                                 average_by_ones, birth_death_absorption,
+                                 mean_field_voter_rates,
+                                 mean_field_sznajd_rates)
+from aux_store import cached_run
+
+# PARAMS of the test (defaults)
+DEFAULT_CONFIG = {
+    # Small systems solved exactly (2**agents states, up to 20 agents)
+    'voter_lattice': (3, 4),
+    # Small world network (agents, neighbors, rewiring probability)
+    'voter_swn': (12, 4, 0.2),
+    'sznajd_lattice': (4, 4),
+    'mode': 'node',
+    'bias': 0.5,
+    # Size of the mean-field birth-death chains
+    'mean_field_n': 50,
+    # Monte Carlo replicas used to check the exact results (0: no check)
+    'num_replicas': 2000,
+    'max_iter': 1000000,
+    # Steps without changes after which a Sznajd replica is frozen
+    'num_max_stuck': 1000,
+    'seed': 11859,
+}
+
+
+def exact_system(transitions, n, bias):
+    """
+    Exact absorption of a small system: exit probabilities (consensus in
+    [-1], in [1] and frozen in other absorbing states) and mean steps to
+    absorption, averaged over the random initial states of the given bias
+    and by number of initial supporters of [1]
+    """
+    probability, mean_time = absorption(transitions)
+    frozen = np.maximum(1 - probability.sum(axis=1), 0)
+    probability = np.column_stack((probability, frozen))
+    return {'exit': product_average(probability, n, bias),
+            'steps': float(product_average(mean_time, n, bias)),
+            'exit_by_ones': average_by_ones(probability, n),
+            'steps_by_ones': average_by_ones(mean_time, n)}
+
+
+def monte_carlo_system(run_replica, n, bias, num_replicas):
+    """
+    Monte Carlo estimate of the quantities of exact_system from independent
+    replicas: run_replica(population) returns the final number of
+    supporters of [1] and the steps to absorption
+    """
+    outcomes = np.zeros((num_replicas, 3))
+    steps = np.zeros(num_replicas)
+    for replica in range(num_replicas):
+        ones, steps[replica] = run_replica(
+            initialize_random_scalar_network(1, n, bias))
+        outcomes[replica, 0 if ones == 0 else 1 if ones == n else 2] = 1
+    return {'exit': outcomes.mean(axis=0),
+            'exit_error': outcomes.std(axis=0) / np.sqrt(num_replicas),
+            'steps': steps.mean(),
+            'steps_error': steps.std() / np.sqrt(num_replicas)}
+
+
+def voter_replica(indptr, indices, edges, mode, max_iter):
+    def run_replica(population):
+        _, _, num_1s, iteration = run_network_voter(
+            population, indptr, indices, edges, mode=mode,
+            max_iter=max_iter, record_every=max_iter)
+        return num_1s[-1], iteration + 1
+    return run_replica
+
+
+def sznajd_replica(N, M, max_iter, num_max_stuck):
+    def run_replica(population):
+        _, num_1s, iteration = run_lattice_sznajd(
+            population.reshape(N, M), max_iter, num_max_stuck,
+            record_every=max_iter)
+        # Frozen replicas stopped num_max_stuck steps after the last change
+        steps = iteration + 1
+        if num_1s[-1] not in (0, N * M):
+            steps -= num_max_stuck
+        return num_1s[-1], steps
+    return run_replica
+
+
+def run_master_equation(config=None):
+    """
+    Solves exactly the voter model on a small lattice and small world
+    network and the Sznajd model on a small lattice for the given config
+    (missing keys take the values of DEFAULT_CONFIG), checking them against
+    Monte Carlo replicas of the array-backed engines, plus the mean-field
+    birth-death chains of both models.
+    Returns a dict with one dict of results per system and the running
+    times of the exact solutions and of the Monte Carlo checks
+    """
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    bias, mode, max_iter = config['bias'], config['mode'], config['max_iter']
+    num_replicas = config['num_replicas']
+    seed_generators(config['seed'])
+
+    N, M = config['voter_lattice']
+    n, k, p = config['voter_swn']
+    network = create_small_world_network(n, k, p)
+    systems = {
+        'voter_lattice': (N * M, lattice_to_arrays(N, M)),
+        'voter_swn': (n, graph_to_arrays(network))}
+
+    results = {}
+    exact_time = 0.
+    mc_time = 0.
+    for name, (size, (indptr, indices, edges)) in systems.items():
+        t0 = time.time()
+        results[name] = exact_system(
+            voter_transitions(indptr, indices, mode), size, bias)
+        exact_time += time.time() - t0
+        if num_replicas:
+            t0 = time.time()
+            run_replica = voter_replica(indptr, indices, edges, mode,
+                                        max_iter)
+            results[name].update({
+                f'mc_{key}': value for key, value in monte_carlo_system(
+                    run_replica, size, bias, num_replicas).items()})
+            mc_time += time.time() - t0
+
+    N, M = config['sznajd_lattice']
+    t0 = time.time()
+    results['sznajd_lattice'] = exact_system(sznajd_transitions(N, M),
+                                             N * M, bias)
+    exact_time += time.time() - t0
+    if num_replicas:
+        t0 = time.time()
+        run_replica = sznajd_replica(N, M, max_iter, config['num_max_stuck'])
+        results['sznajd_lattice'].update({
+            f'mc_{key}': value for key, value in monte_carlo_system(
+                run_replica, N * M, bias, num_replicas).items()})
+        mc_time += time.time() - t0
+
+    # Mean-field chains, the voter one checked on the complete graph
+    n = config['mean_field_n']
+    t0 = time.time()
+    for name, rates in [('voter_mean_field', mean_field_voter_rates),
+                        ('sznajd_mean_field', mean_field_sznajd_rates)]:
+        probability, mean_time = birth_death_absorption(*rates(n))
+        weights = binom.pmf(np.arange(n + 1), n, bias)
+        results[name] = {'exit': np.array([1 - weights @ probability,
+                                           weights @ probability, 0.]),
+                         'steps': float(weights @ mean_time),
+                         'exit_by_ones': probability,
+                         'steps_by_ones': mean_time}
+    exact_time += time.time() - t0
+    if num_replicas:
+        t0 = time.time()
+        indptr, indices, edges = graph_to_arrays(nx.complete_graph(n))
+        results['voter_mean_field'].update({
+            f'mc_{key}': value for key, value in monte_carlo_system(
+                voter_replica(indptr, indices, edges, 'node', max_iter),
+                n, bias, num_replicas).items()})
+        mc_time += time.time() - t0
+
+    return {**results, 'network_edges': np.array(network.edges),
+            'exact_time': exact_time, 'mc_time': mc_time}
+
+
+def plot_master_equation(results, config, folder):
+    """
+    Saves the exact exit probabilities and mean consensus times of the
+    systems as a function of the initial supporters of [1], next to the
+    mean-field chain of the same size
+    """
+    config = {**DEFAULT_CONFIG, **config}
+    import matplotlib.pyplot as plt
+    for name, model, rates in [
+            ('voter_lattice', 'Voter', mean_field_voter_rates),
+            ('voter_swn', 'Voter', mean_field_voter_rates),
+            ('sznajd_lattice', 'Sznajd', mean_field_sznajd_rates),
+            ('voter_mean_field', 'Voter', None),
+            ('sznajd_mean_field', 'Sznajd', None)]:
+        system = results[name]
+        n = len(system['steps_by_ones']) - 1
+        fraction = np.arange(n + 1) / n
+        exit_1 = system['exit_by_ones'] if rates is None \
+            else system['exit_by_ones'][:, 1]
+        for key, curve, label in [('exit', exit_1, 'P(consensus in [1])'),
+                                  ('steps', system['steps_by_ones'],
+                                   'mean steps to absorption')]:
+            plt.figure(figsize=(8, 6))
+            plt.plot(fraction, curve, 'o-', label='exact')
+            if rates is not None:
+                mean_field = birth_death_absorption(*rates(n))
+                plt.plot(fraction, mean_field[0 if key == 'exit' else 1],
+                         '--', label=f'mean field, {n} agents')
+                plt.legend()
+            plt.title(f'{model} model: {name.replace("_", " ")}')
+            plt.xlabel('initial fraction supporting [1]')
+            plt.ylabel(label)
+            plt.grid()
+            plt.tight_layout()
+            plt.savefig(f'{folder}/{name}_{key}.png')
+            plt.close()
+
+
+def write_doc(results, config, folder):
+    """
+    Documents the test
+    """
+    config = {**DEFAULT_CONFIG, **config}
+    names = {'voter_lattice': f'Voter model ({config["mode"]} update) on a '
+                              f'{config["voter_lattice"]} lattice',
+             'voter_swn': f'Voter model ({config["mode"]} update) on a '
+                          f'small world network (n, k, p) = '
+                          f'{config["voter_swn"]}',
+             'sznajd_lattice': f'Sznajd model on a '
+                               f'{config["sznajd_lattice"]} lattice'}
+    with open(f'{folder}/doc_test.txt', 'w') as f:
+        f.write(f'Exact solution of the master equation over all the '
+                f'configurations of small systems\n\n')
+        f.write(f'Initial random distribution of 2 opinions biased with '
+                f'{100*config["bias"]}% supporting [1]\n')
+        f.write(f'Random seed: {config["seed"]}, Monte Carlo check with '
+                f'{config["num_replicas"]} replicas\n\n')
+        for name, title in names.items():
+            system = results[name]
+            f.write(f'{title}\n')
+            exit_, steps = system['exit'], system['steps']
+            f.write(f'    exact:       P[-1] = {exit_[0]:.4f}, '
+                    f'P[1] = {exit_[1]:.4f}, frozen = {exit_[2]:.4f}, '
+                    f'mean steps = {steps:.2f}\n')
+            if config['num_replicas']:
+                exit_, error = system['mc_exit'], system['mc_exit_error']
+                f.write(f'    Monte Carlo: P[-1] = {exit_[0]:.4f}'
+                        f'({error[0]:.4f}), P[1] = {exit_[1]:.4f}'
+                        f'({error[1]:.4f}), frozen = {exit_[2]:.4f}'
+                        f'({error[2]:.4f}), mean steps = '
+                        f'{system["mc_steps"]:.2f}'
+                        f'({system["mc_steps_error"]:.2f})\n')
+            f.write('\n')
+
+        n = config['mean_field_n']
+        for name, title in [('voter_mean_field', 'Voter'),
+                            ('sznajd_mean_field', 'Sznajd')]:
+            system = results[name]
+            f.write(f'{title} mean-field chain of {n} agents\n')
+            f.write(f'    exact:       P[1] = {system["exit"][1]:.4f}, '
+                    f'mean steps = {system["steps"]:.2f}\n')
+            if 'mc_exit' in system:
+                exit_, error = system['mc_exit'], system['mc_exit_error']
+                f.write(f'    Monte Carlo (complete graph): P[1] = '
+                        f'{exit_[1]:.4f}({error[1]:.4f}), mean steps = '
+                        f'{system["mc_steps"]:.2f}'
+                        f'({system["mc_steps_error"]:.2f})\n')
+            f.write('\n')
+        f.write(f'Time employed for the exact solutions: '
+                f'{results["exact_time"]} s\n')
+        f.write(f'Time employed for the Monte Carlo checks: '
+                f'{results["mc_time"]} s')
+        if results.get('cached'):
+            f.write(f' (results taken from the store, run '
+                    f'{results["key"]})')
+
+
+def main(argv=None):
+    config, options = parse_config(
+        DEFAULT_CONFIG, 'Exact master equation of small voter and Sznajd '
+                        'systems', argv)
+    folder = create_test_folder('master_equation')
+    results = cached_run('master_equation', run_master_equation, config,
+                         [__file__, os.path.join(os.path.dirname(__file__),
+                                                 'aux_master_equation.py')],
+                         options['store_dir'], options['rerun'])
+    if options['plots']:
+        plot_master_equation(results, config, folder)
+    write_doc(results, config, folder)
+    return results
+
+
+if __name__ == '__main__':
+    main()
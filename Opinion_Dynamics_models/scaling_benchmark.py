@@ -0,0 +1,306 @@
+import json
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+from aux_functions import (seed_generators, create_test_folder, parse_config,
+                           initialize_random_scalar_network,
+                           run_lattice_sznajd, lattice_to_arrays,
+                           create_small_world_network, graph_to_arrays,
+                           run_network_voter)
+
+# Folder of aux_benchmarks (regression checks and baselines shared with
+# benchmarks/benchmark_kernels.py), only needed by main
+BENCHMARKS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              '..', 'benchmarks')
+
+# PARAMS of the test (defaults)
+DEFAULT_CONFIG = {
+    'n_seeds': 20,  # runs per size, seeded seed, seed+1...
+    'seed': 0,
+    'max_sweeps': 50000,
+    # Geometric ranges of sizes (lattice side for lattice models)
+    'sizes': {'voter': [4, 6, 8, 11, 16],
+              'sznajd': [4, 6, 8, 11, 16],
+              'swn_voter': [16, 32, 64, 128, 256]},
+    # Expected exponent of T/ln(N) for the 2D voter model and tolerance
+    'voter_exponent': 1,
+    'exponent_tolerance': 0.25,
+    # Baseline of the throughput and peak memory of every (model, size), in
+    # the format of aux_benchmarks (stored on the first run or if
+    # update_baseline), and allowed relative losses
+    'baseline': './tests/scaling_benchmarks.json',
+    'update_baseline': False,
+    'tolerance': 0.2,
+    'memory_tolerance': 0.25,
+}
+
+
+def setup_run(model, size, seed, bias=0.5, k=4, p=0.1):
+    """
+    Builds the initial state of one run of the given model:
+        - 'voter': voter model on a cyclical size x size lattice
+        - 'sznajd': Sznajd model on a cyclical size x size lattice
+        - 'swn_voter': voter model on a Small World Network of size agents
+    Returns the number of agents and a function running the dynamics
+    for a maximum number of steps, which returns the iterations needed
+    to reach an absorbing state and whether it is consensus
+    """
+    seed_generators(seed)
+    if model == 'sznajd':
+        population = initialize_random_scalar_network(size, size, bias)
+
+        def run(max_iter, num_max_stuck):
+            final, num_1s, iteration = run_lattice_sznajd(
+                population, max_iter, num_max_stuck, record_every=max_iter)
+            return iteration, num_1s[-1] in (0, final.size)
+
+        return size * size, run
+
+    if model == 'voter':
+        n = size * size
+        indptr, indices, edges = lattice_to_arrays(size, size)
+        sigma = initialize_random_scalar_network(size, size, bias)
+    elif model == 'swn_voter':
+        n = size
+        network = create_small_world_network(size, k, p, bias)
+        indptr, indices, edges = graph_to_arrays(network)
+        sigma = [network.nodes[node]['sigma'] for node in network.nodes]
+    else:
+        raise ValueError(f'Unknown model: {model}')
+
+    def run(max_iter, num_max_stuck):
+        final, rho, num_1s, iteration = run_network_voter(
+            sigma, indptr, indices, edges, max_iter=max_iter,
+            num_max_stuck=num_max_stuck, record_every=max_iter)
+        return iteration, num_1s[-1] in (0, n)
+
+    return n, run
+
+
+def time_to_absorption(model, size, seed, max_sweeps, stuck_sweeps=20):
+    """
+    Runs the model until it gets absorbed (no changes during stuck_sweeps
+    Monte Carlo sweeps) or max_sweeps are performed.
+    Returns the time of absorption in Monte Carlo sweeps (nan if not
+    reached), whether the absorbing state is consensus, the number of
+    steps performed and the wall-clock time employed
+    """
+    n, run = setup_run(model, size, seed)
+    max_iter = int(max_sweeps * n)
+    num_max_stuck = int(stuck_sweeps * n)
+    t0 = time.perf_counter()
+    iteration, consensus = run(max_iter, num_max_stuck)
+    dt = time.perf_counter() - t0
+
+    steps = iteration + 1
+    if consensus:
+        t_abs = steps / n
+    elif steps < max_iter:
+        # The last change happened num_max_stuck steps before stopping
+        t_abs = (steps - num_max_stuck) / n
+    else:
+        t_abs = np.nan
+    return t_abs, consensus, steps, dt
+
+
+def peak_memory(model, size, max_sweeps):
+    """
+    Peak memory (bytes) allocated by python while running one instance
+    """
+    tracemalloc.start()
+    time_to_absorption(model, size, 0, max_sweeps)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def fit_exponent(sizes, values):
+    """
+    Least-squares exponent b of values ~ a * sizes**b (nan values ignored)
+    """
+    sizes = np.asarray(sizes, dtype=float)
+    values = np.asarray(values, dtype=float)
+    valid = np.isfinite(values) & (values > 0)
+    if np.count_nonzero(valid) < 2:
+        return np.nan
+    return np.polyfit(np.log(sizes[valid]), np.log(values[valid]), 1)[0]
+
+
+def benchmark_model(model, sizes, n_seeds, max_sweeps, seed=0):
+    """
+    Runs n_seeds instances of the model for each size.
+    Returns one row per size with the number of agents, mean and
+    standard error of the absorption time (in MC sweeps), fraction of
+    runs ending in consensus, steps performed, steps/s and peak memory
+    """
+    rows = []
+    for size in sizes:
+        times, consensus, steps, dts = [], [], [], []
+        for run_seed in range(seed, seed + n_seeds):
+            t_abs, cons, n_steps, dt = time_to_absorption(
+                model, size, run_seed, max_sweeps)
+            times.append(t_abs)
+            consensus.append(cons)
+            steps.append(n_steps)
+            dts.append(dt)
+        times = np.array(times)
+        n = size * size if model in ('voter', 'sznajd') else size
+        rows.append({
+            'model': model,
+            'size': size,
+            'N': n,
+            'T_mean': float(np.nanmean(times)),
+            'T_err': float(np.nanstd(times) /
+                           np.sqrt(max(np.count_nonzero(np.isfinite(times)),
+                                       1))),
+            'absorbed': float(np.mean(np.isfinite(times))),
+            'consensus': float(np.mean(consensus)),
+            'steps': int(np.sum(steps)),
+            'steps_per_s': float(np.sum(steps) / np.sum(dts)),
+            'peak_memory': peak_memory(model, size, max_sweeps),
+        })
+        print(f'{model} N={n}: T={rows[-1]["T_mean"]:.1f} sweeps, '
+              f'{rows[-1]["steps_per_s"]:.0f} steps/s')
+    return rows
+
+
+def scaling_summary(rows):
+    """
+    Fits the scaling exponents of each model:
+        - exponent of T (MC sweeps) vs N
+        - exponent of T / ln(N) vs N, which should be 1 for the 2D voter
+          model (T ~ N log N)
+        - exponent of the wall-clock time per run vs N
+    """
+    summary = {}
+    for model in dict.fromkeys(row['model'] for row in rows):
+        model_rows = [row for row in rows if row['model'] == model]
+        n = np.array([row['N'] for row in model_rows])
+        t = np.array([row['T_mean'] for row in model_rows])
+        steps_per_s = np.array([row['steps_per_s'] for row in model_rows])
+        summary[model] = {
+            'T_exponent': float(fit_exponent(n, t)),
+            'T_over_logN_exponent': float(fit_exponent(n, t / np.log(n))),
+            'wall_time_exponent': float(fit_exponent(n, t * n / steps_per_s)),
+        }
+    return summary
+
+
+def benchmark_results(rows, n_seeds):
+    """
+    Throughput and peak memory of every (model, size), named
+    scaling_<model>[<size>], in the format of aux_benchmarks.run_benchmarks
+    """
+    return {f'scaling_{row["model"]}[{row["size"]}]': {
+                'unit': 'steps', 'items': row['steps'], 'repeats': n_seeds,
+                'throughput': row['steps_per_s'],
+                'peak_memory': row['peak_memory']}
+            for row in rows}
+
+
+def run_scaling(config=None):
+    """
+    Runs the scaling benchmark of every model of config['sizes'] for the
+    given config (missing keys take the values of DEFAULT_CONFIG).
+    Returns a dict with one row per (model, size) (see benchmark_model),
+    the fitted exponents of each model, the same runs as benchmarks (see
+    benchmark_results), the failed checks of the 2D voter exponent and the
+    running time
+    """
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    t0 = time.time()
+    rows = []
+    for model, model_sizes in config['sizes'].items():
+        rows += benchmark_model(model, model_sizes, config['n_seeds'],
+                                config['max_sweeps'], config['seed'])
+    summary = scaling_summary(rows)
+
+    failures = []
+    if 'voter' in summary:
+        voter_fit = summary['voter']['T_over_logN_exponent']
+        if abs(voter_fit - config['voter_exponent']) > \
+                config['exponent_tolerance']:
+            failures.append(f'2D voter: T/ln(N) ~ N^{voter_fit:.3f}, '
+                            f'expected exponent {config["voter_exponent"]}')
+    return {'rows': rows, 'summary': summary,
+            'benchmarks': benchmark_results(rows, config['n_seeds']),
+            'failures': failures, 'time': time.time() - t0}
+
+
+def scaling_table(rows, summary):
+    lines = ['{:<10} {:>7} {:>12} {:>9} {:>9} {:>10}'.format(
+        'Model', 'N', 'T [sweeps]', '+/-', 'Absorbed', 'Consensus')]
+    for row in rows:
+        lines.append('{:<10} {:>7} {:>12.1f} {:>9.1f} {:>9.2f} {:>10.2f}'
+                     .format(row['model'], row['N'], row['T_mean'],
+                             row['T_err'], row['absorbed'],
+                             row['consensus']))
+    lines.append('')
+    lines.append('{:<10} {:>12} {:>16} {:>16}'.format(
+        'Model', 'T ~ N^b', 'T/ln(N) ~ N^b', 'Wall ~ N^b'))
+    for model, fit in summary.items():
+        lines.append('{:<10} {:>12.3f} {:>16.3f} {:>16.3f}'.format(
+            model, fit['T_exponent'], fit['T_over_logN_exponent'],
+            fit['wall_time_exponent']))
+    return '\n'.join(lines)
+
+
+def write_doc(results, config, folder):
+    """
+    Documents the test
+    """
+    config = {**DEFAULT_CONFIG, **config}
+    with open(f'{folder}/results.json', 'w') as f:
+        json.dump({key: results[key] for key in
+                   ['rows', 'summary', 'benchmarks', 'failures']},
+                  f, indent=2)
+    with open(f'{folder}/doc_test.txt', 'w') as f:
+        f.write(f'Consensus time scaling with {config["n_seeds"]} seeds '
+                f'per size (first seed {config["seed"]})\n')
+        f.write(f'Max # of MC sweeps allowed: {config["max_sweeps"]}\n\n')
+        f.write(results['table'] + '\n\n')
+        f.write(f'Baseline: {config["baseline"]}, tolerance: '
+                f'{config["tolerance"]} throughput, '
+                f'{config["memory_tolerance"]} peak memory\n')
+        f.write(results['benchmark_table'] + '\n\n')
+        for failure in results['failures']:
+            f.write(f'FAILED: {failure}\n')
+        f.write(f'\nTime employed for running: {results["time"]} s')
+
+
+def main(argv=None):
+    config, _ = parse_config(
+        DEFAULT_CONFIG, 'Consensus time scaling of the voter, Sznajd and '
+                        'small world voter models', argv)
+    if BENCHMARKS_DIR not in sys.path:
+        sys.path.append(BENCHMARKS_DIR)
+    from aux_benchmarks import (load_baseline, save_baseline,
+                                check_regressions, format_table)
+    folder = create_test_folder('scaling')
+    results = run_scaling(config)
+
+    baseline = load_baseline(config['baseline'])
+    results['failures'] += check_regressions(
+        results['benchmarks'], baseline, config['tolerance'],
+        config['memory_tolerance'])
+    if config['update_baseline'] or not baseline:
+        save_baseline(config['baseline'], results['benchmarks'], baseline)
+    results['table'] = scaling_table(results['rows'], results['summary'])
+    results['benchmark_table'] = format_table(results['benchmarks'],
+                                              baseline)
+    print()
+    print(results['table'])
+    print()
+    print(results['benchmark_table'])
+    write_doc(results, config, folder)
+
+    print()
+    for failure in results['failures']:
+        print('FAILED:', failure)
+    return results['failures']
+
+
+if __name__ == '__main__':
+    sys.exit(1 if main() else 0)
@@ -1,158 +1,256 @@
-import datetime
-import os
+import random
 import time
-import matplotlib.pyplot as plt
-from aux_functions import *
-
-
-# Identify the test (for saving results)
-current_time = datetime.datetime.now()
-id_test = 'schelling_' + current_time.strftime("%Y-%m-%d_%H-%M-%S")
-# Create folder for results
-if not os.path.exists('./tests/' + id_test):
-    os.makedirs('./tests/' + id_test)
-
-
-# PARAMS of the test
-max_iter = 500
-
-# Schelling model parameters
-N = 100  # Grid size (N x N)
-p = 0.02  # Voids density
-red_fraction = 0.45  # Fraction of red agents
-threshold = 0.67  # Similarity threshold for agent movement
-
-# Initialize the network
-network = initialize_schelling_network(N, p, red_fraction)
-
-# Plot initial state
-pos = {(x, y): (x, y) for x, y in network.nodes}
-node_colors = ['w' if network.nodes[node]['color'] == ''
-               else network.nodes[node]['color']
-               for node in network.nodes]
-plt.figure(figsize=(8, 8))
-nx.draw(network, pos, node_size=250000/N**2,
-        node_color=node_colors, with_labels=False)
-plt.title(f'Schelling Segregation Model initial state', loc='left')
-plt.axis('off')  # Disable axis display
-plt.savefig(f'./tests/{id_test}/segregation_init.png')
-plt.close()
-
-
-t0 = time.time()
-movements_total = 0
-# Simulate Schelling segregation model
-node_list = list(network.nodes)
-for iteration in range(max_iter):
-    move_occurred = False
-    unsatisfied_agents = 0
-    print(f'Iter {iteration+1}')
-
-    random.shuffle(node_list)
-    for node in node_list:
-        # Skip empty nodes
-        if network.nodes[node]['color'] == '':
-            continue
-
-        # Get satisfaction of the agent
-        similarity = compute_similarity(network, node)
-        # If the agent is not satisfied, moves to an empty node
-        if similarity < threshold:
-            max_satisfaction = similarity
-            best_loc = node
-            unsatisfied_agents += 1
-            vacant_nodes = list([n for n in network.nodes
-                                 if network.nodes[n]['color'] == ''])
-            random.shuffle(vacant_nodes)
-            if vacant_nodes:
-                unsatisfied_moved = False
-                for new_location in vacant_nodes:
-                    # Try moving to vacant node
-                    network.nodes[new_location]['color'] = \
-                        network.nodes[node]['color']
-                    # Check satisfaction
-                    satisfaction_new = compute_similarity(network, new_location)
-
-                    if not satisfaction_new < threshold:
-                        # Moved to vacant location (old location is now empty)
-                        network.nodes[node]['color'] = ''
-                        move_occurred = True
-                        unsatisfied_moved = True
-                        movements_total += 1
-                        unsatisfied_agents -= 1
-                        break
-                    else:
-                        # Try again (leave vacant location empty)
-                        network.nodes[new_location]['color'] = ''
-                        # Store in memory if it was best among tried locations
-                        if satisfaction_new > max_satisfaction:
-                            max_satisfaction = satisfaction_new
-                            best_loc = new_location
-                if not unsatisfied_moved:
-                    if not best_loc == node:
-                        network.nodes[best_loc]['color'] =\
+import networkx as nx
+import numpy as np
+from aux_functions import (seed_generators, create_test_folder, parse_config,
+                           initialize_schelling_network, compute_similarity)
+from aux_profiling import (new_profile, lap, count, start_sampling,
+                           stop_sampling, save_profile)
+from aux_store import cached_run
+
+# PARAMS of the test (defaults)
+DEFAULT_CONFIG = {
+    'max_iter': 500,
+    # Schelling model parameters
+    'N': 100,  # Grid size (N x N)
+    'p': 0.02,  # Voids density
+    'red_fraction': 0.45,  # Fraction of red agents
+    'threshold': 0.67,  # Similarity threshold for agent movement
+    # Number of intermediate states stored through the process
+    'num_snapshots': 50,
+    'seed': 11859,
+    'verbose': True,
+    # Profiling of the run: 'phases', 'sampling' or None
+    'profile': 'phases',
+}
+
+
+def node_colors(network, N):
+    """
+    N x N array with the color of each node (x, y) of the grid ('' for
+    vacant nodes)
+    """
+    return np.array([[network.nodes[(x, y)]['color'] for y in range(N)]
+                     for x in range(N)])
+
+
+def run_schelling(config=None, profile=None):
+    """
+    Runs the Schelling segregation model for the given config (missing
+    keys take the values of DEFAULT_CONFIG), timing its phases in profile
+    (a new one of mode config['profile'] if not given).
+    Returns a dict with the initial, intermediate ({iteration: colors}) and
+    final node colors (see node_colors), the number of switches (also at
+    each snapshot, {iteration: switches}), the agents left unsatisfied,
+    the last iteration, the running time and the profile
+    """
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    own_profile = profile is None
+    if own_profile:
+        profile = new_profile(config['profile'])
+        start_sampling(profile)
+    max_iter, threshold = config['max_iter'], config['threshold']
+    snapshot_every = max(1, max_iter//config['num_snapshots']) \
+        if config['num_snapshots'] else None
+    seed_generators(config['seed'])
+
+    # Initialize the network
+    N = config['N']
+    network = initialize_schelling_network(N, config['p'],
+                                           config['red_fraction'])
+    initial = node_colors(network, N)
+
+    t0 = time.time()
+    movements_total = 0
+    last_stopped = False
+    snapshots = {}
+    snapshot_switches = {}
+    # Simulate Schelling segregation model
+    node_list = list(network.nodes)
+    num_agents = int(np.count_nonzero(initial != ''))
+    for iteration in range(max_iter):
+        move_occurred = False
+        unsatisfied_agents = 0
+        if config['verbose']:
+            print(f'Iter {iteration+1}')
+
+        t = time.perf_counter()
+        random.shuffle(node_list)
+        t = lap(profile, 'rng', t)
+        for node in node_list:
+            # Skip empty nodes
+            if network.nodes[node]['color'] == '':
+                continue
+
+            # Get satisfaction of the agent
+            similarity = compute_similarity(network, node)
+            # If the agent is not satisfied, moves to an empty node
+            if similarity < threshold:
+                max_satisfaction = similarity
+                best_loc = node
+                unsatisfied_agents += 1
+                vacant_nodes = list([n for n in network.nodes
+                                     if network.nodes[n]['color'] == ''])
+                random.shuffle(vacant_nodes)
+                if vacant_nodes:
+                    unsatisfied_moved = False
+                    for new_location in vacant_nodes:
+                        # Try moving to vacant node
+                        network.nodes[new_location]['color'] = \
                             network.nodes[node]['color']
-                        network.nodes[node]['color'] = ''
-                        move_occurred = True
-                        movements_total += 1
-
-    # The simulation ends if all agents are satisfied or
-    # there's no available space
-    if not move_occurred:
-        if last_stopped:
-            break
-        last_stopped = True
-    else:
-        last_stopped = False
-
-    # Plot intermediate steps through the process
-    if (iteration+1) % (max_iter//50) == 0:
-    # if True:
-        pos = {(x, y): (x, y) for x, y in network.nodes}
-        node_colors = ['w' if network.nodes[node]['color'] == ''
-                       else network.nodes[node]['color']
-                       for node in network.nodes]
-        plt.figure(figsize=(8, 8))
-        nx.draw(network, pos, node_size=250000/N**2,
-                node_color=node_colors, with_labels=False)
-        plt.title(f'Schelling Segregation Model '
-                  f'after {movements_total} switches')
-        plt.savefig(f'./tests/{id_test}/'
-                    f'segregation_iter{iteration+1}.png')
-        plt.close()
-        print(f'Switches {movements_total}')
-
-dt = time.time() - t0
-
-# Plot the final state
-pos = {(x, y): (x, y) for x, y in network.nodes}
-node_colors = ['w' if network.nodes[node]['color'] == ''
-               else network.nodes[node]['color']
-               for node in network.nodes]
-plt.figure(figsize=(8, 8))
-nx.draw(network, pos, node_size=250000/N**2,
-        node_color=node_colors, with_labels=False)
-plt.title(f'Schelling Segregation Model after {movements_total} switches')
-plt.savefig(f'./tests/{id_test}/segregation_end.png')
-plt.close()
-
-
-# Document the test
-with open(f'./tests/{id_test}/doc_test.txt', 'w') as fw:
-    fw.write(f'Schelling test with population shape [{N}, {N}]\n\n')
-    fw.write(f'Initial random distribution of {int((1-p)*N*N)} agents with '
-             f'{int(p*N*N)} vacant nodes, being {int((1-p)*N*N*red_fraction)} '
-             f'agents red and {int((1-p)*N*N*(1-red_fraction))}, blue\n')
-    fw.write(f'Threshold for being satisfied: {100*threshold}% of '
-             f'neighbors sharing the same group\n\n')
-    fw.write(f'Max # of iterations allowed: {max_iter}\n')
-    fw.write(f'Stop criteria: no movement of any agent in last step\n\n')
-    if iteration < max_iter-1:
-        fw.write(f'Process finished at iter {iteration}\n\n')
-    else:
-        fw.write(f'Process stopped due to max iter criteria\n\n')
-    fw.write(f'{movements_total} switches have occurred\n\n')
-    fw.write(f'There are {unsatisfied_agents} agents which are still '
-             f'unsatisfied but could not find a suitable node to move into \n')
-    fw.write(f'Time employed for running and plotting intermediate '
-             f'steps: {dt} s')
+                        # Check satisfaction
+                        satisfaction_new = compute_similarity(network,
+                                                              new_location)
+
+                        if not satisfaction_new < threshold:
+                            # Moved to vacant location (old location is
+                            # now empty)
+                            network.nodes[node]['color'] = ''
+                            move_occurred = True
+                            unsatisfied_moved = True
+                            movements_total += 1
+                            unsatisfied_agents -= 1
+                            break
+                        else:
+                            # Try again (leave vacant location empty)
+                            network.nodes[new_location]['color'] = ''
+                            # Store in memory if it was best among tried
+                            # locations
+                            if satisfaction_new > max_satisfaction:
+                                max_satisfaction = satisfaction_new
+                                best_loc = new_location
+                    if not unsatisfied_moved:
+                        if not best_loc == node:
+                            network.nodes[best_loc]['color'] =\
+                                network.nodes[node]['color']
+                            network.nodes[node]['color'] = ''
+                            move_occurred = True
+                            movements_total += 1
+        t = lap(profile, 'update', t)
+
+        # The simulation ends if all agents are satisfied or
+        # there's no available space
+        if not move_occurred:
+            if last_stopped:
+                break
+            last_stopped = True
+        else:
+            last_stopped = False
+
+        # Store intermediate steps through the process
+        if snapshot_every and (iteration+1) % snapshot_every == 0:
+            snapshots[iteration+1] = node_colors(network, N)
+            snapshot_switches[iteration+1] = movements_total
+            if config['verbose']:
+                print(f'Switches {movements_total}')
+            t = lap(profile, 'snapshot', t)
+
+    dt = time.time() - t0
+    # Each sweep tries to update every agent
+    count(profile, 'sweeps', iteration+1)
+    count(profile, 'steps', (iteration+1)*num_agents)
+    count(profile, 'accepted', movements_total)
+    if own_profile:
+        stop_sampling(profile)
+    return {'initial': initial, 'snapshots': snapshots,
+            'snapshot_switches': snapshot_switches,
+            'final': node_colors(network, N), 'switches': movements_total,
+            'unsatisfied_agents': unsatisfied_agents,
+            'iteration': iteration, 'time': dt, 'profile': profile}
+
+
+def plot_segregation(colors, title, file, **title_kwargs):
+    """
+    Saves the image of the grid with the given node colors
+    """
+    import matplotlib.pyplot as plt
+    N = len(colors)
+    network = nx.grid_2d_graph(N, N)
+    pos = {(x, y): (x, y) for x, y in network.nodes}
+    plt.figure(figsize=(8, 8))
+    nx.draw(network, pos, node_size=250000/N**2,
+            node_color=['w' if colors[node] == '' else colors[node]
+                        for node in network.nodes],
+            with_labels=False)
+    plt.title(title, **title_kwargs)
+    plt.axis('off')  # Disable axis display
+    plt.savefig(file)
+    plt.close()
+
+
+def plot_schelling(results, config, folder):
+    """
+    Saves the figures of a run of the Schelling model in folder
+    """
+    plot_segregation(results['initial'],
+                     f'Schelling Segregation Model initial state',
+                     f'{folder}/segregation_init.png', loc='left')
+    for iteration, colors in results['snapshots'].items():
+        plot_segregation(colors,
+                         f'Schelling Segregation Model after '
+                         f'{results["snapshot_switches"][iteration]} '
+                         f'switches',
+                         f'{folder}/segregation_iter{iteration}.png')
+    plot_segregation(results['final'],
+                     f'Schelling Segregation Model after '
+                     f'{results["switches"]} switches',
+                     f'{folder}/segregation_end.png')
+
+
+def write_doc(results, config, folder):
+    """
+    Documents the test
+    """
+    config = {**DEFAULT_CONFIG, **config}
+    N, p, red_fraction = config['N'], config['p'], config['red_fraction']
+    max_iter = config['max_iter']
+    with open(f'{folder}/doc_test.txt', 'w') as fw:
+        fw.write(f'Schelling test with population shape [{N}, {N}]\n\n')
+        fw.write(f'Initial random distribution of {int((1-p)*N*N)} agents '
+                 f'with {int(p*N*N)} vacant nodes, being '
+                 f'{int((1-p)*N*N*red_fraction)} agents red and '
+                 f'{int((1-p)*N*N*(1-red_fraction))}, blue\n')
+        fw.write(f'Threshold for being satisfied: '
+                 f'{100*config["threshold"]}% of neighbors sharing the same '
+                 f'group\n\n')
+        fw.write(f'Random seed: {config["seed"]}\n')
+        fw.write(f'Max # of iterations allowed: {max_iter}\n')
+        fw.write(f'Stop criteria: no movement of any agent in last step\n\n')
+        if results['iteration'] < max_iter-1:
+            fw.write(f'Process finished at iter {results["iteration"]}\n\n')
+        else:
+            fw.write(f'Process stopped due to max iter criteria\n\n')
+        fw.write(f'{results["switches"]} switches have occurred\n\n')
+        fw.write(f'There are {results["unsatisfied_agents"]} agents which '
+                 f'are still unsatisfied but could not find a suitable node '
+                 f'to move into \n')
+        fw.write(f'Time employed for running: {results["time"]} s')
+        if results.get('cached'):
+            fw.write(f' (results taken from the store, run '
+                     f'{results["key"]})')
+
+
+def main(argv=None):
+    config, options = parse_config(DEFAULT_CONFIG,
+                                   'Schelling segregation model', argv)
+    folder = create_test_folder('schelling')
+    profile = new_profile(config['profile'])
+    start_sampling(profile)
+    results = cached_run('schelling',
+                         lambda config: run_schelling(config, profile),
+                         config, [__file__], options['store_dir'],
+                         options['rerun'])
+    t = time.perf_counter()
+    if options['plots']:
+        plot_schelling(results, config, folder)
+        t = lap(profile, 'render', t)
+    write_doc(results, config, folder)
+    lap(profile, 'io', t)
+    stop_sampling(profile)
+    if not results['cached']:
+        save_profile(profile, f'{folder}/profile.json', results['time'])
+    return results
+
+
+if __name__ == '__main__':
+    main()
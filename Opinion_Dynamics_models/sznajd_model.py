@@ -1,174 +1,223 @@
-import datetime
 import os
 import time
-import matplotlib.pyplot as plt
-from aux_functions import *
-
-
-# Identify the test (for saving results)
-current_time = datetime.datetime.now()
-id_test = 'sznajd_' + current_time.strftime("%Y-%m-%d_%H-%M-%S")
-# Create folder for results
-if not os.path.exists('./tests/' + id_test):
-    os.makedirs('./tests/' + id_test)
-
-
-# PARAMS of the test
-max_iter = 2000000
-num_max_stuck = max(200, max_iter//100)
-circle = True
-radius = 0.48
-bias = 0.5
-
-# Shape of the population (N, M)
-n = 40
-m = 50
-
-
-# Initialize population opinion
-if circle:
-    population_opinion = initialize_circular_scalar_network(n, m, radius)
-else:
-    population_opinion = initialize_random_scalar_network(n, m, bias)
-
-# Plot the initial state
-plt.figure(figsize=(8, 6))
-plt.imshow(population_opinion, cmap='gray')
-plt.title(f'Initial state of Population Opinion')
-plt.colorbar(ticks=[-1, 1])
-plt.xticks([])
-plt.yticks([])
-plt.tight_layout()
-plt.savefig(f'./tests/{id_test}/population_init.png')
-plt.close()
-
-
-no_changes_since = 0
-num_1s = [np.count_nonzero(population_opinion == 1)]
-rho = [proportion_different_sigma_lattice(population_opinion)]
-t0 = time.time()
-
-# Sznajd model
-for iteration in range(max_iter):
-    # Select a random element of the matrix: ii
-    elem = random_element(population_opinion)
-
-    # Select the relevant neighbors at the network
-    partner, neighbors = sznajd_neighbors(elem, n, m)
-
-    # Update neighbors according to Sznajd model
-    pop_op_tm1 = population_opinion.copy()
-    for ii, neigh in enumerate(neighbors):
-        if ii < 3:
-            population_opinion[neigh] = \
-                population_opinion[partner]
-        else:
-            population_opinion[neigh] = \
-                population_opinion[elem]
-
-    # Track population support of idea [1]
-    num_1s.append(np.count_nonzero(population_opinion == 1))
-    # Store order parameter
-    rho.append(proportion_different_sigma_lattice(population_opinion))
-
-    # Check if any opinion has changed
-    if np.max(np.abs(population_opinion - pop_op_tm1)) == 0:
-        no_changes_since += 1
-    else:
-        no_changes_since = 0
-
-    # Exit the loop if there are no updates
-    if no_changes_since == num_max_stuck:
-        print(f'There have been {num_max_stuck} steps without changes.'
-              f'Process terminated.')
-        break
-
-    # Plot intermediate steps through the process
-    if (iteration+1) % (max_iter//20) == 0:
-        plt.figure(figsize=(8, 6))
-        plt.imshow(population_opinion, cmap='gray')
-        plt.title(f'Population Opinion after {iteration+1} iterations')
-        plt.colorbar(ticks=[-1, 1])
-        plt.xticks([])
-        plt.yticks([])
-        plt.tight_layout()
-        plt.savefig(f'./tests/{id_test}/population_iter{iteration+1}.png')
-        plt.close()
-
-dt = time.time() - t0
-
-
-# Plot the population at the end of the process
-plt.figure(figsize=(8, 6))
-plt.imshow(population_opinion, cmap='gray')
-if iteration < max_iter-1:
-    plt.title(f'Population Opinion after {iteration+1} iterations')
-else:
-    plt.title(f'Population Opinion after {max_iter} iterations')
-plt.colorbar(ticks=[-1, 1])
-plt.xticks([])
-plt.yticks([])
-plt.tight_layout()
-plt.savefig(f'./tests/{id_test}/population_end.png')
-plt.close()
-
-
-# Plot Support evolution during simulation
-pop_size = np.size(population_opinion)
-plt.figure(figsize=(8, 6))
-plt.plot([supporters*100/pop_size for supporters in num_1s])
-plt.title(f'Population sharing opinion [1]')
-plt.xlabel(f'iterations')
-plt.ylabel(f'% supporters')
-plt.xlim([0, len(num_1s)])
-plt.tight_layout()
-plt.grid()
-plt.savefig(f'./tests/{id_test}/support_evolution_1.png')
-plt.ylim([0, 100])
-plt.savefig(f'./tests/{id_test}/support_evolution.png')
-plt.close()
-
-
-# Plot order parameter during simulation
-plt.figure(figsize=(8, 6))
-plt.plot(rho)
-plt.xlabel('iterations (t)')
-plt.ylabel('$\\rho$')
-plt.title(f'Order parameter')
-plt.xlim([0, len(rho)])
-plt.ylim([min(rho), 1])
-plt.tight_layout()
-plt.grid()
-plt.savefig(f'./tests/{id_test}/order_evolution.png')
-plt.close()
-
-plt.figure(figsize=(8, 6))
-plt.loglog(rho)
-plt.xlabel('iterations (t)')
-plt.ylabel('$\\rho$')
-plt.title(f'Order parameter')
-plt.xlim([0, len(rho)])
-plt.ylim([min(rho), 1])
-plt.tight_layout()
-plt.grid()
-plt.savefig(f'./tests/{id_test}/order_evolution_log.png')
-plt.close()
-
-
-# Document the test
-with open(f'./tests/{id_test}/doc_test.txt', 'w') as f:
-    f.write(f'Sznajd test with population shape [{n}, {m}]\n\n')
-    if circle:
-        f.write(f'Initial opinions shape: circle of radius '
-                f'{int(min(n,m)*radius)} centered at ({n/2}, {m/2})\n\n')
+import numpy as np
+from aux_functions import (seed_generators, create_test_folder, parse_config,
+                           snapshot_times,
+                           initialize_random_scalar_network,
+                           initialize_circular_scalar_network, random_element,
+                           sznajd_neighbors,
+                           proportion_different_sigma_lattice)
+from aux_profiling import (new_profile, lap, count, start_sampling,
+                           stop_sampling, save_profile)
+from aux_store import cached_run
+from aux_coarsening import coarsening_observables, growth_exponent
+
+COARSENING_FILE = os.path.join(os.path.dirname(__file__),
+                               'aux_coarsening.py')
+
+# PARAMS of the test (defaults)
+DEFAULT_CONFIG = {
+    'max_iter': 2000000,
+    'num_max_stuck': None,  # max(200, max_iter//100) if None
+    'circle': True,
+    'radius': 0.48,
+    'bias': 0.5,
+    # Shape of the population (N, M)
+    'n': 40,
+    'm': 50,
+    # Number of intermediate states stored through the process
+    'num_snapshots': 20,
+    # Snapshots every max_iter/num_snapshots steps ('linear') or at
+    # log-spaced times ('log', suited to coarsening studies)
+    'snapshot_spacing': 'linear',
+    'seed': 11859,
+    # Profiling of the run: 'phases', 'sampling' or None
+    'profile': 'phases',
+}
+
+
+def run_sznajd(config=None, profile=None):
+    """
+    Runs the Sznajd model over a lattice for the given config (missing
+    keys take the values of DEFAULT_CONFIG), timing its phases in profile
+    (a new one of mode config['profile'] if not given).
+    Returns a dict with the initial, intermediate ({iteration: state}) and
+    final populations, the support of [1] and the order parameter at each
+    iteration, the last iteration, the running time and the profile
+    """
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    own_profile = profile is None
+    if own_profile:
+        profile = new_profile(config['profile'])
+        start_sampling(profile)
+    n, m, max_iter = config['n'], config['m'], config['max_iter']
+    num_max_stuck = config['num_max_stuck']
+    if num_max_stuck is None:
+        num_max_stuck = max(200, max_iter//100)
+    snapshot_at = snapshot_times(max_iter, config['num_snapshots'],
+                                 config['snapshot_spacing'])
+    seed_generators(config['seed'])
+
+    # Initialize population opinion
+    if config['circle']:
+        population_opinion = initialize_circular_scalar_network(
+            n, m, config['radius'])
     else:
-        f.write(f'Initial random distribution of 2 opinions biased with '
-                f'{100*bias}% supporting [1]\n\n')
-    f.write(f'Max # of iterations allowed: {max_iter}\n')
-    f.write(f'Stop criteria: no evolution since {num_max_stuck} steps ago\n\n')
-    if iteration < max_iter-1:
-        f.write(f'Process finished at iter {iteration}\n\n')
-    else:
-        f.write(f'Process stopped due to max iter criteria\n\n')
-    f.write(f'Time employed for running and plotting intermediate '
-            f'steps: {dt} s')
+        population_opinion = initialize_random_scalar_network(
+            n, m, config['bias'])
+    initial = population_opinion.copy()
+
+    no_changes_since = 0
+    num_1s = [np.count_nonzero(population_opinion == 1)]
+    rho = [proportion_different_sigma_lattice(population_opinion)]
+    snapshots = {}
+    t0 = time.time()
+    t = time.perf_counter()
+
+    # Sznajd model
+    for iteration in range(max_iter):
+        # Select a random element of the matrix: ii
+        elem = random_element(population_opinion)
+        t = lap(profile, 'rng', t)
+
+        # Select the relevant neighbors at the network
+        partner, neighbors = sznajd_neighbors(elem, n, m)
+
+        # Update neighbors according to Sznajd model
+        pop_op_tm1 = population_opinion.copy()
+        for ii, neigh in enumerate(neighbors):
+            if ii < 3:
+                population_opinion[neigh] = \
+                    population_opinion[partner]
+            else:
+                population_opinion[neigh] = \
+                    population_opinion[elem]
+
+        # Check if any opinion has changed
+        if np.max(np.abs(population_opinion - pop_op_tm1)) == 0:
+            no_changes_since += 1
+        else:
+            no_changes_since = 0
+            count(profile, 'accepted')
+        t = lap(profile, 'update', t)
+
+        # Track population support of idea [1]
+        num_1s.append(np.count_nonzero(population_opinion == 1))
+        # Store order parameter
+        rho.append(proportion_different_sigma_lattice(population_opinion))
+        t = lap(profile, 'observables', t)
+
+        # Exit the loop if there are no updates
+        if no_changes_since == num_max_stuck:
+            print(f'There have been {num_max_stuck} steps without changes.'
+                  f'Process terminated.')
+            break
+
+        # Store intermediate steps through the process
+        if iteration+1 in snapshot_at:
+            snapshots[iteration+1] = population_opinion.copy()
+            t = lap(profile, 'snapshot', t)
+
+    dt = time.time() - t0
+    count(profile, 'steps', iteration+1)
+
+    # Structure factor, correlation and domain length of the snapshots
+    t = time.perf_counter()
+    states = {0: initial, **snapshots, iteration+1: population_opinion}
+    coarsening = {'times': np.array(list(states)),
+                  **coarsening_observables(list(states.values()))}
+    lap(profile, 'coarsening', t)
+    if own_profile:
+        stop_sampling(profile)
+    return {'initial': initial, 'snapshots': snapshots,
+            'final': population_opinion, 'num_1s': num_1s, 'rho': rho,
+            'iteration': iteration, 'num_max_stuck': num_max_stuck,
+            'coarsening': coarsening, 'time': dt, 'profile': profile}
+
+
+def plot_sznajd(results, config, folder):
+    """
+    Saves the figures of a run of the Sznajd model in folder
+    """
+    config = {**DEFAULT_CONFIG, **config}
+    from aux_plots import (plot_lattice_opinion, plot_support_evolution,
+                           plot_order_evolution, plot_coarsening)
+    plot_lattice_opinion(results['initial'],
+                         f'Initial state of Population Opinion',
+                         f'{folder}/population_init.png')
+    for iteration, population in results['snapshots'].items():
+        plot_lattice_opinion(population,
+                             f'Population Opinion after {iteration} '
+                             f'iterations',
+                             f'{folder}/population_iter{iteration}.png')
+    plot_lattice_opinion(results['final'],
+                         f'Population Opinion after '
+                         f'{min(results["iteration"]+1, config["max_iter"])} '
+                         f'iterations',
+                         f'{folder}/population_end.png')
+    plot_support_evolution(results['num_1s'], np.size(results['final']),
+                           folder, grid=True)
+    plot_order_evolution(results['rho'], folder)
+    plot_coarsening(results['coarsening'], folder)
+
+
+def write_doc(results, config, folder):
+    """
+    Documents the test
+    """
+    config = {**DEFAULT_CONFIG, **config}
+    n, m, max_iter = config['n'], config['m'], config['max_iter']
+    with open(f'{folder}/doc_test.txt', 'w') as f:
+        f.write(f'Sznajd test with population shape [{n}, {m}]\n\n')
+        if config['circle']:
+            f.write(f'Initial opinions shape: circle of radius '
+                    f'{int(min(n,m)*config["radius"])} centered at '
+                    f'({n/2}, {m/2})\n\n')
+        else:
+            f.write(f'Initial random distribution of 2 opinions biased with '
+                    f'{100*config["bias"]}% supporting [1]\n\n')
+        f.write(f'Random seed: {config["seed"]}\n')
+        f.write(f'Max # of iterations allowed: {max_iter}\n')
+        f.write(f'Stop criteria: no evolution since '
+                f'{results["num_max_stuck"]} steps ago\n\n')
+        if results['iteration'] < max_iter-1:
+            f.write(f'Process finished at iter {results["iteration"]}\n\n')
+        else:
+            f.write(f'Process stopped due to max iter criteria\n\n')
+        coarsening = results['coarsening']
+        try:
+            z, error, _ = growth_exponent(coarsening['times'],
+                                          coarsening['length_k'])
+            f.write(f'Domain growth L(t) ~ t^z from the structure factor: '
+                    f'z = {z:.3f} +- {error:.3f}\n\n')
+        except ValueError:
+            pass
+        f.write(f'Time employed for running: {results["time"]} s')
+        if results.get('cached'):
+            f.write(f' (results taken from the store, run '
+                    f'{results["key"]})')
+
+
+def main(argv=None):
+    config, options = parse_config(DEFAULT_CONFIG,
+                                   'Sznajd model on a lattice', argv)
+    folder = create_test_folder('sznajd')
+    profile = new_profile(config['profile'])
+    start_sampling(profile)
+    results = cached_run('sznajd', lambda config: run_sznajd(config, profile),
+                         config, [__file__, COARSENING_FILE],
+                         options['store_dir'], options['rerun'])
+    t = time.perf_counter()
+    if options['plots']:
+        plot_sznajd(results, config, folder)
+        t = lap(profile, 'render', t)
+    write_doc(results, config, folder)
+    lap(profile, 'io', t)
+    stop_sampling(profile)
+    if not results['cached']:
+        save_profile(profile, f'{folder}/profile.json', results['time'])
+    return results
+
+
+if __name__ == '__main__':
+    main()
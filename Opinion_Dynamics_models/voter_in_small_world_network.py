@@ -1,54 +1,65 @@
-import datetime
 import os
+import sys
 import time
-import matplotlib.pyplot as plt
-from aux_functions import *
-
-
-# Identify the test (for saving results)
-current_time = datetime.datetime.now()
-id_test = 'voter_SWN_' + current_time.strftime("%Y-%m-%d_%H-%M-%S")
-# Create folder for results
-if not os.path.exists('./tests/' + id_test):
-    os.makedirs('./tests/' + id_test)
-
-
-# PARAMS of the test
-max_iter = 10000000
-num_max_stuck = max(200, max_iter//100)
-bias = 0.5
-# Parameters of the Small World Network
-n = 50  # Number of agents
-k = 3   # Number of nearest neighbors to connect
-p_max = 0.2  # Probability of rewiring (used as pmax if next param is false)
-just_1_p = False
-n_p_tries = 10
-
-# Try different p values or not depending on param
-rho_multi = []
-dt = 0
-for ii in range(n_p_tries+1):
-    if just_1_p:
-        p = p_max
-    else:
-        p = ii/n_p_tries*p_max
+from multiprocessing import Pool
+import networkx as nx
+import numpy as np
+from aux_functions import (seed_generators, create_test_folder,
+                           parse_config, create_small_world_network,
+                           graph_to_arrays, run_network_voter,
+                           log_spaced_times)
+from aux_store import code_version, run_key, load_run, save_run
 
-    # Initialize Small World Network
-    small_world_network = create_small_world_network(n, k, p, bias)
+# Folder of aux_layout (cached_layout), only needed to plot the networks
+COMPLEX_NETWORK_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'Complex_Network')
+# Entries of a task which identify its run in the results store
+TASK_KEYS = ('p', 'seed', 'n', 'k', 'bias', 'update_mode', 'max_iter',
+             'num_max_stuck', 'num_points')
+
+# PARAMS of the test (defaults)
+DEFAULT_CONFIG = {
+    'max_iter': 10000000,
+    'num_max_stuck': None,  # max(200, max_iter//100) if None
+    'bias': 0.5,
+    # Parameters of the Small World Network
+    'n': 50,  # Number of agents
+    'k': 3,   # Number of nearest neighbors to connect
+    'p_max': 0.2,  # Probability of rewiring (pmax if just_1_p is false)
+    'just_1_p': False,
+    'n_p_tries': 10,
+    # Update rule: 'node' (node-update), 'link' (link-update) or 'invasion'
+    'update_mode': 'node',
+    # Number of seeds (averaged) for each p and number of parallel workers
+    'n_seeds': 1,
+    'seed': 11859,
+    'n_workers': None,  # os.cpu_count() if None
+    # Number of (log-spaced) points stored for each rho curve
+    'num_points': 2000,
+}
 
-    # Plotting the network
+
+def plot_network_schema(network, p, file):
+    """
+    Saves the schema of a small world network
+    """
+    import matplotlib.pyplot as plt
+    if COMPLEX_NETWORK_DIR not in sys.path:
+        sys.path.append(COMPLEX_NETWORK_DIR)
+    from aux_layout import cached_layout
     plt.figure(figsize=(8, 8))
-    pos = nx.spring_layout(small_world_network)  # Layout for visualization
+    # Layout for visualization (reused for identical networks)
+    pos = cached_layout(network)
     # Draw nodes
     nx.draw_networkx_nodes(
-        small_world_network,
+        network,
         pos,
         node_color='b',  # Adjust the node color as desired
         node_size=20,  # Adjust the node size as desired
     )
     # Draw edges
     nx.draw_networkx_edges(
-        small_world_network,
+        network,
         pos,
         edge_color='k',  # Adjust the edge color as desired
         width=0.25,  # Adjust the edge width as desired
@@ -56,117 +67,251 @@ for ii in range(n_p_tries+1):
     )
     plt.title(f'Network schema (p={round(p,3)})')
     plt.axis('off')  # Disable axis display
-    plt.savefig(f'./tests/{id_test}/network_{ii}.png')
+    plt.savefig(file)
     plt.close()
 
-    rho = [proportion_different_sigma_connections(small_world_network)]
-    no_changes_since = 0
+
+def simulate_swn_voter(task):
+    """
+    Runs the voter model for one (p, seed) pair of the sweep, given as a
+    task dict (see run_swn_voter), and plots the network schema for the
+    first seed (if the task folder is not None).
+    Returns the p index, seed index, recorded times, rho at those times
+    (decimated to log-spaced times), last iteration and running time
+    """
+    max_iter, num_max_stuck = task['max_iter'], task['num_max_stuck']
+    seed_generators(task['seed'])
+
+    # Initialize Small World Network
+    small_world_network = create_small_world_network(
+        task['n'], task['k'], task['p'], task['bias'])
+
+    # Array-backed adjacency and initial opinions of the network
+    indptr, indices, edges = graph_to_arrays(small_world_network)
+    sigma = [small_world_network.nodes[node]['sigma']
+             for node in small_world_network.nodes]
     t0 = time.time()
 
-    # Voter model
-    for iteration in range(max_iter):
-        # Select a random node from the network
-        random_node = random.choice(list(small_world_network.nodes))
+    # Voter model (rho only stored at log-spaced times)
+    record_times = log_spaced_times(max_iter, task['num_points'])
+    sigma, rho, num_1s, iteration = run_network_voter(
+        sigma, indptr, indices, edges, mode=task['update_mode'],
+        max_iter=max_iter, num_max_stuck=num_max_stuck,
+        record_times=record_times)
+    times = np.unique(np.concatenate((
+        [0], record_times[record_times <= iteration + 1], [iteration + 1])))
 
-        # Get the neighbors of the selected node
-        neighbors = list(small_world_network.neighbors(random_node))
+    # Report if the process got stuck before reaching consensus
+    if rho[-1] > 0 and iteration < max_iter - 1:
+        print(f'There have been {num_max_stuck} steps without changes.'
+              f'Process terminated.')
 
-        # Select a random neighbor from the list of neighbors
-        random_neighbor = random.choice(neighbors)
+    dt = time.time() - t0
 
-        # Update the opinion of agent ii according to Voter model
-        if small_world_network.nodes[random_node]['sigma'] == \
-                small_world_network.nodes[random_neighbor]['sigma']:
-            no_changes_since += 1
-        else:
-            small_world_network.nodes[random_node]['sigma'] = \
-                small_world_network.nodes[random_neighbor]['sigma']
-            no_changes_since = 0
-
-        # Store rho value
-        rho.append(proportion_different_sigma_connections(
-            small_world_network))
-
-        # Exit the loop if there are no updates
-        if no_changes_since == num_max_stuck:
-            print(f'There have been {num_max_stuck} steps without changes.'
-                  f'Process terminated.')
-            break
-
-    if just_1_p:
-        break
-    else:
-        rho_multi.append(rho)
-
-    dt = dt + time.time() - t0
-
-
-# Plot order parameter during simulation
-plt.figure(figsize=(8, 6))
-if just_1_p:
-    plt.plot(rho)
-else:
-    for ii in range(n_p_tries+1):
-        plt.plot(rho_multi[ii], label=f'p={round(ii/n_p_tries*p_max,3)}')
-plt.xlabel('iterations (t)')
-plt.ylabel('$\\rho$')
-if just_1_p:
-    plt.title(f'Order parameter (p={round(p,3)})')
-    plt.xlim([0, len(rho)])
-    plt.ylim([min(rho), 1])
-else:
-    plt.legend()
-    plt.title('Order parameter')
-    plt.xlim([0, max([len(rho_) for rho_ in rho_multi])])
-    plt.ylim([min([min(rho_) for rho_ in rho_multi]), 1])
-plt.tight_layout()
-plt.grid()
-plt.savefig(f'./tests/{id_test}/order_evolution.png')
-plt.close()
-
-plt.figure(figsize=(8, 6))
-if just_1_p:
-    plt.loglog(rho)
-else:
-    for ii in range(n_p_tries+1):
-        plt.loglog(rho_multi[ii], label=f'p={round(ii/n_p_tries*p_max,3)}')
-plt.xlabel('iterations (t)')
-plt.ylabel('$\\rho$')
-if just_1_p:
-    plt.title(f'Order parameter (p={round(p,3)})')
-    plt.xlim([0, len(rho)])
-    plt.ylim([min(rho), 1])
-else:
-    plt.legend()
-    plt.title('Order parameter')
-    plt.xlim([0, max([len(rho_) for rho_ in rho_multi])])
-    plt.ylim([min([min(rho_) for rho_ in rho_multi]), 1])
-plt.tight_layout()
-plt.grid()
-plt.savefig(f'./tests/{id_test}/order_evolution_log.png')
-plt.close()
-
-
-# Document the test
-with open(f'./tests/{id_test}/doc_test.txt', 'w') as f:
-    f.write(f'Voter test with population belonging to Small'
-            f' World Network of size {n}\n')
-    if just_1_p:
-        f.write(f'Number of nearest neighbors: {k}, rewiring prob: '
-                f'{round(p,3)}\n\n')
+    # Plotting the network (only if a folder is given, once the dynamics
+    # are done so that the layout does not alter the random sequence)
+    if task['seed_index'] == 0 and task['folder'] is not None:
+        plot_network_schema(small_world_network, task['p'],
+                            f'{task["folder"]}/network_{task["p_index"]}.png')
+
+    return task['p_index'], task['seed_index'], times, rho, iteration, dt
+
+
+def merge_rho(runs):
+    """
+    Averages the rho curves of several seeds on the union of their
+    recorded times. Each run keeps its final value once finished, as
+    its state does not evolve anymore
+    """
+    times = np.unique(np.concatenate([run_times for run_times, _ in runs]))
+    rho = np.mean([np.interp(times, run_times, run_rho)
+                   for run_times, run_rho in runs], axis=0)
+    return times, rho
+
+
+def task_config(task):
+    """
+    Parameters identifying the run of a (p, seed) task in the results store
+    """
+    return {name: task[name] for name in TASK_KEYS}
+
+
+def run_swn_voter(config=None, folder=None, store_dir=None, rerun=False):
+    """
+    Runs the voter model over small world networks for a sweep of rewiring
+    probabilities and seeds, given the config (missing keys take the values
+    of DEFAULT_CONFIG). Network schemas are only plotted if a folder is
+    given.
+    If store_dir is given, the (p, seed) runs already in the results store
+    are reused (unless rerun) and the new ones are stored.
+    Returns a dict with the p values, the merged (times, rho) curve and the
+    last iterations of each p, the number of runs taken from the store and
+    the summed and wall running times
+    """
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    max_iter, n_seeds = config['max_iter'], config['n_seeds']
+    num_max_stuck = config['num_max_stuck']
+    if num_max_stuck is None:
+        num_max_stuck = max(200, max_iter//100)
+    n_workers = config['n_workers'] or os.cpu_count()
+
+    # Try different p values or not depending on param
+    if config['just_1_p']:
+        p_values = [config['p_max']]
     else:
-        f.write(f'Number of nearest neighbors: {k}, rewiring prob '
-                f'takes {n_p_tries} equispaced values between 0 and '
-                f'{round(p_max,3)}\n\n')
-    f.write(f'Initial random distribution of 2 opinions biased with '
-            f'{round(100*bias,2)}% supporting [1]\n\n')
-    f.write(f'Max # of iterations allowed: {max_iter}\n')
-    f.write(f'Stop criteria: no evolution since {num_max_stuck} steps ago\n\n')
-    if iteration < max_iter-1:
-        f.write(f'Process finished at iter {iteration}\n\n')
+        p_values = [ii/config['n_p_tries']*config['p_max']
+                    for ii in range(config['n_p_tries']+1)]
+
+    # Without seed the runs are not reproducible: the store is not used and
+    # the first seed is drawn from the OS, so that the processes of the
+    # pool do not share their random sequences
+    first_seed = config['seed']
+    if first_seed is None:
+        first_seed = int.from_bytes(os.urandom(4), 'little')
+        store_dir = None
+    # Run the seeds x p grid over a pool of processes
+    tasks = [{'p_index': ii, 'seed_index': jj, 'p': p,
+              'seed': first_seed + ii*n_seeds + jj,
+              'n': config['n'], 'k': config['k'], 'bias': config['bias'],
+              'update_mode': config['update_mode'], 'max_iter': max_iter,
+              'num_max_stuck': num_max_stuck,
+              'num_points': config['num_points'], 'folder': folder}
+             for ii, p in enumerate(p_values) for jj in range(n_seeds)]
+    # Runs already in the store
+    stored = []
+    if store_dir is not None:
+        version = code_version([__file__])
+        keys = [run_key('swn_voter', task_config(task), version)
+                for task in tasks]
+        if not rerun:
+            stored = [load_run(key, store_dir) for key in keys]
+    cached = {ii for ii, result in enumerate(stored) if result is not None}
+    pending = [task for ii, task in enumerate(tasks) if ii not in cached]
+
+    t0 = time.time()
+    if n_workers == 1 or len(pending) <= 1:
+        new_results = [simulate_swn_voter(task) for task in pending]
     else:
-        f.write(f'Process stopped due to max iter criteria\n\n')
-    f.write(f'Time employed for running and plotting intermediate '
-            f'steps: {dt} s')
+        with Pool(processes=n_workers) as pool:
+            new_results = pool.map(simulate_swn_voter, pending)
+    wall_time = time.time() - t0
+
+    results = []
+    new_results = iter(new_results)
+    for ii, task in enumerate(tasks):
+        if ii in cached:
+            run = stored[ii]
+            results.append((task['p_index'], task['seed_index'],
+                            run['times'], run['rho'], run['iteration'],
+                            run['time']))
+            # Schema of the network of the first seed (same random sequence
+            # as in simulate_swn_voter)
+            if task['seed_index'] == 0 and folder is not None:
+                seed_generators(task['seed'])
+                network = create_small_world_network(
+                    task['n'], task['k'], task['p'], task['bias'])
+                plot_network_schema(
+                    network, task['p'],
+                    f'{folder}/network_{task["p_index"]}.png')
+        else:
+            results.append(next(new_results))
+            if store_dir is not None:
+                _, _, times, rho, iteration, dt = results[-1]
+                save_run('swn_voter', task_config(task),
+                         {'times': times, 'rho': rho, 'iteration': iteration,
+                          'time': dt}, version, store_dir)
+
+    # Merge the seeds of each p value
+    iterations = {}
+    rho_multi = []
+    for ii in range(len(p_values)):
+        runs = [(times, rho) for i_p, _, times, rho, _, _ in results
+                if i_p == ii]
+        rho_multi.append(merge_rho(runs))
+        iterations[ii] = [result[4] for result in results if result[0] == ii]
+
+    return {'p_values': p_values, 'rho': rho_multi, 'iterations': iterations,
+            'num_max_stuck': num_max_stuck, 'n_workers': n_workers,
+            'cached_runs': len(cached),
+            'time': sum(result[-1] for result in results),
+            'wall_time': wall_time}
+
+
+def plot_swn_voter(results, config, folder):
+    """
+    Saves the order parameter evolution of each rewiring probability
+    """
+    import matplotlib.pyplot as plt
+    config = {**DEFAULT_CONFIG, **config}
+    rho_multi = results['rho']
+    for plot, name in [(plt.plot, 'order_evolution'),
+                       (plt.loglog, 'order_evolution_log')]:
+        plt.figure(figsize=(8, 6))
+        for p, (times, rho) in zip(results['p_values'], rho_multi):
+            plot(times, rho, label=f'p={round(p,3)}')
+        plt.xlabel('iterations (t)')
+        plt.ylabel('$\\rho$')
+        if config['just_1_p']:
+            plt.title(f'Order parameter (p={round(config["p_max"],3)})')
+        else:
+            plt.legend()
+            plt.title('Order parameter')
+        plt.xlim([0, max([times[-1] for times, _ in rho_multi])])
+        plt.ylim([min([min(rho) for _, rho in rho_multi]), 1])
+        plt.tight_layout()
+        plt.grid()
+        plt.savefig(f'{folder}/{name}.png')
+        plt.close()
+
+
+def write_doc(results, config, folder):
+    """
+    Documents the test
+    """
+    config = {**DEFAULT_CONFIG, **config}
+    p_max = config['p_max']
+    with open(f'{folder}/doc_test.txt', 'w') as f:
+        f.write(f'Voter test with population belonging to Small'
+                f' World Network of size {config["n"]}\n')
+        if config['just_1_p']:
+            f.write(f'Number of nearest neighbors: {config["k"]}, rewiring '
+                    f'prob: {round(p_max,3)}\n\n')
+        else:
+            f.write(f'Number of nearest neighbors: {config["k"]}, rewiring '
+                    f'prob takes {config["n_p_tries"]} equispaced values '
+                    f'between 0 and {round(p_max,3)}\n\n')
+        f.write(f'Initial random distribution of 2 opinions biased with '
+                f'{round(100*config["bias"],2)}% supporting [1]\n\n')
+        f.write(f'Voter update rule: {config["update_mode"]}\n')
+        f.write(f'{config["n_seeds"]} seeds per rewiring prob (first seed '
+                f'{config["seed"]}), run over {results["n_workers"]} '
+                f'processes\n\n')
+        f.write(f'Max # of iterations allowed: {config["max_iter"]}\n')
+        f.write(f'Stop criteria: no evolution since '
+                f'{results["num_max_stuck"]} steps ago\n\n')
+        for ii, p in enumerate(results['p_values']):
+            f.write(f'p={round(p,3)}: process finished at iters '
+                    f'{results["iterations"][ii]}\n')
+        if results['cached_runs']:
+            f.write(f'\n{results["cached_runs"]} of '
+                    f'{config["n_seeds"] * len(results["p_values"])} runs '
+                    f'taken from the results store\n')
+        f.write(f'\nTime employed for running: {results["time"]} s (summed '
+                f'over processes), wall time {results["wall_time"]} s')
+
+
+def main(argv=None):
+    config, options = parse_config(DEFAULT_CONFIG,
+                                   'Voter model on small world networks',
+                                   argv)
+    folder = create_test_folder('voter_SWN')
+    results = run_swn_voter(config, folder if options['plots'] else None,
+                            options['store_dir'], options['rerun'])
+    if options['plots']:
+        plot_swn_voter(results, config, folder)
+    write_doc(results, config, folder)
+    return results
 
 
+if __name__ == '__main__':
+    main()
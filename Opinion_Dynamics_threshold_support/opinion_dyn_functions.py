@@ -1,53 +1,355 @@
-import math
 import numpy as np
-import matplotlib.pyplot as plt
-from scipy.optimize import root_scalar
+from scipy.special import betainc, betaln, gammaln, xlogy, xlog1py
+
+
+def majority_probability(x, r):
+    """
+    Probability that more than half of a group of size r supports the
+    idea, each member supporting it with probability x: binomial survival
+    function P(m > r/2) as a regularized incomplete beta function.
+    x and r broadcast against each other (e.g. x[:, None] and r[None, :]
+    give the whole (x, r) grid) and it stays accurate for large r
+    """
+    r = np.asarray(r)
+    return betainc(r // 2 + 1, r - r // 2, x)
+
+
+def tie_probability(x, r):
+    """
+    Probability of a tie (exactly r/2 supporters) in an even group of size
+    r, evaluated from the log of the binomial pmf to avoid overflows.
+    Zero for odd r. x and r broadcast against each other
+    """
+    r = np.asarray(r)
+    half = r / 2
+    log_pmf = gammaln(r + 1) - 2 * gammaln(half + 1) + xlogy(half, x) + \
+        xlog1py(half, -np.asarray(x))
+    return np.where(r % 2 == 0, np.exp(log_pmf), 0)
 
 
 def update_support_even(x, r, k):
-    try:
-        y = np.zeros(x.shape)
-    except:
-        y = 0
-    for m in range(r // 2, r):
-        m = m + 1
-        y = y + math.comb(r, m) * x ** m * (1 - x) ** (r - m)
-    y = y + k * math.comb(r, r // 2) * x ** (r // 2) * (1 - x) ** (r // 2)
+    """
+    Support after one update of groups of even size r, ties being
+    resolved in favour of the idea with probability k
+    """
+    return majority_probability(x, r) + k * tie_probability(x, r)
+
+
+def update_support_derivative(x, r, k=0):
+    """
+    Derivative with respect to x of update_support_even (k ignored for odd
+    r, where it equals that of update_support_odd). x, r and k broadcast
+    """
+    r = np.asarray(r)
+    x = np.asarray(x)
+    a, b = r // 2 + 1, r - r // 2
+    majority = np.exp(xlogy(a - 1, x) + xlog1py(b - 1, -x) - betaln(a, b))
+    tie = tie_probability(x, r) * (r / 2) * (1 - 2 * x) / (x * (1 - x))
+    return majority + k * tie
+
+
+def _padded(cell, values, shape):
+    """
+    Values belonging to the (flat) cells of an array of the given shape,
+    sorted and padded with nan along a new last axis
+    """
+    size = int(np.prod(shape))
+    order = np.lexsort((values, cell))
+    cell, values = cell[order], values[order]
+    counts = np.bincount(cell, minlength=size)
+    position = np.arange(len(cell)) - np.repeat(np.cumsum(counts) - counts,
+                                                counts)
+    padded = np.full((size, max(counts.max(initial=0), 1)), np.nan)
+    padded[cell, position] = values
+    return padded.reshape(tuple(shape) + (-1,))
 
-    return y
+
+def fixed_points(r, k, num_grid=64, tol=1e-12, max_iter=100):
+    """
+    Interior fixed points (besides a=0 and a=1) of the update of groups of
+    size r with tie parameter k, for all the (broadcast) r and k at once.
+    x - update_support_even(x, r, k) is scanned over num_grid cells of
+    [0, 1] (finer around 1/2, where the update of large groups is
+    steepest) and every sign change is refined with a vectorized safeguarded
+    Newton iteration (bisection when Newton leaves the bracket), so
+    several fixed points are found if they lie in different cells.
+    Returns the fixed points, sorted and padded with nan along a last
+    axis, and whether each of them is stable (|f'(a)| < 1)
+    """
+    r, k = np.broadcast_arrays(np.asarray(r), np.asarray(k, dtype=float))
+    t = np.linspace(-1, 1, num_grid + 1)[1:-1]
+    x = 0.5 + 0.5 * t ** 3
+    # The update is linear in k: majority and tie terms are only evaluated
+    # once per distinct group size
+    sizes, inverse = np.unique(r.ravel(), return_inverse=True)
+    majority = majority_probability(x, sizes[:, None])
+    tie = tie_probability(x, sizes[:, None])
+    g = majority[inverse] + k.ravel()[:, None] * tie[inverse] - x
+
+    # Brackets with a sign change and grid points which are already roots
+    cell, j = np.nonzero(g[:, :-1] * g[:, 1:] < 0)
+    exact_cell, exact_j = np.nonzero(g == 0)
+    rr, kk = r.ravel()[cell], k.ravel()[cell]
+    lo, hi = x[j], x[j + 1]
+    g_lo, g_hi = g[cell, j], g[cell, j + 1]
+    # Start from the secant of the bracket
+    root = lo - g_lo * (hi - lo) / (g_hi - g_lo)
+    active = np.ones(len(root), dtype=bool)
+    for _ in range(max_iter):
+        if not active.any():
+            break
+        xa, ra, ka = root[active], rr[active], kk[active]
+        ga = update_support_even(xa, ra, ka) - xa
+        # Shrink the bracket keeping the sign change inside
+        same = np.sign(ga) == np.sign(g_lo[active])
+        lo[active] = np.where(same, xa, lo[active])
+        hi[active] = np.where(same, hi[active], xa)
+        g_lo[active] = np.where(same, ga, g_lo[active])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            newton = xa - ga / (update_support_derivative(xa, ra, ka) - 1)
+        inside = (newton >= lo[active]) & (newton <= hi[active])
+        step = np.where(inside, newton, (lo[active] + hi[active]) / 2)
+        converged = (np.abs(step - xa) < tol) | (ga == 0) | \
+            (hi[active] - lo[active] < tol)
+        root[active] = np.where(ga == 0, xa, step)
+        active[np.flatnonzero(active)[converged]] = False
+
+    points = _padded(np.concatenate((cell, exact_cell)),
+                     np.concatenate((root, x[exact_j])), r.shape)
+    with np.errstate(invalid='ignore'):
+        stable = np.abs(update_support_derivative(
+            points, r[..., None], k[..., None])) < 1
+    return points, stable
+
+
+def critical_support_grid(r, k, num_grid=64, tol=1e-12):
+    """
+    Critical support a_c (the unstable interior fixed point) of even
+    groups for all the (broadcast) r and k at once. For r < 4 there is no
+    interior fixed point and the support goes to 0 or 1 depending on k.
+    nan where there is not a single unstable fixed point (see
+    fixed_points)
+    """
+    r, k = np.broadcast_arrays(np.asarray(r), np.asarray(k, dtype=float))
+    points, stable = fixed_points(r, k, num_grid, tol)
+    unstable = ~np.isnan(points) & ~stable
+    a_c = np.where(unstable.sum(axis=-1) == 1,
+                   np.nansum(np.where(unstable, points, 0), axis=-1), np.nan)
+    small = np.where(np.abs(k - 0.5) < 1e-5, 0.5, 0.5*(1-np.sign(k-0.5)))
+    return np.where(r < 4, small, a_c)
 
 
 def critical_support_even(r, k):
-    if r < 4:
-        if abs(k - 0.5) < 1e-5:
-            y = 0.5
+    """
+    Critical support a_c of even groups of size r (see
+    critical_support_grid)
+    """
+    return float(critical_support_grid(r, k))
+
+
+def group_size_table(sizes, weights=None):
+    """
+    Precomputed tables of a distribution of group sizes (uniform if no
+    weights are given): incomplete beta parameters of the majority term,
+    log binomial coefficients of the tie term and normalized weights
+    """
+    sizes = np.asarray(sizes)
+    weights = np.ones(len(sizes)) if weights is None else \
+        np.asarray(weights, dtype=float)
+    half = sizes / 2
+    return {'sizes': sizes, 'a': sizes // 2 + 1, 'b': sizes - sizes // 2,
+            'half': half,
+            'log_coefficient': np.where(sizes % 2 == 0, gammaln(sizes + 1) -
+                                        2 * gammaln(half + 1), -np.inf),
+            'weights': weights / weights.sum()}
+
+
+def mixed_update_support(x, table, k):
+    """
+    Support after one update when groups are formed with the sizes and
+    weights of table (see group_size_table): weighted sum of the updates
+    of each size. x and k broadcast against each other
+    """
+    x = np.asarray(x, dtype=float)[..., None]
+    tie = np.exp(table['log_coefficient'] + xlogy(table['half'], x) +
+                 xlog1py(table['half'], -x))
+    y = betainc(table['a'], table['b'], x) + \
+        np.asarray(k, dtype=float)[..., None] * tie
+    return y @ table['weights']
+
+
+def iterate_map(a0, r=3, k=0, table=None, max_iter=1000, tol=1e-10,
+                record=False):
+    """
+    Iterates a_t+1 = f(a_t) for all the (broadcast) initial supports a0,
+    group sizes r and tie parameters k at once, f being
+    update_support_even (odd sizes have no ties) or, if table is given,
+    mixed_update_support (r is then ignored). Each element stops once its
+    support changes less than tol.
+    Returns the final supports, the number of iterations each element took
+    to converge (max_iter if it did not) and, if record, the trajectories
+    (supports are kept constant after convergence)
+    """
+    a0, r, k = np.broadcast_arrays(np.asarray(a0, dtype=float),
+                                   np.asarray(r), np.asarray(k, dtype=float))
+    a, r, k = a0.ravel().copy(), r.ravel(), k.ravel()
+    steps = np.full(a.size, max_iter)
+    active = np.arange(a.size)
+    trajectory = [a.copy()] if record else None
+    for t in range(max_iter):
+        if not len(active):
+            break
+        if table is None:
+            new = update_support_even(a[active], r[active], k[active])
         else:
-            y = 0.5*(1-np.sign(k-0.5))
-    else:
-        # Define the equation: x - update_support_even(x, r, k) = 0
-        equation = lambda x: x - update_support_even(x, r, k)
-        x0_bracket = [0.2, 0.8]
+            new = mixed_update_support(a[active], table, k[active])
+        converged = np.abs(new - a[active]) < tol
+        a[active] = new
+        steps[active[converged]] = t + 1
+        active = active[~converged]
+        if record:
+            trajectory.append(a.copy())
 
-        # Use root_scalar to find the root of the equation
-        a_c = root_scalar(equation, bracket=x0_bracket, method='brentq')
-        y = a_c.root
+    if record:
+        trajectory = np.array(trajectory).reshape((-1,) + a0.shape)
+    return a.reshape(a0.shape), steps.reshape(a0.shape), trajectory
 
-    return y
 
+def basin_boundaries(a0, r=3, k=0, table=None, max_iter=1000, tol=1e-10,
+                     n_bisect=40, attractor_tol=1e-6):
+    """
+    Boundaries between the basins of attraction of the map (see
+    iterate_map) along the grid of initial supports a0 (last axis), for
+    the (broadcast) r and k of the leading axes. Consecutive initial
+    supports ending in different attractors are refined by n_bisect
+    vectorized bisection steps.
+    Returns the boundaries, sorted and padded with nan along a last axis
+    """
+    a0 = np.asarray(a0, dtype=float)
+    shape = np.broadcast_shapes(np.shape(r), np.shape(k))
+    r = np.broadcast_to(r, shape)[..., None]
+    k = np.broadcast_to(np.asarray(k, dtype=float), shape)[..., None]
+    final, _, _ = iterate_map(a0, r, k, table, max_iter, tol)
+    final = final.reshape(-1, len(a0))
+    cell, j = np.nonzero(np.abs(np.diff(final, axis=-1)) > attractor_tol)
+    rr = np.broadcast_to(r, shape + (1,)).ravel()[cell]
+    kk = np.broadcast_to(k, shape + (1,)).ravel()[cell]
+    lo, hi = a0[j], a0[j + 1]
+    lo_final = final[cell, j]
 
-def update_support_odd(x, r):
-    try:
-        y = np.zeros(x.shape)
-    except:
-        y = 0
-    for m in range(r//2, r):
-        m = m + 1
-        y = y + math.comb(r, m) * x**m * (1-x)**(r-m)
+    for _ in range(n_bisect):
+        middle = (lo + hi) / 2
+        middle_final, _, _ = iterate_map(middle, rr, kk, table, max_iter, tol)
+        same = np.abs(middle_final - lo_final) <= attractor_tol
+        lo = np.where(same, middle, lo)
+        hi = np.where(same, hi, middle)
+
+    # A grid point lying on an unstable fixed point gives the same
+    # boundary from both sides
+    boundary = (lo + hi) / 2
+    order = np.lexsort((boundary, cell))
+    cell, boundary = cell[order], boundary[order]
+    repeated = np.zeros(len(cell), dtype=bool)
+    repeated[1:] = (cell[1:] == cell[:-1]) & \
+        (np.diff(boundary) <= attractor_tol)
+    return _padded(cell[~repeated], boundary[~repeated], shape)
+
+
+def group_starts(n, rng, r=4, table=None):
+    """
+    First agent of each group when n (shuffled) agents are split into
+    consecutive groups of size r or, if table is given, of random sizes
+    such that the weights of the table are the fractions of agents in
+    groups of each size (as in mixed_update_support). The last group
+    takes the remaining agents
+    """
+    if table is None:
+        return np.arange(0, n, r)
+    # Fraction of groups of each size
+    p = table['weights'] / table['sizes']
+    mean = 1 / p.sum()
+    p = p * mean
+    sizes = rng.choice(table['sizes'], size=int(n / mean) + 1, p=p)
+    while sizes.sum() < n:
+        sizes = np.concatenate((sizes, rng.choice(
+            table['sizes'], size=int(n / mean) // 10 + 1, p=p)))
+    starts = np.concatenate(([0], np.cumsum(sizes)))
+    return starts[starts < n]
 
-    return y
+
+def galam_round(populations, k, rng, r=4, table=None):
+    """
+    One update of the agent opinions (rows of 0/1 populations, all of the
+    same size): each population is randomly split into groups with a
+    single permutation per row, every group adopts its majority opinion
+    (ties go to 1 with probability k) through a group-wise reduction.
+    Agents are returned in group order, which is irrelevant as they are
+    shuffled again in the next round
+    """
+    n = populations.shape[1]
+    shuffled = rng.permuted(populations, axis=1)
+    starts = group_starts(n, rng, r, table)
+    sizes = np.diff(np.append(starts, n))
+    counts = np.add.reduceat(shuffled, starts, axis=1, dtype=np.int64)
+    outcome = (2 * counts > sizes) | \
+        ((2 * counts == sizes) & (rng.random(counts.shape) < k))
+    return np.repeat(outcome.astype(np.int8), sizes, axis=1)
+
+
+def simulate_galam(a0, n, r=4, k=0, table=None, n_runs=1, max_rounds=1000,
+                   seed=None):
+    """
+    Agent-based Galam dynamics: n_runs populations of n agents for each
+    initial support in a0 (round(a0*n) supporters), updated in parallel
+    with galam_round until each of them reaches consensus or max_rounds.
+    Returns the final support and number of rounds of every population,
+    arrays of shape (len(a0), n_runs)
+    """
+    rng = np.random.default_rng(seed)
+    a0 = np.atleast_1d(a0)
+    supporters = np.repeat(np.round(a0 * n).astype(np.int64), n_runs)
+    populations = (np.arange(n)[None, :] < supporters[:, None]).astype(
+        np.int8)
+    support = supporters / n
+    rounds = np.zeros(len(support), dtype=np.int64)
+    active = np.flatnonzero((support > 0) & (support < 1))
+    for t in range(max_rounds):
+        if not len(active):
+            break
+        populations = galam_round(populations, k, rng, r, table)
+        support[active] = populations.mean(axis=1)
+        rounds[active] = t + 1
+        running = (support[active] > 0) & (support[active] < 1)
+        populations = populations[running]
+        active = active[running]
+    return support.reshape(len(a0), n_runs), rounds.reshape(len(a0), n_runs)
+
+
+def empirical_threshold(a0, n, r=4, k=0, table=None, n_runs=20,
+                        max_rounds=1000, seed=None):
+    """
+    Threshold initial support of populations of n agents (simulate_galam),
+    estimated over the increasing grid a0 as the mean of the distribution
+    whose cumulative is the probability of reaching consensus on the idea
+    (a0 should span from probability 0 to 1).
+    Returns the threshold and the probability for each a0
+    """
+    support, _ = simulate_galam(a0, n, r, k, table, n_runs, max_rounds, seed)
+    probability = np.mean(support == 1, axis=1)
+    threshold = a0[-1] - np.sum((probability[1:] + probability[:-1]) / 2 *
+                                np.diff(a0))
+    return threshold, probability
+
+
+def update_support_odd(x, r):
+    """
+    Support after one update of groups of odd size r (no ties)
+    """
+    return majority_probability(x, r)
 
 
 def plot_threshold(x, a_t1, group_size, k=None, folder='results'):
+    import matplotlib.pyplot as plt
     # Enable LaTeX rendering
     # plt.rc('text', usetex=True)
     if k is None:
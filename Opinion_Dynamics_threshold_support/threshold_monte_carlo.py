@@ -0,0 +1,138 @@
+import argparse
+import ast
+import os
+import time
+import numpy as np
+from opinion_dyn_functions import critical_support_even, empirical_threshold
+
+# PARAMS of the test (defaults)
+# Agent-based simulation of even groups of size r, compared with the
+# analytic critical support for growing populations
+DEFAULT_CONFIG = {
+    'r': 4,
+    'k_values': [0, 0.25, 0.75],
+    'population_sizes': [10**2, 10**3, 10**4, 10**5],
+    'n_runs': 20,  # populations per initial support
+    'n_a0': 21,  # initial supports around the analytic threshold
+    'seed': 11859,
+}
+
+
+def run_threshold_monte_carlo(config=None, verbose=True):
+    """
+    Empirical critical support of the agent-based Galam model for every k
+    and population size of the config (missing keys take the values of
+    DEFAULT_CONFIG).
+    Returns a dict with the thresholds (one row per k, one column per
+    population size), the analytic ones (one per k) and the running time
+    """
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    r, k_values = config['r'], config['k_values']
+    population_sizes = config['population_sizes']
+
+    t0 = time.time()
+    analytic = np.array([critical_support_even(r, k) for k in k_values])
+    thresholds = np.zeros((len(k_values), len(population_sizes)))
+    for ii, k in enumerate(k_values):
+        a_c = analytic[ii]
+        for jj, n in enumerate(population_sizes):
+            # Finite-size transitions have a width ~ 1/sqrt(n)
+            width = min(0.2, 1 / np.sqrt(n))
+            a0 = np.linspace(a_c - width, a_c + width, config['n_a0'])
+            thresholds[ii, jj], _ = empirical_threshold(
+                a0, n, r, k, n_runs=config['n_runs'], seed=config['seed'])
+            if verbose:
+                print(f'k={k}, n={n}: empirical threshold '
+                      f'{thresholds[ii, jj]:.5f} (analytic {a_c:.5f})')
+    return {'thresholds': thresholds, 'analytic': analytic,
+            'time': time.time() - t0}
+
+
+def plot_threshold_monte_carlo(results, config, folder):
+    """
+    Saves the distance between empirical and analytic thresholds against
+    the population size
+    """
+    config = {**DEFAULT_CONFIG, **config}
+    import matplotlib.pyplot as plt
+    plt.figure()
+    for k, thresholds_k, a_c in zip(config['k_values'],
+                                    results['thresholds'],
+                                    results['analytic']):
+        plt.loglog(config['population_sizes'], np.abs(thresholds_k - a_c),
+                   'o-', label=f'$k={k}$')
+    plt.title(f'Empirical vs analytic critical support ($r={config["r"]}$)')
+    plt.xlabel('Population size')
+    plt.ylabel('$|a_{emp} - a_c|$')
+    plt.legend()
+    plt.grid('minor')
+    plt.savefig(f'./{folder}/threshold_monte_carlo.png')
+    plt.close()
+
+
+def write_doc(results, config, folder):
+    """
+    Documents the test
+    """
+    config = {**DEFAULT_CONFIG, **config}
+    with open(f'./{folder}/threshold_monte_carlo.txt', 'w') as f:
+        f.write(f'Agent-based Galam model, groups of size {config["r"]}, '
+                f'{config["n_runs"]} runs per initial support '
+                f'(seed {config["seed"]})\n\n')
+        f.write("{:<8} {:>10} {:>12} {:>12} {:>12}\n".format(
+            'k', 'n', 'empirical', 'analytic', 'difference'))
+        for k, thresholds_k, a_c in zip(config['k_values'],
+                                        results['thresholds'],
+                                        results['analytic']):
+            for n, threshold in zip(config['population_sizes'],
+                                    thresholds_k):
+                f.write("{:<8} {:>10} {:>12.5f} {:>12.5f} {:>12.5f}\n"
+                        .format(k, n, threshold, a_c, threshold - a_c))
+        f.write(f'\nTime employed for running: {results["time"]} s')
+
+
+def _literal(value):
+    try:
+        return ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return value
+
+
+def parse_config(defaults, description, argv=None):
+    """
+    Command line interface over the config: every key of the defaults can
+    be overridden with --key value (python literals, e.g. --n-runs 50 or
+    --k-values [0,0.5]). Besides, --folder sets the folder of the figure
+    and table and --no-plots skips the figure.
+    Returns the config and the options: folder and plots
+    """
+    parser = argparse.ArgumentParser(description=description)
+    for key, value in defaults.items():
+        parser.add_argument('--' + key.replace('_', '-'), dest=key,
+                            type=_literal, default=value,
+                            help=f'(default: {value})')
+    parser.add_argument('--folder', default='results',
+                        help='folder of the figure and table')
+    parser.add_argument('--no-plots', action='store_true',
+                        help='do not save the figure')
+    args = vars(parser.parse_args(argv))
+    options = {'folder': args.pop('folder'),
+               'plots': not args.pop('no_plots')}
+    return args, options
+
+
+def main(argv=None):
+    config, options = parse_config(
+        DEFAULT_CONFIG, 'Agent-based check of the analytic critical support '
+                        "of Galam's model", argv)
+    folder = options['folder']
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    results = run_threshold_monte_carlo(config)
+    if options['plots']:
+        plot_threshold_monte_carlo(results, config, folder)
+    write_doc(results, config, folder)
+    return results
+
+if __name__ == '__main__':
+    main()
@@ -20,35 +20,24 @@ k_values = [0, 0.25, 0.5, 0.75, 1]
 x = np.linspace(0, 1, 101)
 
 # Compute for different k values for even groups
+# (whole grid of a_t and group sizes in one call, one row per group size)
+group_size_even = list(range(2, 21, 2))
 for k in k_values:
-    group_size_even = []
-    a_t1_even = []
-    for r in range(2, 21, 2):
-        y = update_support_even(x, r, k)
-        a_t1_even.append(y)
-        group_size_even.append(r)
+    a_t1_even = update_support_even(x[None, :],
+                                    np.array(group_size_even)[:, None], k)
 
     plot_threshold(x, a_t1_even, group_size_even, k)
 
 # Compute for odd groups
-group_size_odd = []
-a_t1_odd = []
-for r in range(3, 20, 2):
-    y = update_support_odd(x, r)
-    a_t1_odd.append(y)
-    group_size_odd.append(r)
+group_size_odd = list(range(3, 20, 2))
+a_t1_odd = update_support_odd(x[None, :], np.array(group_size_odd)[:, None])
 
 plot_threshold(x, a_t1_odd, group_size_odd)
 
-# Find critical support values
-ac = []
-for k in k_values:
-    ac_i = []
-    group_size = []
-    for r in range(2, 51, 2):
-        ac_i.append(critical_support_even(r, k))
-        group_size.append(r)
-    ac.append(ac_i)
+# Find critical support values (all k values and group sizes at once)
+group_size = list(range(2, 51, 2))
+ac = critical_support_grid(np.array(group_size)[None, :],
+                           np.array(k_values)[:, None])
 
 plt.figure()
 for k, ac_i in zip(k_values, ac):
@@ -62,3 +51,39 @@ plt.ylim([0, 1])
 plt.grid('minor')
 plt.savefig(f'./{folder_name}/critical_support.png')
 plt.close()
+
+# Iterate the map from a grid of initial supports: number of updates
+# needed to reach the attractor for even groups of size 4
+a0 = np.linspace(0, 1, 501)
+final, steps, _ = iterate_map(a0[None, :], 4, np.array(k_values)[:, None])
+
+plt.figure()
+for k, steps_k in zip(k_values, steps):
+    plt.semilogy(a0, steps_k, label=f'$k={k}$')
+plt.title('Updates to reach the attractor ($r=4$)')
+plt.xlabel('$a_0$')
+plt.ylabel('Number of updates')
+plt.legend()
+plt.xlim([0, 1])
+plt.grid('minor')
+plt.savefig(f'./{folder_name}/convergence_time.png')
+plt.close()
+
+# Mixed group sizes (uniform between 1 and 6): basin boundary against k
+table = group_size_table(np.arange(1, 7))
+k_fine = np.linspace(0, 1, 101)
+boundaries = basin_boundaries(np.linspace(0, 1, 101), table=table, k=k_fine)
+
+plt.figure()
+plt.plot(k_fine, boundaries[:, 0], 'b')
+plt.title('Critical support for group sizes 1 to 6')
+plt.xlabel('$k$')
+plt.ylabel('$a_c$')
+plt.xlim([0, 1])
+plt.ylim([0, 1])
+plt.grid('minor')
+plt.savefig(f'./{folder_name}/critical_support_mixed.png')
+plt.close()
+
+np.savez(f'./{folder_name}/iterated_map.npz', a0=a0, k=k_values,
+         final=final, steps=steps, k_fine=k_fine, boundaries=boundaries)
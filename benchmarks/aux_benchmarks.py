@@ -0,0 +1,158 @@
+import json
+import os
+import platform
+import tracemalloc
+from time import perf_counter
+import numpy as np
+
+# Registered benchmarks: name -> setup function, unit of the work items,
+# whether it only runs in the full suite
+BENCHMARKS = {}
+
+
+def benchmark(name, unit, params=(None,), full=()):
+    """
+    Registers a benchmark setup function f(param) (one benchmark
+    name[param] per value of params, those in full only run in the full
+    suite). The setup builds the input data and returns a function run()
+    performing the timed work, which returns the number of work items
+    (steps, nodes, evaluations...) it processed
+    """
+    def register(function):
+        for param in params:
+            label = name if param is None else f'{name}[{param}]'
+            BENCHMARKS[label] = {'setup': function, 'param': param,
+                                 'unit': unit, 'full': param in full}
+        return function
+    return register
+
+
+def select_benchmarks(patterns=None, full=False):
+    """
+    Names of the registered benchmarks containing any of the patterns
+    (all if None), skipping the full-suite ones unless full
+    """
+    return [name for name, entry in BENCHMARKS.items()
+            if (full or not entry['full']) and
+            (not patterns or any(pattern in name for pattern in patterns))]
+
+
+def measure(run, min_time=0.5, min_repeat=3, max_repeat=50):
+    """
+    Times run() after a warm-up call, repeating it at least min_repeat times
+    and until min_time seconds are spent (or max_repeat calls), then traces
+    the peak memory allocated by one more call.
+    Returns the items per call, best and median time per call, number of
+    repeats, throughput (items/s, from the best time) and peak memory (bytes)
+    """
+    run()
+    times = []
+    items = 0
+    while len(times) < min_repeat or \
+            (sum(times) < min_time and len(times) < max_repeat):
+        t0 = perf_counter()
+        items = run()
+        times.append(perf_counter() - t0)
+
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    best = min(times)
+    return {'items': items, 'best_time': best,
+            'median_time': float(np.median(times)), 'repeats': len(times),
+            'throughput': items / best if best > 0 else float('inf'),
+            'peak_memory': peak}
+
+
+def run_benchmarks(names, min_time=0.5, verbose=True):
+    """
+    Sets up and measures the given benchmarks.
+    Returns {name: measure(...) plus the unit of the items}
+    """
+    results = {}
+    for name in names:
+        entry = BENCHMARKS[name]
+        run = entry['setup'](entry['param'])
+        results[name] = {'unit': entry['unit'],
+                         **measure(run, min_time=min_time)}
+        if verbose:
+            print(f'{name}: {results[name]["throughput"]:.4g} '
+                  f'{entry["unit"]}/s, '
+                  f'{results[name]["peak_memory"] / 1024:.1f} kB')
+    return results
+
+
+def environment():
+    """
+    Description of the machine and library versions of a run
+    """
+    import scipy
+    import networkx
+    return {'python': platform.python_version(),
+            'numpy': np.__version__, 'scipy': scipy.__version__,
+            'networkx': networkx.__version__,
+            'machine': platform.machine(), 'processor': platform.processor(),
+            'cpu_count': os.cpu_count()}
+
+
+def load_baseline(file):
+    """
+    Benchmarks stored in a baseline file ({} if it does not exist)
+    """
+    if not os.path.exists(file):
+        return {}
+    with open(file, 'r') as f:
+        return json.load(f)['benchmarks']
+
+
+def save_baseline(file, results, previous=None):
+    """
+    Stores the results as baseline, keeping the previous benchmarks which
+    were not run
+    """
+    with open(file, 'w') as f:
+        json.dump({'environment': environment(),
+                   'benchmarks': {**(previous or {}), **results}},
+                  f, indent=2)
+
+
+def check_regressions(results, baseline, tolerance=0.25,
+                      memory_tolerance=0.25, memory_slack=65536):
+    """
+    Compares the results against the baseline.
+    Returns a list of messages for every benchmark whose throughput is
+    below (1 - tolerance) times its baseline or whose peak memory exceeds
+    (1 + memory_tolerance) times its baseline plus memory_slack bytes
+    """
+    regressions = []
+    for name, result in results.items():
+        ref = baseline.get(name)
+        if ref is None:
+            continue
+        if result['throughput'] < (1 - tolerance) * ref['throughput']:
+            regressions.append(
+                f'{name}: {result["throughput"]:.4g} {result["unit"]}/s vs '
+                f'{ref["throughput"]:.4g} {result["unit"]}/s in baseline')
+        if result['peak_memory'] > (1 + memory_tolerance) * \
+                ref['peak_memory'] + memory_slack:
+            regressions.append(
+                f'{name}: peak memory {result["peak_memory"] / 1024:.1f} kB '
+                f'vs {ref["peak_memory"] / 1024:.1f} kB in baseline')
+    return regressions
+
+
+def format_table(results, baseline=None):
+    baseline = baseline or {}
+    lines = ['{:<32} {:>12} {:>14} {:>14} {:>12} {:>9}'.format(
+        'Benchmark', 'Items', 'Throughput', 'Unit', 'Peak [kB]',
+        'vs base')]
+    for name, result in results.items():
+        ref = baseline.get(name)
+        ratio = '{:>9.2f}'.format(result['throughput'] / ref['throughput']) \
+            if ref else '{:>9}'.format('-')
+        lines.append('{:<32} {:>12} {:>14.4g} {:>14} {:>12.1f} '.format(
+            name, result['items'], result['throughput'],
+            result['unit'] + '/s', result['peak_memory'] / 1024) + ratio)
+    return '\n'.join(lines)
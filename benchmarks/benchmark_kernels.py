@@ -0,0 +1,262 @@
+import argparse
+import json
+import os
+import sys
+import numpy as np
+
+# The benchmarked code lives in the folders of each task
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+for folder in ['Opinion_Dynamics_models', 'Complex_Network',
+               'Opinion_Dynamics_threshold_support']:
+    sys.path.append(os.path.join(ROOT, folder))
+
+from aux_benchmarks import (BENCHMARKS, benchmark, select_benchmarks,
+                            run_benchmarks, load_baseline, save_baseline,
+                            check_regressions, format_table, environment)
+from aux_functions import (create_test_folder, seed_generators,
+                           initialize_random_scalar_network,
+                           run_lattice_sznajd, lattice_to_arrays,
+                           create_small_world_network, graph_to_arrays,
+                           run_network_voter)
+from voter_model import run_voter
+from sznajd_model import run_sznajd
+from axelrod_model import run_axelrod
+from schelling_model import run_schelling
+from aux_network import load_graph_edges, parse_edge_list, edges_to_csr
+from aux_stages import STAGES
+from opinion_dyn_functions import (update_support_even, critical_support_grid,
+                                   group_size_table, mixed_update_support)
+
+NETWORK_FILE = os.path.join(ROOT, 'Complex_Network', 'data', 'CA-GrQc.txt')
+
+
+# Opinion dynamics models: full steps of the scripts (including the
+# observables stored at every step) and the array-backed kernels
+
+def model_run(run_model, config):
+    """
+    Run function of a model script with the given config (same seed and
+    no snapshots, profiling nor prints), counting the steps performed
+    """
+    config = {'num_snapshots': 0, 'profile': None, 'seed': 0, **config}
+
+    def run():
+        return run_model(config)['iteration'] + 1
+    return run
+
+
+@benchmark('voter_step', 'steps', params=(10, 20, 40))
+def voter_step(size):
+    return model_run(run_voter, {'n': size, 'm': size, 'max_iter': 1000,
+                                 'num_max_stuck': 1000})
+
+
+@benchmark('sznajd_step', 'steps', params=(10, 20, 40))
+def sznajd_step(size):
+    return model_run(run_sznajd, {'n': size, 'm': size, 'circle': False,
+                                  'max_iter': 1000, 'num_max_stuck': 1000})
+
+
+@benchmark('axelrod_step', 'steps', params=(10, 20, 40))
+def axelrod_step(size):
+    return model_run(run_axelrod, {'n': size, 'm': size, 'max_iter': 200,
+                                   'num_max_stuck': 200})
+
+
+@benchmark('schelling_sweep', 'agents', params=(20, 40))
+def schelling_sweep(size):
+    run = model_run(run_schelling, {'N': size, 'max_iter': 1,
+                                    'verbose': False})
+    num_agents = round((1 - 0.02) * size * size)
+
+    def run_sweep():
+        run()
+        return num_agents
+    return run_sweep
+
+
+def kernel_voter_run(sigma, indptr, indices, edges, max_iter):
+    def run():
+        seed_generators(0)
+        iteration = run_network_voter(sigma, indptr, indices, edges,
+                                      max_iter=max_iter,
+                                      record_every=max_iter)[-1]
+        return iteration + 1
+    return run
+
+
+@benchmark('voter_kernel', 'steps', params=(20, 50, 100))
+def voter_kernel(size):
+    seed_generators(0)
+    sigma = initialize_random_scalar_network(size, size)
+    return kernel_voter_run(sigma, *lattice_to_arrays(size, size), 100000)
+
+
+@benchmark('sznajd_kernel', 'steps', params=(20, 50, 100))
+def sznajd_kernel(size):
+    seed_generators(0)
+    population = initialize_random_scalar_network(size, size)
+
+    def run():
+        seed_generators(0)
+        return run_lattice_sznajd(population, 100000,
+                                  record_every=100000)[-1] + 1
+    return run
+
+
+@benchmark('swn_voter_step', 'steps', params=(1000, 10000))
+def swn_voter_step(size):
+    seed_generators(0)
+    network = create_small_world_network(size, 4, 0.1)
+    sigma = [network.nodes[node]['sigma'] for node in network.nodes]
+    return kernel_voter_run(sigma, *graph_to_arrays(network), 100000)
+
+
+# Complex network stages on the bundled CA-GrQc collaboration network
+
+@benchmark('parse_edge_list', 'edges')
+def parse_edges(_):
+    def run():
+        return len(parse_edge_list(NETWORK_FILE)[0])
+    return run
+
+
+@benchmark('load_graph_edges', 'edges')
+def load_graph(_):
+    def run():
+        return load_graph_edges(NETWORK_FILE).number_of_edges()
+    return run
+
+
+def network_data():
+    """
+    Outputs of the load and degree stages for CA-GrQc
+    """
+    edges, node_ids = parse_edge_list(NETWORK_FILE)
+    data = {'edges': edges, 'node_ids': node_ids,
+            'adjacency': edges_to_csr(edges, len(node_ids))}
+    data.update(STAGES['degree']['function'](data))
+    return data
+
+
+def stage_run(name, items, **params):
+    data = network_data()
+
+    def run():
+        STAGES[name]['function'](data, **params)
+        return items(data)
+    return run
+
+
+def num_nodes(data):
+    return len(data['node_ids'])
+
+
+# The exact shortest paths and the full spectrum take several seconds, so
+# they only run in the full suite
+@benchmark('stage_paths', 'sources', params=('sampled', 'exact'),
+           full=('exact',))
+def paths_stage(mode):
+    items = num_nodes if mode == 'exact' else (lambda data: 500)
+    return stage_run('paths', items, mode=mode, seed=42, n_workers=1)
+
+
+@benchmark('stage_clustering', 'nodes')
+def clustering_stage(_):
+    return stage_run('clustering', num_nodes, n_workers=1)
+
+
+@benchmark('stage_spectrum', 'nodes', params=('kpm', 'full'),
+           full=('full',))
+def spectrum_stage(mode):
+    return stage_run('spectrum', num_nodes, mode=mode, seed=42)
+
+
+# Galam's threshold model
+
+@benchmark('galam_update_even', 'evaluations', params=(4, 100, 10000))
+def galam_update(r):
+    x = np.linspace(0, 1, 100000)
+
+    def run():
+        update_support_even(x, r, 0.5)
+        return len(x)
+    return run
+
+
+@benchmark('galam_critical_grid', 'pairs')
+def galam_critical(_):
+    r, k = np.meshgrid(np.arange(2, 102), np.linspace(0, 1, 100))
+
+    def run():
+        critical_support_grid(r, k)
+        return r.size
+    return run
+
+
+@benchmark('galam_mixed_update', 'evaluations')
+def galam_mixed(_):
+    x = np.linspace(0, 1, 100000)
+    table = group_size_table(np.arange(1, 7))
+
+    def run():
+        mixed_update_support(x, table, 0.5)
+        return len(x)
+    return run
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmarks of the model kernels, with regression '
+                    'checks against a JSON baseline')
+    parser.add_argument('--filter', nargs='+', default=None,
+                        help='only run benchmarks containing these strings')
+    parser.add_argument('--full', action='store_true',
+                        help='also run the slow benchmarks (' +
+                             ', '.join(name for name, entry
+                                       in BENCHMARKS.items()
+                                       if entry['full']) + ')')
+    parser.add_argument('--baseline', default='./baseline.json')
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='store the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed relative loss of throughput')
+    parser.add_argument('--memory-tolerance', type=float, default=0.25,
+                        help='allowed relative increase of peak memory')
+    parser.add_argument('--min-time', type=float, default=0.5,
+                        help='minimum time spent timing each benchmark')
+    args = parser.parse_args(argv)
+
+    names = select_benchmarks(args.filter, args.full)
+    results = run_benchmarks(names, args.min_time)
+
+    baseline = load_baseline(args.baseline)
+    failures = check_regressions(results, baseline, args.tolerance,
+                                 args.memory_tolerance)
+    table = format_table(results, baseline)
+    print()
+    print(table)
+    if args.update_baseline or not baseline:
+        save_baseline(args.baseline, results, baseline)
+
+    # Document the test
+    folder = create_test_folder('benchmarks')
+    with open(f'{folder}/results.json', 'w') as f:
+        json.dump({'environment': environment(), 'benchmarks': results,
+                   'failures': failures}, f, indent=2)
+    with open(f'{folder}/doc_test.txt', 'w') as f:
+        f.write(f'Benchmarks of the model kernels (baseline: '
+                f'{args.baseline}, tolerance: {args.tolerance} throughput, '
+                f'{args.memory_tolerance} peak memory)\n\n')
+        f.write(table + '\n\n')
+        for failure in failures:
+            f.write(f'FAILED: {failure}\n')
+
+    print()
+    for failure in failures:
+        print('FAILED:', failure)
+    return failures
+
+
+if __name__ == '__main__':
+    sys.exit(1 if main() else 0)